@@ -16,6 +16,94 @@ MODELS_DIR.mkdir(exist_ok=True)
 # Set torch hub directory to models folder
 os.environ['TORCH_HOME'] = str(MODELS_DIR)
 
+# ONNX Runtime backend (CPU): exported models are cached here, keyed by
+# weights hash, input size and opset
+ONNX_CACHE_DIR = MODELS_DIR / "onnx"
+ONNX_IMGSZ = int(os.environ.get("ONNX_IMGSZ", "640"))
+ONNX_OPSET = int(os.environ.get("ONNX_OPSET", "17"))
+ONNX_INTRA_OP_THREADS = int(os.environ.get("ONNX_INTRA_OP_THREADS", "0"))  # 0 = all cores
+
+# Model registry: loaded models are kept within this resident weight budget by
+# unloading the least recently used ones (0 = unlimited), and models idle for
+# longer than the TTL are unloaded (0 = never)
+MODEL_MEMORY_BUDGET_MB = int(os.environ.get("MODEL_MEMORY_BUDGET_MB", "1024"))
+MODEL_IDLE_TTL_SECONDS = int(os.environ.get("MODEL_IDLE_TTL_SECONDS", "1800"))
+
+# Startup: model selected by default, extra models to load before serving, and
+# the frame sizes (WIDTHxHEIGHT) each preloaded model is warmed up with
+DEFAULT_MODEL = os.environ.get("DEFAULT_MODEL", "yolo11x")
+PRELOAD_MODELS = [m.strip() for m in os.environ.get("PRELOAD_MODELS", "yolo").split(",") if m.strip()]
+WARMUP_INPUT_SIZES = [
+    tuple(int(v) for v in size.lower().split("x"))
+    for size in os.environ.get("WARMUP_INPUT_SIZES", "640x480,1280x720").split(",") if size.strip()
+]
+WARMUP_RUNS = int(os.environ.get("WARMUP_RUNS", "2"))
+
+# Micro-batching of single-frame requests (image uploads, camera frames): up to
+# BATCH_MAX_SIZE frames per forward pass, waiting at most BATCH_MAX_WAIT_MS for more
+BATCH_MAX_SIZE = int(os.environ.get("BATCH_MAX_SIZE", "8"))
+BATCH_MAX_WAIT_MS = float(os.environ.get("BATCH_MAX_WAIT_MS", "5"))
+
+# Blocking request work (decoding, drawing, encoding) runs on
+# CPU_EXECUTOR_WORKERS executor threads; beyond CPU_EXECUTOR_WORKERS +
+# CPU_EXECUTOR_QUEUE requests in progress, new ones get 503 with Retry-After
+CPU_EXECUTOR_WORKERS = int(os.environ.get("CPU_EXECUTOR_WORKERS", "2"))
+CPU_EXECUTOR_QUEUE = int(os.environ.get("CPU_EXECUTOR_QUEUE", "16"))
+# Whole-video jobs (uploads, the video WebSocket) hold a thread for minutes, so they
+# run on their own VIDEO_EXECUTOR_WORKERS threads and admit at most
+# VIDEO_EXECUTOR_WORKERS + VIDEO_EXECUTOR_QUEUE videos, leaving the CPU executor
+# to short image and camera requests
+VIDEO_EXECUTOR_WORKERS = int(os.environ.get("VIDEO_EXECUTOR_WORKERS", "2"))
+VIDEO_EXECUTOR_QUEUE = int(os.environ.get("VIDEO_EXECUTOR_QUEUE", "2"))
+
+# Ensemble: how the member models' detections are combined ("nms" keeps the best
+# box of each overlapping group, "wbf" averages them) and whether only boxes of the
+# same class are combined
+ENSEMBLE_FUSION = os.environ.get("ENSEMBLE_FUSION", "nms")
+ENSEMBLE_IOU_THRESHOLD = float(os.environ.get("ENSEMBLE_IOU_THRESHOLD", "0.5"))
+ENSEMBLE_CLASS_AWARE = os.environ.get("ENSEMBLE_CLASS_AWARE", "true").lower() in ("1", "true", "yes")
+
+# Video ensemble: the secondary model (SSD) runs on every ENSEMBLE_SECONDARY_INTERVAL-th
+# frame ("alternate"), or on frames where the primary has a score in
+# [ENSEMBLE_CASCADE_LOW, ENSEMBLE_CASCADE_HIGH) and at least every
+# ENSEMBLE_CASCADE_MAX_GAP frames ("cascade"); its boxes are carried in between
+ENSEMBLE_VIDEO_STRATEGY = os.environ.get("ENSEMBLE_VIDEO_STRATEGY", "alternate")
+ENSEMBLE_SECONDARY_INTERVAL = int(os.environ.get("ENSEMBLE_SECONDARY_INTERVAL", "5"))
+ENSEMBLE_CASCADE_LOW = float(os.environ.get("ENSEMBLE_CASCADE_LOW", "0.25"))
+ENSEMBLE_CASCADE_HIGH = float(os.environ.get("ENSEMBLE_CASCADE_HIGH", "0.6"))
+ENSEMBLE_CASCADE_MAX_GAP = int(os.environ.get("ENSEMBLE_CASCADE_MAX_GAP", "30"))
+
+# Skipped video frames are annotated with boxes propagated from the last inferred
+# frame: "hold", "linear" (track velocity), "flow" (optical flow) or "none".
+# Tracks match detections within PROPAGATION_MAX_DISTANCE px and are dropped after
+# PROPAGATION_MAX_MISSES inferred frames without one
+SKIP_FRAME_PROPAGATION = os.environ.get("SKIP_FRAME_PROPAGATION", "linear")
+PROPAGATION_MAX_DISTANCE = float(os.environ.get("PROPAGATION_MAX_DISTANCE", "100"))
+PROPAGATION_MAX_MISSES = int(os.environ.get("PROPAGATION_MAX_MISSES", "2"))
+
+# Video tracking: "centroid" (centroid distance, settings above) or "sort" (box IoU
+# with Kalman prediction, matched at SORT_IOU_THRESHOLD and dropped after
+# SORT_MAX_AGE inferred frames without a match). A track is counted once it was
+# matched in TRACK_MIN_HITS inferred frames
+TRACKING_MODE = os.environ.get("TRACKING_MODE", "centroid")
+SORT_IOU_THRESHOLD = float(os.environ.get("SORT_IOU_THRESHOLD", "0.3"))
+SORT_MAX_AGE = int(os.environ.get("SORT_MAX_AGE", "3"))
+TRACK_MIN_HITS = int(os.environ.get("TRACK_MIN_HITS", "2"))
+
+# Camera sessions keep running statistics with a per-second time line of the
+# last CAMERA_TIMELINE_SECONDS seconds
+CAMERA_TIMELINE_SECONDS = int(os.environ.get("CAMERA_TIMELINE_SECONDS", "300"))
+
+# Multi-process inference: INFERENCE_WORKERS processes (0 = in-process) each hold
+# a replica of WORKER_POOL_MODEL; frames are passed through shared memory slots of
+# WORKER_SLOT_MB. WORKER_TORCH_THREADS = 0 splits the CPU cores between workers
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", "0"))
+WORKER_POOL_MODEL = os.environ.get("WORKER_POOL_MODEL", DEFAULT_MODEL)
+WORKER_TORCH_THREADS = int(os.environ.get("WORKER_TORCH_THREADS", "0"))
+WORKER_CV2_THREADS = int(os.environ.get("WORKER_CV2_THREADS", "1"))
+WORKER_SLOT_MB = int(os.environ.get("WORKER_SLOT_MB", "8"))
+WORKER_START_METHOD = os.environ.get("WORKER_START_METHOD", "fork" if os.name == "posix" else "spawn")
+
 # Detection Settings
 DEFAULT_CONFIDENCE_THRESHOLD = 0.5
 MIN_CONFIDENCE = 0.1
@@ -51,6 +139,13 @@ SSD_TRAFFIC_CLASSES = {
     8: "Truck",        # truck
 }
 
+# Maximum boxes the SSD head keeps per image after NMS
+SSD_DETECTIONS_PER_IMAGE = int(os.environ.get("SSD_DETECTIONS_PER_IMAGE", "200"))
+
+# INT8 SSD: folder of frames (.jpg/.png) used to calibrate post-training quantization
+SSD_CALIBRATION_DIR = Path(os.environ.get("SSD_CALIBRATION_DIR", str(MODELS_DIR / "calibration")))
+SSD_CALIBRATION_MAX_FRAMES = int(os.environ.get("SSD_CALIBRATION_MAX_FRAMES", "64"))
+
 # API Settings
 API_PREFIX = "/api"
 CORS_ORIGINS = ["http://localhost:3000", "http://127.0.0.1:3000"]
@@ -59,6 +154,44 @@ CORS_ORIGINS = ["http://localhost:3000", "http://127.0.0.1:3000"]
 MAX_VIDEO_SIZE_MB = 100
 SUPPORTED_VIDEO_FORMATS = [".mp4", ".avi", ".mov", ".mkv"]
 SUPPORTED_IMAGE_FORMATS = [".jpg", ".jpeg", ".png", ".webp"]
+# Frames per batched forward pass when processing videos
+VIDEO_BATCH_SIZE = int(os.environ.get("VIDEO_BATCH_SIZE", "8"))
+# Frames each queue between video pipeline stages (decode, infer, annotate) holds
+VIDEO_PIPELINE_QUEUE = int(os.environ.get("VIDEO_PIPELINE_QUEUE", "8"))
+# Input video decoding: "pyav" (multi-threaded FFmpeg decode, scaled while converting),
+# "opencv" (cv2.VideoCapture) or "auto" (pyav when installed). Frames are downscaled
+# to VIDEO_DECODE_MAX_SIDE px on the longer side (0 = source size); VIDEO_DECODE_THREADS
+# = 0 lets FFmpeg pick the decoder thread count
+VIDEO_DECODER = os.environ.get("VIDEO_DECODER", "auto")
+VIDEO_DECODE_MAX_SIDE = int(os.environ.get("VIDEO_DECODE_MAX_SIDE", "0"))
+VIDEO_DECODE_THREADS = int(os.environ.get("VIDEO_DECODE_THREADS", "0"))
+# Output video: "pipe" streams raw frames into ffmpeg while processing; "transcode"
+# writes an MJPG AVI and converts it afterwards (also used when ffmpeg is missing)
+VIDEO_WRITER = os.environ.get("VIDEO_WRITER", "pipe")
+FFMPEG_BINARY = os.environ.get("FFMPEG_BINARY", "ffmpeg")
+VIDEO_ENCODER_PRESET = os.environ.get("VIDEO_ENCODER_PRESET", "fast")
+VIDEO_ENCODER_CRF = int(os.environ.get("VIDEO_ENCODER_CRF", "23"))
+# Segment-parallel video processing: uploads of at least 2 * SEGMENT_MIN_SECONDS are
+# split at keyframes into up to SEGMENT_WORKERS segments (0 = off), processed in a
+# pool of worker processes with their own model replicas and stitched back together.
+# SEGMENT_TORCH_THREADS = 0 splits the CPU cores between workers
+SEGMENT_WORKERS = int(os.environ.get("SEGMENT_WORKERS", "0"))
+SEGMENT_MIN_SECONDS = float(os.environ.get("SEGMENT_MIN_SECONDS", "30"))
+SEGMENT_START_METHOD = os.environ.get("SEGMENT_START_METHOD", "spawn")
+SEGMENT_TORCH_THREADS = int(os.environ.get("SEGMENT_TORCH_THREADS", "0"))
+# Multi-node segment processing: with SEGMENT_BROKER_DB set, segments are queued in
+# that SQLite database instead of the local pool, and any worker (scripts/segment_worker.py,
+# or SEGMENT_LOCAL_WORKERS processes started by this server) leases and processes them.
+# Inputs and segment outputs go to SEGMENT_WORK_DIR ("" = segment_jobs next to the
+# database); database and directory must be on a filesystem all nodes share. A lease
+# not renewed for SEGMENT_LEASE_SECONDS (crashed worker) goes back to the queue, up to
+# SEGMENT_MAX_ATTEMPTS times per segment; the coordinator gives up after SEGMENT_JOB_TIMEOUT
+SEGMENT_BROKER_DB = os.environ.get("SEGMENT_BROKER_DB", "")
+SEGMENT_WORK_DIR = os.environ.get("SEGMENT_WORK_DIR", "")
+SEGMENT_LOCAL_WORKERS = int(os.environ.get("SEGMENT_LOCAL_WORKERS", "0"))
+SEGMENT_LEASE_SECONDS = float(os.environ.get("SEGMENT_LEASE_SECONDS", "60"))
+SEGMENT_MAX_ATTEMPTS = int(os.environ.get("SEGMENT_MAX_ATTEMPTS", "3"))
+SEGMENT_JOB_TIMEOUT = float(os.environ.get("SEGMENT_JOB_TIMEOUT", "3600"))
 
 # Camera Settings
 CAMERA_FRAME_WIDTH = 640
@@ -1,7 +1,30 @@
 # Detectors module
+#
+# Detector implementations pull in torch / ultralytics / torchvision, so they
+# are imported on first attribute access (PEP 562) instead of with the package.
+import importlib
+
 from .base_detector import BaseDetector
-from .yolo_detector import YOLODetector
-from .yolo_coco_detector import YOLOCocoDetector
-from .ssd_detector import SSDDetector
+from .detection_set import DetectionSet
+
+_LAZY_DETECTORS = {
+    "YOLODetector": ".yolo_detector",
+    "YOLOCocoDetector": ".yolo_coco_detector",
+    "SSDDetector": ".ssd_detector",
+    "SSDInt8Detector": ".ssd_int8_detector",
+}
+
+__all__ = ["BaseDetector", "DetectionSet"] + list(_LAZY_DETECTORS)
+
+
+def __getattr__(name):
+    module = _LAZY_DETECTORS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
 
-__all__ = ["BaseDetector", "YOLODetector", "YOLOCocoDetector", "SSDDetector"]
+def __dir__():
+    return sorted(__all__)
@@ -2,37 +2,10 @@
 Base Detector Abstract Class
 """
 from abc import ABC, abstractmethod
-from typing import List, Dict, Tuple, Any
+from typing import List, Dict, Tuple, Optional, Sequence
 import numpy as np
 
-
-class Detection:
-    """Represents a single detection result."""
-    
-    def __init__(
-        self,
-        class_name: str,
-        confidence: float,
-        bbox: Tuple[int, int, int, int],  # x1, y1, x2, y2
-        class_id: int = -1
-    ):
-        self.class_name = class_name
-        self.confidence = confidence
-        self.bbox = bbox
-        self.class_id = class_id
-    
-    def to_dict(self) -> Dict[str, Any]:
-        return {
-            "class": self.class_name,
-            "confidence": float(self.confidence),
-            "bbox": {
-                "x1": int(self.bbox[0]),
-                "y1": int(self.bbox[1]),
-                "x2": int(self.bbox[2]),
-                "y2": int(self.bbox[3])
-            },
-            "class_id": self.class_id
-        }
+from .detection_set import DetectionSet
 
 
 class BaseDetector(ABC):
@@ -52,20 +25,59 @@ class BaseDetector(ABC):
     def detect(
         self,
         image: np.ndarray,
-        confidence_threshold: float = 0.5
-    ) -> List[Detection]:
+        confidence_threshold: float = 0.5,
+        classes: Optional[Sequence[str]] = None
+    ) -> DetectionSet:
         """
         Perform detection on an image.
         
         Args:
             image: Input image as numpy array (BGR format)
             confidence_threshold: Minimum confidence for detections
+            classes: Class names to keep (None keeps every class)
             
         Returns:
-            List of Detection objects
+            DetectionSet with all detections in the image
         """
         pass
     
+    def detect_batch(
+        self,
+        images: List[np.ndarray],
+        confidence_threshold: float = 0.5,
+        classes: Optional[Sequence[str]] = None
+    ) -> List[DetectionSet]:
+        """
+        Perform detection on a batch of images.
+        
+        Detectors that can run several frames through one forward pass
+        override this; the default falls back to one detect() per image.
+        
+        Args:
+            images: Input images as numpy arrays (BGR format)
+            confidence_threshold: Minimum confidence for detections
+            classes: Class names to keep (None keeps every class)
+            
+        Returns:
+            One DetectionSet per input image, in order
+        """
+        return [self.detect(image, confidence_threshold, classes) for image in images]
+    
+    def class_ids_for(self, classes: Optional[Sequence[str]]) -> Optional[List[int]]:
+        """
+        Translate class names into the model class ids to run inference for.
+        
+        Detectors use this to hand the class subset to the model itself, so
+        boxes of unwanted classes are dropped before NMS instead of after.
+        
+        Args:
+            classes: Class names to keep (None keeps every class)
+            
+        Returns:
+            Sorted model class ids, or None when no filtering is needed
+        """
+        return None
+    
     @abstractmethod
     def get_model_name(self) -> str:
         """Return the name of the detector."""
@@ -81,6 +93,36 @@ class BaseDetector(ABC):
         from config.settings import CLASS_COLORS
         return CLASS_COLORS
     
+    def warmup(self, input_sizes: Sequence[Tuple[int, int]], runs: int = 2):
+        """
+        Run dummy frames through the model so the first real request does not
+        pay for lazy initialization (kernel selection, allocator growth).
+        
+        Args:
+            input_sizes: (width, height) frame sizes to warm up with
+            runs: Detections per size
+        """
+        for width, height in input_sizes:
+            frame = np.zeros((height, width, 3), dtype=np.uint8)
+            for _ in range(runs):
+                self.detect(frame)
+    
+    def resident_bytes(self) -> int:
+        """
+        Approximate memory held by the loaded model weights, in bytes.
+        
+        Counts the parameter and buffer storage of torch models; detectors
+        backed by something else override this.
+        """
+        if not self.is_loaded or self.model is None:
+            return 0
+        
+        import torch
+        if not isinstance(self.model, torch.nn.Module):
+            return 0
+        tensors = list(self.model.parameters()) + list(self.model.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+    
     def unload_model(self):
         """Unload the model to free memory."""
         self.model = None
@@ -0,0 +1,174 @@
+"""
+Columnar Detection Results
+Array-backed container for all detections found in one image
+"""
+from typing import List, Dict, Any, Optional, Sequence, Union
+import numpy as np
+
+
+class DetectionSet:
+    """
+    Detections for a single image stored as parallel NumPy arrays.
+
+    Attributes:
+        boxes: (N, 4) int32 array of x1, y1, x2, y2 pixel coordinates
+        scores: (N,) float32 confidences
+        class_ids: (N,) int32 class ids as reported by the model
+        label_ids: (N,) int32 indices into class_names
+        class_names: Table of display names referenced by label_ids
+        track_ids: Optional (N,) int64 tracker ids, set for video frames
+        carried: Optional (N,) bool mask of rows that were not detected in
+            this image but carried over from an earlier frame
+    """
+
+    __slots__ = ("boxes", "scores", "class_ids", "label_ids", "class_names", "track_ids", "carried")
+
+    def __init__(
+        self,
+        boxes: np.ndarray,
+        scores: np.ndarray,
+        class_ids: np.ndarray,
+        label_ids: np.ndarray,
+        class_names: Sequence[str],
+        track_ids: Optional[np.ndarray] = None,
+        carried: Optional[np.ndarray] = None
+    ):
+        self.boxes = np.asarray(boxes, dtype=np.int32).reshape(-1, 4)
+        self.scores = np.asarray(scores, dtype=np.float32).reshape(-1)
+        self.class_ids = np.asarray(class_ids, dtype=np.int32).reshape(-1)
+        self.label_ids = np.asarray(label_ids, dtype=np.int32).reshape(-1)
+        self.class_names = tuple(class_names)
+        self.track_ids = None if track_ids is None else np.asarray(track_ids, dtype=np.int64).reshape(-1)
+        self.carried = None if carried is None else np.asarray(carried, dtype=bool).reshape(-1)
+
+    @classmethod
+    def empty(cls, class_names: Sequence[str] = ()) -> "DetectionSet":
+        """Create a set with no detections."""
+        return cls(
+            np.empty((0, 4), dtype=np.int32),
+            np.empty(0, dtype=np.float32),
+            np.empty(0, dtype=np.int32),
+            np.empty(0, dtype=np.int32),
+            class_names
+        )
+
+    @classmethod
+    def concatenate(cls, sets: Sequence["DetectionSet"]) -> "DetectionSet":
+        """
+        Join several sets into one, merging their class-name tables.
+
+        Label ids are remapped so that equal names share one entry in the
+        combined table, e.g. "Car" from YOLO and SSD end up as one label.
+        Track ids are kept only if every set has them; rows of sets without
+        a carried mask count as detected.
+        """
+        sets = [s for s in sets if s is not None]
+        if not sets:
+            return cls.empty()
+        track_ids = None
+        if all(s.track_ids is not None for s in sets):
+            track_ids = np.concatenate([s.track_ids for s in sets])
+        carried = None
+        if any(s.carried is not None for s in sets):
+            carried = np.concatenate([
+                s.carried if s.carried is not None else np.zeros(len(s), dtype=bool) for s in sets
+            ])
+
+        first_names = sets[0].class_names
+        if all(s.class_names == first_names for s in sets):
+            return cls(
+                np.concatenate([s.boxes for s in sets]),
+                np.concatenate([s.scores for s in sets]),
+                np.concatenate([s.class_ids for s in sets]),
+                np.concatenate([s.label_ids for s in sets]),
+                first_names,
+                track_ids,
+                carried
+            )
+
+        names: List[str] = []
+        index: Dict[str, int] = {}
+        label_ids = []
+        for s in sets:
+            remap = np.empty(len(s.class_names), dtype=np.int32)
+            for i, name in enumerate(s.class_names):
+                if name not in index:
+                    index[name] = len(names)
+                    names.append(name)
+                remap[i] = index[name]
+            label_ids.append(remap[s.label_ids])
+
+        return cls(
+            np.concatenate([s.boxes for s in sets]),
+            np.concatenate([s.scores for s in sets]),
+            np.concatenate([s.class_ids for s in sets]),
+            np.concatenate(label_ids),
+            names,
+            track_ids,
+            carried
+        )
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def select(self, index: Union[np.ndarray, slice]) -> "DetectionSet":
+        """Return a new set with the rows picked by a mask or index array."""
+        return DetectionSet(
+            self.boxes[index],
+            self.scores[index],
+            self.class_ids[index],
+            self.label_ids[index],
+            self.class_names,
+            None if self.track_ids is None else self.track_ids[index],
+            None if self.carried is None else self.carried[index]
+        )
+
+    def filter(
+        self,
+        confidence_threshold: Optional[float] = None,
+        classes: Optional[Sequence[str]] = None
+    ) -> "DetectionSet":
+        """
+        Keep detections scoring above confidence_threshold whose name is in classes.
+
+        None disables the respective check.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if confidence_threshold is not None:
+            mask &= self.scores > confidence_threshold
+        if classes is not None:
+            wanted = set(classes)
+            label_ids = [i for i, name in enumerate(self.class_names) if name in wanted]
+            mask &= np.isin(self.label_ids, label_ids)
+        return self if mask.all() else self.select(mask)
+
+    def names(self) -> List[str]:
+        """Display name of every detection, in row order."""
+        return [self.class_names[i] for i in self.label_ids.tolist()]
+
+    def areas(self) -> np.ndarray:
+        """Box areas as an (N,) int64 array."""
+        boxes = self.boxes.astype(np.int64)
+        return (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """Materialize the JSON representation used by the API."""
+        names = self.class_names
+        rows = [
+            {
+                "class": names[label_id],
+                "confidence": score,
+                "bbox": {"x1": x1, "y1": y1, "x2": x2, "y2": y2},
+                "class_id": class_id
+            }
+            for (x1, y1, x2, y2), score, class_id, label_id in zip(
+                self.boxes.tolist(),
+                self.scores.tolist(),
+                self.class_ids.tolist(),
+                self.label_ids.tolist()
+            )
+        ]
+        if self.track_ids is not None:
+            for row, track_id in zip(rows, self.track_ids.tolist()):
+                row["track_id"] = track_id
+        return rows
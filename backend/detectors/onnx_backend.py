@@ -0,0 +1,250 @@
+"""
+ONNX Runtime Backend for YOLO Detectors
+Exports ultralytics .pt weights to ONNX once and serves them on CPU
+"""
+import ast
+import hashlib
+import os
+import shutil
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+import onnxruntime as ort
+
+from config.settings import ONNX_CACHE_DIR, ONNX_INTRA_OP_THREADS
+
+
+def file_sha256(path: Path, chunk_size: int = 1 << 20) -> str:
+    """Hex SHA-256 digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def resolve_weights(model_path: str) -> Path:
+    """
+    Return a local path for YOLO weights.
+
+    Names like "yolo11n.pt" that are not on disk yet are fetched through
+    ultralytics, which downloads the pretrained COCO weights.
+    """
+    path = Path(model_path)
+    if path.exists():
+        return path
+
+    from ultralytics import YOLO
+    return Path(YOLO(model_path).ckpt_path)
+
+
+def export_onnx(model_path: str, imgsz: int, opset: int) -> Path:
+    """
+    Export YOLO weights to ONNX, reusing a cached export when available.
+
+    The cache file name contains the weights hash, input size and opset,
+    so retrained weights or different export settings get their own entry.
+
+    Args:
+        model_path: Path or ultralytics name of the .pt weights
+        imgsz: Square input size the model is exported for
+        opset: ONNX opset version
+
+    Returns:
+        Path to the cached .onnx file
+    """
+    weights = resolve_weights(model_path)
+    digest = file_sha256(weights)[:16]
+    target = ONNX_CACHE_DIR / f"{weights.stem}-{digest}-{imgsz}-op{opset}.onnx"
+
+    if target.exists():
+        return target
+
+    print(f"Exporting {weights.name} to ONNX (imgsz={imgsz}, opset={opset})...")
+    from ultralytics import YOLO
+    exported = YOLO(str(weights)).export(
+        format="onnx", imgsz=imgsz, opset=opset, dynamic=True, simplify=False, verbose=False
+    )
+
+    # Move into the cache atomically so concurrent loaders never see a partial file
+    ONNX_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = target.with_suffix(f".{os.getpid()}.tmp")
+    shutil.move(str(exported), tmp_path)
+    os.replace(tmp_path, target)
+    print(f"ONNX model cached: {target}")
+    return target
+
+
+class OnnxYOLOSession:
+    """
+    YOLO inference through onnxruntime on CPU.
+
+    Handles letterbox preprocessing, score filtering, class-aware NMS and
+    rescaling to the source image, matching the ultralytics defaults.
+    """
+
+    def __init__(
+        self,
+        onnx_path: Path,
+        imgsz: int,
+        iou_threshold: float = 0.7,
+        max_det: int = 300
+    ):
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.intra_op_num_threads = ONNX_INTRA_OP_THREADS
+        options.inter_op_num_threads = 1
+        options.enable_mem_pattern = True
+        options.enable_cpu_mem_arena = True
+
+        self.onnx_path = Path(onnx_path)
+        self.session = ort.InferenceSession(
+            str(onnx_path), sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self.input_name = self.session.get_inputs()[0].name
+        self.imgsz = imgsz
+        self.iou_threshold = iou_threshold
+        self.max_det = max_det
+
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.names = ast.literal_eval(metadata["names"]) if "names" in metadata else {}
+        self.stride = int(metadata.get("stride", 32))
+        self.end2end = metadata.get("end2end", "False") == "True"
+
+    def _input_shape(self, images: List[np.ndarray]) -> Tuple[int, int]:
+        """
+        Network input (height, width) for a batch.
+        
+        Like ultralytics, a batch of equally sized frames is letterboxed to
+        the smallest stride-aligned rectangle instead of a full square,
+        which saves compute on wide video frames.
+        """
+        shapes = {image.shape[:2] for image in images}
+        if len(shapes) != 1:
+            return self.imgsz, self.imgsz
+
+        h, w = shapes.pop()
+        gain = min(self.imgsz / h, self.imgsz / w)
+        stride = self.stride
+        return (
+            int(np.ceil(round(h * gain) / stride) * stride),
+            int(np.ceil(round(w * gain) / stride) * stride)
+        )
+
+    def _letterbox(self, image: np.ndarray, out: np.ndarray) -> Tuple[float, int, int]:
+        """Resize image into the out buffer keeping aspect ratio."""
+        h, w = image.shape[:2]
+        out_h, out_w = out.shape[:2]
+        gain = min(out_h / h, out_w / w)
+        new_w, new_h = int(round(w * gain)), int(round(h * gain))
+        left = int(round((out_w - new_w) / 2 - 0.1))
+        top = int(round((out_h - new_h) / 2 - 0.1))
+
+        out[:] = 114
+        if (new_w, new_h) != (w, h):
+            image = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+        out[top:top + new_h, left:left + new_w] = image
+        return gain, left, top
+
+    def predict(
+        self,
+        images: List[np.ndarray],
+        confidence_threshold: float,
+        class_ids: Optional[Sequence[int]] = None
+    ) -> List[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        Run a batch of BGR images through the model.
+
+        Args:
+            images: Input images as numpy arrays (BGR format from OpenCV)
+            confidence_threshold: Minimum confidence for detections
+            class_ids: Class ids to keep (None keeps every class)
+
+        Returns:
+            One (xyxy int32 (N, 4), confidences float32 (N,), class ids int32 (N,))
+            tuple per image
+        """
+        height, width = self._input_shape(images)
+        canvas = np.empty((len(images), height, width, 3), dtype=np.uint8)
+        transforms = [self._letterbox(image, canvas[i]) for i, image in enumerate(images)]
+
+        # BGR->RGB, HWC->CHW and scaling to [0, 1] in one pass
+        blob = cv2.dnn.blobFromImages(list(canvas), scalefactor=1 / 255.0, swapRB=True)
+        output = self.session.run(None, {self.input_name: blob})[0]
+
+        results = []
+        for pred, image, (gain, left, top) in zip(output, images, transforms):
+            if self.end2end:
+                xyxy, confidences, classes = self._filter_end2end(pred, confidence_threshold, class_ids)
+            else:
+                xyxy, confidences, classes = self._nms(pred, confidence_threshold, class_ids)
+
+            # Undo letterbox and clamp to the source image
+            h, w = image.shape[:2]
+            xyxy = (xyxy - np.array([left, top, left, top], dtype=np.float32)) / gain
+            np.clip(xyxy[:, 0::2], 0, w, out=xyxy[:, 0::2])
+            np.clip(xyxy[:, 1::2], 0, h, out=xyxy[:, 1::2])
+
+            results.append((
+                xyxy.astype(np.int32),
+                confidences.astype(np.float32),
+                classes.astype(np.int32)
+            ))
+
+        return results
+
+    def _nms(
+        self,
+        pred: np.ndarray,
+        confidence_threshold: float,
+        class_ids: Optional[Sequence[int]]
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Decode a raw (4 + nc, anchors) head output and apply class-aware NMS."""
+        pred = pred.T
+        class_scores = pred[:, 4:]
+
+        if class_ids is not None:
+            class_ids = np.asarray(class_ids, dtype=np.int64)
+            class_scores = class_scores[:, class_ids]
+
+        best = class_scores.argmax(axis=1)
+        confidences = class_scores[np.arange(len(best)), best]
+        classes = class_ids[best] if class_ids is not None else best
+
+        keep = confidences > confidence_threshold
+        boxes, confidences, classes = pred[keep, :4], confidences[keep], classes[keep]
+        if len(confidences) == 0:
+            return np.empty((0, 4), dtype=np.float32), confidences, classes
+
+        # cx, cy, w, h -> x, y, w, h (offset per class so classes never suppress each other)
+        xywh = boxes.copy()
+        xywh[:, :2] -= xywh[:, 2:] / 2
+        shifted = xywh.copy()
+        shifted[:, :2] += classes[:, None].astype(np.float32) * 7680
+        indices = cv2.dnn.NMSBoxes(
+            shifted,
+            confidences,
+            confidence_threshold,
+            self.iou_threshold,
+            top_k=self.max_det
+        )
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+
+        xyxy = np.hstack([xywh[indices, :2], xywh[indices, :2] + xywh[indices, 2:4]])
+        return xyxy, confidences[indices], classes[indices]
+
+    def _filter_end2end(
+        self,
+        pred: np.ndarray,
+        confidence_threshold: float,
+        class_ids: Optional[Sequence[int]]
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Filter an NMS-free (max_det, 6) output of x1, y1, x2, y2, conf, cls."""
+        keep = pred[:, 4] > confidence_threshold
+        if class_ids is not None:
+            keep &= np.isin(pred[:, 5].astype(np.int64), np.asarray(class_ids))
+        pred = pred[keep]
+        return pred[:, :4], pred[:, 4], pred[:, 5].astype(np.int64)
@@ -0,0 +1,397 @@
+"""
+Model Registry
+Declarative model specs with lazy loading, a resident memory budget and idle unloading
+"""
+import asyncio
+import gc
+import importlib
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Union
+
+from .base_detector import BaseDetector
+from config.settings import (
+    MODEL_MEMORY_BUDGET_MB, MODEL_IDLE_TTL_SECONDS, WARMUP_INPUT_SIZES, WARMUP_RUNS
+)
+from utils.download import get_download_state
+
+
+class ModelSpec:
+    """
+    Static description of a servable model.
+
+    Attributes:
+        model_id: Identifier used by the API (e.g. "yolo11n")
+        name: Display name
+        description: Short description for the model picker
+        size: Approximate download size shown to users
+        backend: Inference backend ("torch", "onnx", ...)
+        factory: Detector class name exported by the detectors package, or a
+            callable; it is resolved only when the model is first built, so
+            torch / ultralytics are not imported before a model is needed
+        options: Keyword arguments passed to the factory
+    """
+
+    __slots__ = ("model_id", "name", "description", "size", "backend", "factory", "options")
+
+    def __init__(
+        self,
+        model_id: str,
+        name: str,
+        description: str,
+        size: str,
+        factory: Union[str, Callable[..., BaseDetector]],
+        options: Optional[Dict[str, Any]] = None,
+        backend: str = "torch"
+    ):
+        self.model_id = model_id
+        self.name = name
+        self.description = description
+        self.size = size
+        self.backend = backend
+        self.factory = factory
+        self.options = options or {}
+
+    def create(self) -> BaseDetector:
+        """Build a new, not yet loaded detector."""
+        factory = self.factory
+        if isinstance(factory, str):
+            factory = getattr(importlib.import_module(__package__), factory)
+        return factory(**self.options)
+
+
+class _Entry:
+    """Runtime state of one registered model."""
+
+    __slots__ = (
+        "spec", "detector", "resident_bytes", "last_used", "in_use",
+        "load_lock", "load_state", "load_started", "load_seconds", "load_count",
+        "failed_detector", "display_name", "warmed"
+    )
+
+    def __init__(self, spec: ModelSpec):
+        self.spec = spec
+        self.detector: Optional[BaseDetector] = None
+        self.resident_bytes = 0  # Last measured size, kept after unloading
+        self.last_used: Optional[float] = None
+        self.in_use = 0
+
+        # Single-flight loading: one thread loads, the others wait on the lock
+        self.load_lock = threading.Lock()
+        self.load_state = "not_loaded"  # not_loaded | loading | loaded | failed
+        self.load_started: Optional[float] = None
+        self.load_seconds: Optional[float] = None
+        self.load_count = 0  # Completed load attempts
+        self.failed_detector: Optional[BaseDetector] = None
+        self.display_name: Optional[str] = None
+        self.warmed = False
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.detector is not None and self.detector.is_loaded
+
+
+class ModelRegistry:
+    """
+    Lazily constructed detectors kept within a resident memory budget.
+
+    Models are built and loaded on first use. When the loaded models exceed
+    the budget, the least recently used ones are unloaded; models idle for
+    longer than the TTL are unloaded by sweep_idle(). Pinned models and
+    models currently held through use() are never evicted.
+    """
+
+    def __init__(
+        self,
+        specs: List[ModelSpec],
+        budget_mb: int = MODEL_MEMORY_BUDGET_MB,
+        idle_ttl_seconds: int = MODEL_IDLE_TTL_SECONDS
+    ):
+        self._entries: Dict[str, _Entry] = {spec.model_id: _Entry(spec) for spec in specs}
+        self.budget_bytes = budget_mb * 1024 * 1024
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self._pinned = set()
+        self._lock = threading.RLock()
+
+    def model_ids(self) -> List[str]:
+        """All registered model ids, in registration order."""
+        return list(self._entries)
+
+    def __contains__(self, model_id: str) -> bool:
+        return model_id in self._entries
+
+    def get(self, model_id: str) -> BaseDetector:
+        """
+        Return the detector for a model, loading it if needed.
+
+        Loading is single-flight: concurrent callers for the same model
+        wait for the one in-progress load and share its result.
+        If loading failed, the unloaded detector is returned; it finds
+        nothing, and the next get() after that failure tries again.
+
+        Raises:
+            ValueError: If the model id is not registered
+        """
+        entry = self._entry(model_id)
+        with self._lock:
+            entry.last_used = time.time()
+            if entry.is_loaded:
+                return entry.detector
+            attempt = entry.load_count
+
+        with entry.load_lock:
+            with self._lock:
+                if entry.is_loaded:
+                    return entry.detector
+                if entry.load_count != attempt and entry.failed_detector is not None:
+                    # The load we waited for failed; don't retry it for every waiter
+                    return entry.failed_detector
+
+                # Make room up front when the size is known from an earlier load
+                self._enforce_budget(exclude=model_id, incoming=entry.resident_bytes)
+                entry.load_state = "loading"
+                entry.load_started = time.time()
+
+            # Load outside the registry lock so other models are not blocked
+            try:
+                detector = entry.spec.create()
+                entry.display_name = detector.get_model_name()
+                loaded = detector.load_model()
+            except Exception:
+                with self._lock:
+                    self._finish_load(entry, None)
+                raise
+
+            with self._lock:
+                self._finish_load(entry, detector if loaded else None)
+                if not loaded:
+                    entry.failed_detector = detector
+                    return detector
+
+                entry.detector = detector
+                entry.resident_bytes = detector.resident_bytes()
+                print(f"Model {model_id} loaded in {entry.load_seconds:.1f}s "
+                      f"({entry.resident_bytes / (1024 * 1024):.0f} MB resident)")
+                self._enforce_budget(exclude=model_id)
+            return detector
+
+    async def aget(self, model_id: str) -> BaseDetector:
+        """
+        Async get(): a model that still has to be loaded is loaded in a
+        worker thread, so the event loop keeps serving other requests.
+        """
+        entry = self._entry(model_id)
+        with self._lock:
+            if entry.is_loaded:
+                entry.last_used = time.time()
+                return entry.detector
+        return await asyncio.to_thread(self.get, model_id)
+
+    def warm(self, model_id: str) -> bool:
+        """
+        Load a model and run warm-up inference at the configured frame sizes.
+
+        Returns:
+            True if the model is loaded and warmed
+        """
+        entry = self._entry(model_id)
+        with self.use(model_id) as detector:
+            if not detector.is_loaded:
+                return False
+            if entry.warmed:
+                return True
+
+            start = time.time()
+            detector.warmup(WARMUP_INPUT_SIZES, WARMUP_RUNS)
+            with self._lock:
+                entry.warmed = entry.detector is detector
+            print(f"Model {model_id} warmed up in {time.time() - start:.1f}s")
+            return entry.warmed
+
+    async def awarm(self, model_id: str) -> bool:
+        """Async warm(), run in a worker thread."""
+        return await asyncio.to_thread(self.warm, model_id)
+
+    def is_warm(self, model_id: str) -> bool:
+        """Whether a model is loaded and has been warmed up."""
+        entry = self._entry(model_id)
+        with self._lock:
+            return entry.is_loaded and entry.warmed
+
+    @contextmanager
+    def use(self, model_id: str) -> Iterator[BaseDetector]:
+        """Hold a model for a long-running job so it cannot be evicted meanwhile."""
+        entry = self._entry(model_id)
+        with self._lock:
+            entry.in_use += 1
+        try:
+            yield self.get(model_id)
+        finally:
+            with self._lock:
+                entry.in_use -= 1
+                entry.last_used = time.time()
+
+    def set_pinned(self, model_ids: List[str]):
+        """Replace the set of models that are exempt from eviction."""
+        with self._lock:
+            self._pinned = {model_id for model_id in model_ids if model_id in self._entries}
+
+    def unload(self, model_id: str) -> bool:
+        """Unload a model now. Returns False if it was not loaded."""
+        entry = self._entry(model_id)
+        with self._lock:
+            if not entry.is_loaded:
+                return False
+            self._unload(entry, "manual")
+            return True
+
+    def sweep_idle(self) -> List[str]:
+        """Unload models that have been idle for longer than the TTL."""
+        if self.idle_ttl_seconds <= 0:
+            return []
+
+        cutoff = time.time() - self.idle_ttl_seconds
+        unloaded = []
+        with self._lock:
+            for entry in self._entries.values():
+                if self._evictable(entry) and entry.last_used < cutoff:
+                    self._unload(entry, "idle")
+                    unloaded.append(entry.spec.model_id)
+        return unloaded
+
+    async def run_idle_sweeper(self, interval_seconds: float = 60.0):
+        """Background task calling sweep_idle() periodically."""
+        while True:
+            await asyncio.sleep(interval_seconds)
+            self.sweep_idle()
+
+    def resident_bytes(self) -> int:
+        """Total measured size of all loaded models."""
+        with self._lock:
+            return sum(entry.resident_bytes for entry in self._entries.values() if entry.is_loaded)
+
+    def status(self, model_id: str) -> dict:
+        """Runtime status of one model for the API."""
+        entry = self._entry(model_id)
+        loaded = entry.is_loaded
+        return {
+            "loaded": loaded,
+            "resident_mb": round(entry.resident_bytes / (1024 * 1024), 1) if loaded else 0.0,
+            "last_used": entry.last_used,
+            "pinned": model_id in self._pinned,
+            "in_use": entry.in_use,
+            "warmed": loaded and entry.warmed
+        }
+
+    def load_status(self, model_id: str) -> dict:
+        """Load progress of one model: state, timing and download/calibration progress."""
+        entry = self._entry(model_id)
+        with self._lock:
+            state = "loaded" if entry.is_loaded else entry.load_state
+            elapsed = None
+            if state == "loading":
+                elapsed = round(time.time() - entry.load_started, 1)
+            download = get_download_state(entry.display_name) if entry.display_name else None
+            return {
+                "id": model_id,
+                "state": state,
+                "elapsed_seconds": elapsed,
+                "load_seconds": entry.load_seconds,
+                "progress": 100 if state == "loaded" else (download or {}).get("progress", 0),
+                "error": (download or {}).get("error") if state == "failed" else None
+            }
+
+    def specs(self) -> List[ModelSpec]:
+        """All registered specs, in registration order."""
+        return [entry.spec for entry in self._entries.values()]
+
+    def _entry(self, model_id: str) -> _Entry:
+        entry = self._entries.get(model_id)
+        if entry is None:
+            raise ValueError(f"Unknown model: {model_id}")
+        return entry
+
+    def _evictable(self, entry: _Entry) -> bool:
+        return entry.is_loaded and entry.in_use == 0 and entry.spec.model_id not in self._pinned
+
+    def _enforce_budget(self, exclude: str, incoming: int = 0):
+        """Unload least recently used models until loaded + incoming fits the budget."""
+        if self.budget_bytes <= 0:
+            return
+
+        candidates = sorted(
+            (entry for entry in self._entries.values()
+             if entry.spec.model_id != exclude and self._evictable(entry)),
+            key=lambda entry: entry.last_used or 0.0
+        )
+        for entry in candidates:
+            if self.resident_bytes() + incoming <= self.budget_bytes:
+                return
+            self._unload(entry, "memory budget")
+
+        if self.resident_bytes() + incoming > self.budget_bytes:
+            print(f"Model memory budget exceeded: {(self.resident_bytes() + incoming) / (1024 * 1024):.0f} MB "
+                  f"of {self.budget_bytes // (1024 * 1024)} MB, nothing left to evict")
+
+    def _finish_load(self, entry: _Entry, detector: Optional[BaseDetector]):
+        entry.load_count += 1
+        entry.load_seconds = round(time.time() - entry.load_started, 2)
+        entry.load_state = "loaded" if detector is not None else "failed"
+        entry.failed_detector = None
+
+    def _unload(self, entry: _Entry, reason: str):
+        entry.detector.unload_model()
+        entry.detector = None
+        entry.load_state = "not_loaded"
+        entry.warmed = False
+        gc.collect()
+        print(f"Model {entry.spec.model_id} unloaded ({reason})")
+
+
+def _build_default_specs() -> List[ModelSpec]:
+    """Specs for every model the API serves."""
+    specs = [
+        ModelSpec("yolo", "YOLO (Custom)", "Custom-trained for traffic (8 classes)", "~25MB",
+                  "YOLODetector"),
+        ModelSpec("yolo11n", "YOLO11 Nano", "Fastest, basic accuracy", "~5MB",
+                  "YOLOCocoDetector", {"model_size": "n"}),
+        ModelSpec("yolo11s", "YOLO11 Small", "Fast, good accuracy", "~18MB",
+                  "YOLOCocoDetector", {"model_size": "s"}),
+        ModelSpec("yolo11m", "YOLO11 Medium", "Balanced speed/accuracy", "~40MB",
+                  "YOLOCocoDetector", {"model_size": "m"}),
+        ModelSpec("yolo11l", "YOLO11 Large", "High accuracy", "~75MB",
+                  "YOLOCocoDetector", {"model_size": "l"}),
+        ModelSpec("yolo11x", "YOLO11 XLarge", "Best accuracy (default)", "~140MB",
+                  "YOLOCocoDetector", {"model_size": "x"}),
+        ModelSpec("ssd", "SSD300", "VGG16 backbone, COCO", "~100MB", "SSDDetector"),
+        ModelSpec("ssd-int8", "SSD300 INT8", "VGG16 backbone quantized to INT8, CPU", "~35MB",
+                  "SSDInt8Detector", backend="torch-int8"),
+    ]
+
+    # ONNX Runtime (CPU) variants of the YOLO models share the size of their .pt weights
+    onnx_specs = [
+        ModelSpec(
+            f"{spec.model_id}-onnx",
+            f"{spec.name} (ONNX)",
+            f"{spec.description}, ONNX Runtime CPU backend",
+            spec.size,
+            spec.factory,
+            {**spec.options, "backend": "onnx"},
+            backend="onnx"
+        )
+        for spec in specs if spec.model_id.startswith("yolo")
+    ]
+
+    return specs + onnx_specs
+
+
+_registry: Optional[ModelRegistry] = None
+
+
+def get_registry() -> ModelRegistry:
+    """Process-wide registry with the default model specs."""
+    global _registry
+    if _registry is None:
+        _registry = ModelRegistry(_build_default_specs())
+    return _registry
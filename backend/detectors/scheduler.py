@@ -0,0 +1,239 @@
+"""
+Micro-batching Inference Scheduler
+Collects concurrent single-frame requests for a model into batched forward passes
+"""
+import asyncio
+import bisect
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .detection_set import DetectionSet
+from .registry import ModelRegistry, get_registry
+from .worker_pool import pool_for
+from config.settings import BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS
+
+
+# Lower bounds of the queue depth histogram buckets
+_DEPTH_BUCKETS = (0, 1, 2, 4, 8, 16, 32)
+
+
+class _Request:
+    """One frame waiting for inference."""
+
+    __slots__ = ("image", "confidence", "classes", "future", "enqueued")
+
+    def __init__(self, image, confidence, classes, future, enqueued):
+        self.image = image
+        self.confidence = confidence
+        self.classes = classes
+        self.future = future
+        self.enqueued = enqueued
+
+
+class InferenceScheduler:
+    """
+    Dynamic micro-batching for one registry model.
+
+    Requests are queued and a worker task forms batches of up to
+    max_batch_size frames. It waits at most max_wait_ms after the first
+    frame of a batch for more frames to arrive. Each batch is one
+    detect_batch call in a worker thread, run with the lowest confidence
+    threshold and the union of class filters in the batch. The results are
+    then narrowed back down to what each request asked for. Only one batch
+    per model is in flight, so frames arriving while it runs are batched
+    together next. When the inference worker pool serves the model, up to
+    one batch per worker process is in flight instead.
+    """
+
+    def __init__(
+        self,
+        model_id: str,
+        registry: ModelRegistry,
+        max_batch_size: int = BATCH_MAX_SIZE,
+        max_wait_ms: float = BATCH_MAX_WAIT_MS
+    ):
+        self.model_id = model_id
+        self.registry = registry
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_ms = max(0.0, max_wait_ms)
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._in_flight = set()
+
+        # Statistics
+        self.requests = 0
+        self.batches = 0
+        self.batch_size_counts = [0] * (self.max_batch_size + 1)
+        self.queue_depth_counts = [0] * len(_DEPTH_BUCKETS)
+        self.max_queue_depth = 0
+        self.total_wait_ms = 0.0
+        self.total_inference_ms = 0.0
+
+    async def submit(
+        self,
+        image: np.ndarray,
+        confidence_threshold: float = 0.5,
+        classes: Optional[Sequence[str]] = None
+    ) -> DetectionSet:
+        """
+        Queue a frame for detection and wait for its result.
+
+        Args:
+            image: Input image as numpy array (BGR format from OpenCV)
+            confidence_threshold: Minimum confidence for detections
+            classes: Class names to keep (None keeps every class)
+
+        Returns:
+            DetectionSet for the frame
+        """
+        loop = asyncio.get_running_loop()
+        self._ensure_worker(loop)
+
+        request = _Request(image, confidence_threshold, classes, loop.create_future(), time.perf_counter())
+        self._queue.put_nowait(request)
+        self.requests += 1
+        self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+        return await request.future
+
+    def _ensure_worker(self, loop: asyncio.AbstractEventLoop):
+        """Start the batching task on the running loop (again, if the loop changed)."""
+        if self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = None
+            self._in_flight = set()
+        if self._worker is None or self._worker.done():
+            self._worker = loop.create_task(self._run())
+
+    async def _run(self):
+        queue = self._queue
+        loop = asyncio.get_running_loop()
+
+        while True:
+            # Frames keep queueing while every inference slot is busy
+            while len(self._in_flight) >= self._max_in_flight():
+                await asyncio.wait(self._in_flight, return_when=asyncio.FIRST_COMPLETED)
+
+            batch = [await queue.get()]
+            deadline = loop.time() + self.max_wait_ms / 1000
+
+            while len(batch) < self.max_batch_size:
+                if not queue.empty():
+                    batch.append(queue.get_nowait())
+                    continue
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            # Requests whose caller went away don't need a forward pass
+            batch = [request for request in batch if not request.future.done()]
+            if batch:
+                self._record_batch(batch, queue.qsize())
+                task = loop.create_task(self._dispatch(batch))
+                self._in_flight.add(task)
+                task.add_done_callback(self._in_flight.discard)
+
+    def _max_in_flight(self) -> int:
+        pool = pool_for(self.model_id)
+        return pool.num_workers if pool is not None else 1
+
+    async def _dispatch(self, batch: List[_Request]):
+        """Run one forward pass for the batch and hand each request its result."""
+        confidence = min(request.confidence for request in batch)
+        if any(request.classes is None for request in batch):
+            classes = None
+        else:
+            classes = sorted(set().union(*(request.classes for request in batch)))
+
+        start = time.perf_counter()
+        try:
+            results = await asyncio.to_thread(
+                self._infer, [request.image for request in batch], confidence, classes
+            )
+        except Exception as e:
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(e)
+            return
+        self.total_inference_ms += (time.perf_counter() - start) * 1000
+
+        for request, detections in zip(batch, results):
+            if not request.future.done():
+                request.future.set_result(detections.filter(request.confidence, request.classes))
+
+    def _infer(
+        self,
+        images: List[np.ndarray],
+        confidence_threshold: float,
+        classes: Optional[List[str]]
+    ) -> List[DetectionSet]:
+        pool = pool_for(self.model_id)
+        if pool is not None:
+            return pool.detect_batch(images, confidence_threshold, classes)
+        with self.registry.use(self.model_id) as detector:
+            return detector.detect_batch(images, confidence_threshold, classes)
+
+    def _record_batch(self, batch: List[_Request], queue_depth: int):
+        now = time.perf_counter()
+        self.batches += 1
+        self.batch_size_counts[len(batch)] += 1
+        self.queue_depth_counts[bisect.bisect_right(_DEPTH_BUCKETS, queue_depth) - 1] += 1
+        self.total_wait_ms += sum(now - request.enqueued for request in batch) * 1000
+
+    def stats(self) -> dict:
+        """Counters and histograms for the stats endpoint."""
+        served = sum(size * count for size, count in enumerate(self.batch_size_counts))
+        depth_labels = [
+            f"{low}-{high - 1}" if high - 1 > low else str(low)
+            for low, high in zip(_DEPTH_BUCKETS, _DEPTH_BUCKETS[1:])
+        ] + [f"{_DEPTH_BUCKETS[-1]}+"]
+
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "in_flight": len(self._in_flight),
+            "requests": self.requests,
+            "batches": self.batches,
+            "avg_batch_size": round(served / self.batches, 2) if self.batches else 0.0,
+            "avg_queue_wait_ms": round(self.total_wait_ms / served, 2) if served else 0.0,
+            "avg_inference_ms": round(self.total_inference_ms / self.batches, 2) if self.batches else 0.0,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue_depth": self.max_queue_depth,
+            "batch_size_histogram": {
+                str(size): count for size, count in enumerate(self.batch_size_counts) if size > 0
+            },
+            # Frames still waiting when a batch was dispatched
+            "queue_depth_histogram": dict(zip(depth_labels, self.queue_depth_counts))
+        }
+
+
+_schedulers: Dict[str, InferenceScheduler] = {}
+
+
+def get_scheduler(model_id: str) -> InferenceScheduler:
+    """
+    Scheduler for a registry model, created on first use.
+
+    Raises:
+        ValueError: If the model id is not registered
+    """
+    scheduler = _schedulers.get(model_id)
+    if scheduler is None:
+        registry = get_registry()
+        if model_id not in registry:
+            raise ValueError(f"Unknown model: {model_id}")
+        scheduler = _schedulers.setdefault(model_id, InferenceScheduler(model_id, registry))
+    return scheduler
+
+
+def scheduler_stats() -> Dict[str, dict]:
+    """Stats of every scheduler created so far, keyed by model id."""
+    return {model_id: scheduler.stats() for model_id, scheduler in _schedulers.items()}
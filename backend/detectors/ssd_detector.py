@@ -3,25 +3,50 @@ SSD (Single Shot Detector) Implementation
 Uses torchvision's SSD300 with VGG16 backbone
 """
 import os
+import threading
+import cv2
 import numpy as np
-from typing import List
+from typing import List, Dict, Optional, Sequence, Tuple
 from pathlib import Path
 import torch
+import torch.nn.functional as F
 import torchvision
 from torchvision.models.detection import ssd300_vgg16, SSD300_VGG16_Weights
+from torchvision.ops import boxes as box_ops
 
-from .base_detector import BaseDetector, Detection
-from config.settings import SSD_TRAFFIC_CLASSES, CLASS_COLORS, MODELS_DIR
+from .base_detector import BaseDetector
+from .detection_set import DetectionSet
+from config.settings import (
+    SSD_TRAFFIC_CLASSES, SSD_DETECTIONS_PER_IMAGE, CLASS_COLORS, MODELS_DIR
+)
 from utils.download import set_download_state, reset_download_state
 
 
+# SSD300 input resolution
+SSD_INPUT_SIZE = 300
+
+
 class SSDDetector(BaseDetector):
     """SSD300 object detector using torchvision."""
     
     def __init__(self, model_path: str = None):
         super().__init__(model_path)
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        self.transform = None
+        
+        # Name table for the traffic classes SSD can report
+        self.class_names = tuple(dict.fromkeys(SSD_TRAFFIC_CLASSES.values()))
+        label_index = {name: i for i, name in enumerate(self.class_names)}
+        
+        # COCO label -> label id lookup (-1 for non-traffic labels)
+        self._label_lookup = np.full(max(SSD_TRAFFIC_CLASSES) + 1, -1, dtype=np.int32)
+        for coco_label, name in SSD_TRAFFIC_CLASSES.items():
+            self._label_lookup[coco_label] = label_index[name]
+        
+        # Per-call score threshold and label subset read by the head postprocess
+        self._call_options = threading.local()
+        
+        # Per-thread preprocessing buffer, reused across frames
+        self._buffers = threading.local()
         
         # Set torch hub to models directory
         torch.hub.set_dir(str(MODELS_DIR))
@@ -32,7 +57,7 @@ class SSDDetector(BaseDetector):
             # Track download state
             set_download_state(
                 is_downloading=True,
-                model_name="SSD300 (VGG16)",
+                model_name=self.get_model_name(),
                 progress=0
             )
             
@@ -42,16 +67,17 @@ class SSDDetector(BaseDetector):
             self.model.to(self.device)
             self.model.eval()
             
-            # Get transforms
-            self.transform = weights.transforms()
+            # Only score the requested labels instead of all 90 COCO classes
+            self.model.detections_per_img = SSD_DETECTIONS_PER_IMAGE
+            self.model.postprocess_detections = self._postprocess_detections
             
             self.is_loaded = True
-            reset_download_state()
+            reset_download_state(self.get_model_name())
             print(f"SSD300 model loaded (COCO weights, device: {self.device})")
             print(f"Model cache: {MODELS_DIR}")
             return True
         except Exception as e:
-            reset_download_state()
+            reset_download_state(self.get_model_name(), error=str(e))
             print(f"Failed to load SSD model: {e}")
             self.is_loaded = False
             return False
@@ -59,78 +85,174 @@ class SSDDetector(BaseDetector):
     def detect(
         self,
         image: np.ndarray,
-        confidence_threshold: float = 0.5
-    ) -> List[Detection]:
+        confidence_threshold: float = 0.5,
+        classes: Optional[Sequence[str]] = None
+    ) -> DetectionSet:
         """
         Perform SSD detection on an image.
         
         Args:
             image: Input image as numpy array (BGR format from OpenCV)
             confidence_threshold: Minimum confidence for detections
+            classes: Class names to keep (None keeps every traffic class)
             
         Returns:
-            List of Detection objects
+            DetectionSet with all detections in the image
         """
+        return self.detect_batch([image], confidence_threshold, classes)[0]
+    
+    def detect_batch(
+        self,
+        images: List[np.ndarray],
+        confidence_threshold: float = 0.5,
+        classes: Optional[Sequence[str]] = None
+    ) -> List[DetectionSet]:
+        """
+        Perform SSD detection on a batch of images in one forward pass.
+        
+        Args:
+            images: Input images as numpy arrays (BGR format from OpenCV)
+            confidence_threshold: Minimum confidence for detections
+            classes: Class names to keep (None keeps every traffic class)
+            
+        Returns:
+            One DetectionSet per input image, in order
+        """
+        if not images:
+            return []
+        
         if not self.is_loaded:
-            if not self.load_model():
-                return []
+            return [DetectionSet.empty(self.class_names) for _ in images]
         
-        detections = []
+        labels = self.class_ids_for(classes)
+        if not labels:
+            return [DetectionSet.empty(self.class_names) for _ in images]
         
         try:
-            # Convert BGR to RGB
-            image_rgb = image[:, :, ::-1].copy()
-            
-            # Convert to PIL Image then to tensor
-            from PIL import Image
-            pil_image = Image.fromarray(image_rgb)
+            input_batch = self._preprocess(images)
             
-            # Apply transforms
-            input_tensor = self.transform(pil_image)
-            input_batch = input_tensor.unsqueeze(0).to(self.device)
-            
-            # Run inference
+            # Run inference (inputs are already 300x300, so boxes come back in that frame)
+            self._call_options.labels = labels
+            self._call_options.score_thresh = confidence_threshold
             with torch.no_grad():
                 predictions = self.model(input_batch)
             
-            # Process predictions
-            pred = predictions[0]
-            boxes = pred["boxes"].cpu().numpy()
-            scores = pred["scores"].cpu().numpy()
-            labels = pred["labels"].cpu().numpy()
-            
-            # Get image dimensions for denormalization
-            h, w = image.shape[:2]
-            
-            for box, score, label in zip(boxes, scores, labels):
-                if score >= confidence_threshold:
-                    # Map COCO class to traffic class
-                    label_int = int(label)
-                    if label_int in SSD_TRAFFIC_CLASSES:
-                        class_name = SSD_TRAFFIC_CLASSES[label_int]
-                        
-                        # Get coordinates (already in pixel format from SSD)
-                        x1, y1, x2, y2 = box.astype(int)
-                        
-                        # Clamp to image bounds
-                        x1 = max(0, min(x1, w))
-                        y1 = max(0, min(y1, h))
-                        x2 = max(0, min(x2, w))
-                        y2 = max(0, min(y2, h))
-                        
-                        detections.append(Detection(
-                            class_name=class_name,
-                            confidence=float(score),
-                            bbox=(x1, y1, x2, y2),
-                            class_id=label_int
-                        ))
+            return [
+                self._parse_prediction(pred, image.shape[:2])
+                for pred, image in zip(predictions, images)
+            ]
         
         except Exception as e:
             print(f"SSD detection error: {e}")
             import traceback
             traceback.print_exc()
+            return [DetectionSet.empty(self.class_names) for _ in images]
+    
+    def _preprocess(self, images: List[np.ndarray]) -> torch.Tensor:
+        """
+        Convert BGR frames into a (B, 3, 300, 300) RGB float batch in [0, 1].
+        
+        Frames are resized while still uint8, then written straight into a
+        reused per-thread buffer; the BGR->RGB swap and HWC->CHW transpose
+        happen as part of that single converting copy.
+        """
+        batch = self._input_buffer(len(images))
+        size = (SSD_INPUT_SIZE, SSD_INPUT_SIZE)
+        
+        for i, image in enumerate(images):
+            resized = cv2.resize(image, size, interpolation=cv2.INTER_LINEAR)
+            np.copyto(batch[i], resized.transpose(2, 0, 1)[::-1], casting="unsafe")
+        
+        np.multiply(batch, 1 / 255.0, out=batch)
+        return torch.from_numpy(batch).to(self.device)
+    
+    def _input_buffer(self, batch_size: int) -> np.ndarray:
+        """This thread's float32 input buffer, grown to hold batch_size frames."""
+        buffer = getattr(self._buffers, "input", None)
+        if buffer is None or len(buffer) < batch_size:
+            buffer = np.empty((batch_size, 3, SSD_INPUT_SIZE, SSD_INPUT_SIZE), dtype=np.float32)
+            self._buffers.input = buffer
+        return buffer[:batch_size]
+    
+    def class_ids_for(self, classes: Optional[Sequence[str]]) -> Optional[List[int]]:
+        """COCO labels of the traffic classes whose name is in classes."""
+        if classes is None:
+            return sorted(SSD_TRAFFIC_CLASSES)
+        wanted = set(classes)
+        return sorted(label for label, name in SSD_TRAFFIC_CLASSES.items() if name in wanted)
+    
+    def _postprocess_detections(
+        self,
+        head_outputs: Dict[str, torch.Tensor],
+        image_anchors: List[torch.Tensor],
+        image_shapes: List[Tuple[int, int]]
+    ) -> List[Dict[str, torch.Tensor]]:
+        """
+        Replacement for torchvision's SSD.postprocess_detections.
+        
+        Same decoding, top-k and NMS, but only for the labels and score
+        threshold of the current call, and boxes are decoded only for
+        anchors that pass the threshold.
+        """
+        model = self.model
+        labels = getattr(self._call_options, "labels", None) or sorted(SSD_TRAFFIC_CLASSES)
+        score_thresh = getattr(self._call_options, "score_thresh", model.score_thresh)
+        
+        bbox_regression = head_outputs["bbox_regression"]
+        pred_scores = F.softmax(head_outputs["cls_logits"], dim=-1)
+        device = pred_scores.device
+        
+        detections = []
+        for boxes, scores, anchors, image_shape in zip(bbox_regression, pred_scores, image_anchors, image_shapes):
+            image_boxes = []
+            image_scores = []
+            image_labels = []
+            
+            for label in labels:
+                score = scores[:, label]
+                keep_idxs = torch.nonzero(score > score_thresh).squeeze(1)
+                
+                # Keep only the top-k scoring anchors for this label
+                score, order = score[keep_idxs].topk(min(model.topk_candidates, keep_idxs.numel()))
+                keep_idxs = keep_idxs[order]
+                
+                image_boxes.append(model.box_coder.decode_single(boxes[keep_idxs], anchors[keep_idxs]))
+                image_scores.append(score)
+                image_labels.append(torch.full_like(score, fill_value=label, dtype=torch.int64, device=device))
+            
+            image_boxes = box_ops.clip_boxes_to_image(torch.cat(image_boxes, dim=0), image_shape)
+            image_scores = torch.cat(image_scores, dim=0)
+            image_labels = torch.cat(image_labels, dim=0)
+            
+            # Non-maximum suppression
+            keep = box_ops.batched_nms(image_boxes, image_scores, image_labels, model.nms_thresh)
+            keep = keep[: model.detections_per_img]
+            
+            detections.append({
+                "boxes": image_boxes[keep],
+                "scores": image_scores[keep],
+                "labels": image_labels[keep],
+            })
         
         return detections
     
+    def _parse_prediction(self, pred: dict, image_shape: tuple) -> DetectionSet:
+        """Convert a single SSD prediction dict into a DetectionSet."""
+        boxes = pred["boxes"].cpu().numpy()
+        scores = pred["scores"].cpu().numpy()
+        labels = pred["labels"].cpu().numpy().astype(np.int32)
+        
+        # Scale boxes from the 300x300 input back to the frame and clamp to its bounds
+        h, w = image_shape
+        scale = np.array([w, h, w, h], dtype=np.float32) / SSD_INPUT_SIZE
+        xyxy = (boxes * scale).astype(np.int32)
+        np.clip(xyxy[:, 0::2], 0, w, out=xyxy[:, 0::2])
+        np.clip(xyxy[:, 1::2], 0, h, out=xyxy[:, 1::2])
+        
+        # Postprocess only emits traffic labels, so the lookup never hits -1
+        label_ids = self._label_lookup[labels]
+        
+        return DetectionSet(xyxy, scores, labels, label_ids, self.class_names)
+    
     def get_model_name(self) -> str:
         return "SSD300 (VGG16)"
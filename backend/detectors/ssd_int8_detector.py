@@ -0,0 +1,148 @@
+"""
+INT8 Quantized SSD Implementation
+SSD300 with a post-training static INT8 VGG16 backbone for CPU serving
+"""
+import hashlib
+import warnings
+from pathlib import Path
+from typing import List
+
+import cv2
+import torch
+
+from .ssd_detector import SSDDetector
+from utils.download import set_download_state, reset_download_state
+from config.settings import MODELS_DIR, SSD_CALIBRATION_DIR, SSD_CALIBRATION_MAX_FRAMES
+
+
+CALIBRATION_FORMATS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def select_quantized_engine() -> str:
+    """Pick the best available quantized kernel backend (x86 > fbgemm > qnnpack)."""
+    engines = torch.backends.quantized.supported_engines
+    for engine in ("x86", "fbgemm", "qnnpack"):
+        if engine in engines:
+            return engine
+    raise RuntimeError("No quantized engine available in this PyTorch build")
+
+
+class SSDInt8Detector(SSDDetector):
+    """
+    SSD300 detector with an INT8 VGG16 backbone.
+
+    The backbone (VGG16 features plus the extra SSD blocks, nearly all of
+    the compute) is quantized with FX graph mode static post-training
+    quantization. Activation ranges are calibrated on frames from a local
+    folder. The result is cached in MODELS_DIR as TorchScript so later
+    loads skip calibration. The heads and postprocessing stay in fp32.
+    """
+
+    def __init__(self, model_path: str = None, calibration_dir: str = None):
+        super().__init__(model_path)
+        # Quantized kernels only run on CPU
+        self.device = torch.device("cpu")
+        self.calibration_dir = Path(calibration_dir or SSD_CALIBRATION_DIR)
+        self.backbone_path = None
+
+    def load_model(self) -> bool:
+        """Load the fp32 SSD model, then swap in the quantized backbone."""
+        if not super().load_model():
+            return False
+
+        self.is_loaded = False
+        try:
+            engine = select_quantized_engine()
+            torch.backends.quantized.engine = engine
+
+            frames = self._calibration_frames()
+            cache_path = self._cache_path(engine, frames)
+
+            if cache_path.exists():
+                backbone = torch.jit.load(str(cache_path), map_location="cpu")
+            else:
+                backbone = self._quantize_backbone(frames)
+                torch.jit.save(backbone, str(cache_path))
+                print(f"INT8 SSD backbone cached: {cache_path}")
+
+            self.model.backbone = backbone
+            self.backbone_path = cache_path
+            reset_download_state(self.get_model_name())
+            self.is_loaded = True
+            print(f"SSD300 INT8 model ready (engine: {engine})")
+            return True
+        except Exception as e:
+            reset_download_state(self.get_model_name(), error=str(e))
+            print(f"Failed to quantize SSD model: {e}")
+            self.model = None
+            return False
+
+    def _calibration_frames(self) -> List[Path]:
+        """Calibration frames, capped at SSD_CALIBRATION_MAX_FRAMES."""
+        if not self.calibration_dir.is_dir():
+            raise FileNotFoundError(
+                f"Calibration folder not found: {self.calibration_dir} "
+                "(set SSD_CALIBRATION_DIR to a folder of representative frames)"
+            )
+
+        frames = sorted(
+            path for path in self.calibration_dir.iterdir()
+            if path.suffix.lower() in CALIBRATION_FORMATS
+        )[:SSD_CALIBRATION_MAX_FRAMES]
+
+        if not frames:
+            raise FileNotFoundError(f"No calibration frames in {self.calibration_dir}")
+        return frames
+
+    def _cache_path(self, engine: str, frames: List[Path]) -> Path:
+        """Cache file keyed by engine and calibration set (names and sizes)."""
+        digest = hashlib.sha256()
+        for path in frames:
+            digest.update(f"{path.name}:{path.stat().st_size};".encode())
+        return MODELS_DIR / f"ssd300_vgg16_int8_{engine}_{digest.hexdigest()[:12]}.pt"
+
+    def _quantize_backbone(self, frames: List[Path]) -> torch.jit.ScriptModule:
+        """Calibrate and convert the backbone to INT8, returning it as TorchScript."""
+        from torch.ao.quantization import get_default_qconfig_mapping
+        from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+        print(f"Calibrating INT8 SSD backbone on {len(frames)} frames...")
+
+        # The backbone sees the normalized 300x300 batch produced by model.transform
+        def backbone_input(paths: List[Path]) -> torch.Tensor:
+            images = [cv2.imread(str(path), cv2.IMREAD_COLOR) for path in paths]
+            images = [image for image in images if image is not None]
+            batch, _ = self.model.transform(self._preprocess(images))
+            return batch.tensors
+
+        example = backbone_input(frames[:1])
+        qconfig_mapping = get_default_qconfig_mapping(torch.backends.quantized.engine)
+
+        with warnings.catch_warnings():
+            # FX quantization is in maintenance mode and warns on every call
+            warnings.simplefilter("ignore")
+            prepared = prepare_fx(self.model.backbone, qconfig_mapping, example_inputs=(example,))
+
+            with torch.no_grad():
+                for start in range(0, len(frames), 8):
+                    prepared(backbone_input(frames[start:start + 8]))
+                    set_download_state(
+                        is_downloading=True,
+                        model_name=self.get_model_name(),
+                        progress=int(100 * min(start + 8, len(frames)) / len(frames))
+                    )
+
+            quantized = convert_fx(prepared)
+
+            with torch.no_grad():
+                scripted = torch.jit.trace(quantized, example, strict=False)
+                return torch.jit.freeze(scripted)
+
+    def resident_bytes(self) -> int:
+        """fp32 head weights plus the quantized backbone, whose frozen weights are not parameters."""
+        if not self.is_loaded or self.backbone_path is None:
+            return 0
+        return super().resident_bytes() + self.backbone_path.stat().st_size
+    
+    def get_model_name(self) -> str:
+        return "SSD300 (VGG16, INT8)"
@@ -0,0 +1,395 @@
+"""
+Multi-process Inference Worker Pool
+Runs one model in N worker processes; frames travel through shared memory
+"""
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from multiprocessing.shared_memory import SharedMemory
+from typing import Callable, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from .base_detector import BaseDetector
+from .detection_set import DetectionSet
+from .registry import ModelSpec, get_registry
+from config.settings import (
+    INFERENCE_WORKERS, WORKER_POOL_MODEL, WORKER_TORCH_THREADS, WORKER_CV2_THREADS,
+    WORKER_SLOT_MB, WORKER_START_METHOD, BATCH_MAX_SIZE, WARMUP_INPUT_SIZES, WARMUP_RUNS
+)
+
+# How often a caller waiting for a free worker checks that the pool is still up
+IDLE_POLL_SECONDS = 1.0
+
+
+def _worker_main(
+    index: int,
+    detector: Optional[BaseDetector],
+    spec: ModelSpec,
+    shm_name: str,
+    slot_bytes: int,
+    conn,
+    torch_threads: int,
+    cv2_threads: int
+):
+    """
+    Worker process loop.
+
+    With the fork start method the detector arrives already loaded, so its
+    weights are shared copy-on-write with the parent and the other workers;
+    otherwise the worker loads its own replica from the spec.
+    """
+    import cv2
+    import torch
+
+    torch.set_num_threads(torch_threads)
+    cv2.setNumThreads(cv2_threads)
+
+    shm = SharedMemory(name=shm_name)
+    try:
+        if detector is None:
+            detector = spec.create()
+            if not detector.load_model():
+                conn.send(("failed", f"Could not load {spec.model_id}"))
+                return
+        detector.warmup(WARMUP_INPUT_SIZES, WARMUP_RUNS)
+        conn.send(("ready", detector.class_names, detector.get_model_name()))
+
+        while True:
+            message = conn.recv()
+            if message is None:
+                break
+
+            frames, confidence_threshold, classes = message
+            images = [
+                frame if isinstance(frame, np.ndarray)
+                else np.ndarray(frame[1], dtype=np.uint8, buffer=shm.buf, offset=frame[0] * slot_bytes)
+                for frame in frames
+            ]
+            try:
+                results = detector.detect_batch(images, confidence_threshold, classes)
+                conn.send(("ok", [
+                    (d.boxes, d.scores, d.class_ids, d.label_ids) for d in results
+                ]))
+            except Exception as e:
+                conn.send(("error", f"{type(e).__name__}: {e}"))
+            finally:
+                del images
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        shm.close()
+
+
+class _Worker:
+    """Parent-side handle of one worker process."""
+
+    def __init__(self, index: int, process, conn, shm: SharedMemory):
+        self.index = index
+        self.process = process
+        self.conn = conn
+        self.shm = shm
+        self.alive = True
+        self.jobs = 0
+        self.frames = 0
+        self.busy_seconds = 0.0
+
+
+class InferenceWorkerPool:
+    """
+    N worker processes, each holding a replica of one model.
+
+    Callers hand a batch to detect_batch(), which blocks until a worker is
+    free. The frames are written into that worker's shared memory slots
+    and only their slot and shape go through the pipe. Frames larger than
+    a slot are sent through the pipe instead. Results come back as the
+    DetectionSet arrays, which are small.
+    """
+
+    def __init__(
+        self,
+        model_id: str,
+        num_workers: int = INFERENCE_WORKERS,
+        torch_threads: int = WORKER_TORCH_THREADS,
+        cv2_threads: int = WORKER_CV2_THREADS,
+        slot_bytes: int = WORKER_SLOT_MB * 1024 * 1024,
+        slots_per_worker: int = BATCH_MAX_SIZE,
+        start_method: str = WORKER_START_METHOD
+    ):
+        self.model_id = model_id
+        self.spec = next(spec for spec in get_registry().specs() if spec.model_id == model_id)
+        self.num_workers = max(1, num_workers)
+        self.torch_threads = torch_threads or max(1, (os.cpu_count() or 1) // self.num_workers)
+        self.cv2_threads = cv2_threads
+        self.slot_bytes = slot_bytes
+        self.slots_per_worker = max(1, slots_per_worker)
+        self.start_method = start_method
+
+        self.class_names = ()
+        self.model_name = model_id
+        self.ready = False
+        self._workers: List[_Worker] = []
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._lock = threading.Lock()
+
+    def start(self) -> bool:
+        """
+        Start the workers and wait until each has loaded and warmed up its model.
+
+        Call this before running inference in the parent: forking a process
+        whose torch thread pools are already running is not safe.
+        """
+        context = mp.get_context(self.start_method)
+
+        # Load once in the parent so forked workers share the weights
+        detector = None
+        if self.start_method == "fork":
+            detector = self.spec.create()
+            if not detector.load_model():
+                print(f"Worker pool: could not load {self.model_id}")
+                return False
+
+        for index in range(self.num_workers):
+            shm = SharedMemory(create=True, size=self.slot_bytes * self.slots_per_worker)
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(
+                target=_worker_main,
+                args=(index, detector, self.spec, shm.name, self.slot_bytes, child_conn,
+                      self.torch_threads, self.cv2_threads),
+                name=f"inference-worker-{index}",
+                daemon=True
+            )
+            process.start()
+            child_conn.close()
+            self._workers.append(_Worker(index, process, parent_conn, shm))
+
+        # The parent copy is no longer needed; forked workers keep the shared pages
+        del detector
+
+        for worker in self._workers:
+            try:
+                message = worker.conn.recv()
+            except EOFError:
+                message = ("failed", "worker exited during startup")
+            if message[0] != "ready":
+                print(f"Worker pool: worker {worker.index} failed: {message[1]}")
+                worker.alive = False
+                continue
+            _, self.class_names, self.model_name = message
+            self._idle.put(worker)
+
+        self.ready = any(worker.alive for worker in self._workers)
+        print(f"Worker pool: {sum(w.alive for w in self._workers)}/{self.num_workers} workers serving "
+              f"{self.model_id} ({self.start_method}, {self.torch_threads} torch threads each)")
+        return self.ready
+
+    def detect_batch(
+        self,
+        images: List[np.ndarray],
+        confidence_threshold: float = 0.5,
+        classes: Optional[Sequence[str]] = None
+    ) -> List[DetectionSet]:
+        """
+        Run a batch on the next free worker, blocking until it is done.
+
+        Batches larger than a worker's slots are sent in consecutive chunks.
+        Raises RuntimeError when the pool is down, also while waiting for a
+        worker (e.g. after the last one died).
+        """
+        if not images:
+            return []
+
+        worker = None
+        while worker is None:
+            if not self.ready:
+                raise RuntimeError(f"Worker pool for {self.model_id} is not running")
+            try:
+                worker = self._idle.get(timeout=IDLE_POLL_SECONDS)
+            except queue.Empty:
+                pass
+        start = time.perf_counter()
+        try:
+            results = []
+            for offset in range(0, len(images), self.slots_per_worker):
+                chunk = images[offset:offset + self.slots_per_worker]
+                results.extend(self._run_chunk(worker, chunk, confidence_threshold, classes))
+            return results
+        finally:
+            worker.busy_seconds += time.perf_counter() - start
+            if worker.alive:
+                self._idle.put(worker)
+
+    def _run_chunk(self, worker: _Worker, images, confidence_threshold, classes) -> List[DetectionSet]:
+        frames = []
+        for slot, image in enumerate(images):
+            image = np.ascontiguousarray(image, dtype=np.uint8)
+            if image.nbytes <= self.slot_bytes:
+                view = np.ndarray(image.shape, dtype=np.uint8, buffer=worker.shm.buf, offset=slot * self.slot_bytes)
+                view[...] = image
+                frames.append((slot, image.shape))
+            else:
+                frames.append(image)
+
+        try:
+            worker.conn.send((frames, confidence_threshold, list(classes) if classes is not None else None))
+            status, payload = worker.conn.recv()
+        except (EOFError, BrokenPipeError, OSError) as e:
+            self._mark_dead(worker)
+            raise RuntimeError(f"Inference worker {worker.index} died: {e}")
+
+        if status != "ok":
+            raise RuntimeError(f"Inference worker {worker.index} error: {payload}")
+
+        worker.jobs += 1
+        worker.frames += len(images)
+        return [
+            DetectionSet(boxes, scores, class_ids, label_ids, self.class_names)
+            for boxes, scores, class_ids, label_ids in payload
+        ]
+
+    def _mark_dead(self, worker: _Worker):
+        with self._lock:
+            worker.alive = False
+            self.ready = any(w.alive for w in self._workers)
+        print(f"Worker pool: worker {worker.index} is gone")
+
+    def shutdown(self):
+        """Stop the workers and release their shared memory."""
+        self.ready = False
+        for worker in self._workers:
+            try:
+                worker.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for worker in self._workers:
+            worker.process.join(timeout=5)
+            if worker.process.is_alive():
+                worker.process.terminate()
+            worker.shm.close()
+            worker.shm.unlink()
+        self._workers = []
+
+    def stats(self) -> dict:
+        """Per-worker counters for the API."""
+        return {
+            "model": self.model_id,
+            "ready": self.ready,
+            "start_method": self.start_method,
+            "torch_threads": self.torch_threads,
+            "cv2_threads": self.cv2_threads,
+            "idle_workers": self._idle.qsize(),
+            "workers": [
+                {
+                    "index": worker.index,
+                    "pid": worker.process.pid,
+                    "alive": worker.alive and worker.process.is_alive(),
+                    "jobs": worker.jobs,
+                    "frames": worker.frames,
+                    "busy_seconds": round(worker.busy_seconds, 2)
+                }
+                for worker in self._workers
+            ]
+        }
+
+
+class PooledDetector(BaseDetector):
+    """
+    Detector interface in front of a worker pool, for code that expects a BaseDetector.
+
+    If the pool goes down, batches run on the detector returned by
+    fallback (when given) instead.
+    """
+
+    def __init__(self, pool: InferenceWorkerPool, fallback: Optional[Callable[[], BaseDetector]] = None):
+        super().__init__()
+        self.pool = pool
+        self.fallback = fallback
+        self.class_names = pool.class_names
+        self.is_loaded = pool.ready
+        self._fallback_detector: Optional[BaseDetector] = None
+
+    def load_model(self) -> bool:
+        return self.pool.ready
+
+    def detect(
+        self,
+        image: np.ndarray,
+        confidence_threshold: float = 0.5,
+        classes: Optional[Sequence[str]] = None
+    ) -> DetectionSet:
+        return self.detect_batch([image], confidence_threshold, classes)[0]
+
+    def detect_batch(
+        self,
+        images: List[np.ndarray],
+        confidence_threshold: float = 0.5,
+        classes: Optional[Sequence[str]] = None
+    ) -> List[DetectionSet]:
+        if self._fallback_detector is None:
+            try:
+                return self.pool.detect_batch(images, confidence_threshold, classes)
+            except RuntimeError:
+                if self.pool.ready or self.fallback is None:
+                    raise
+                print(f"Worker pool for {self.pool.model_id} is down, continuing in process")
+                self._fallback_detector = self.fallback()
+        return self._fallback_detector.detect_batch(images, confidence_threshold, classes)
+
+    def get_model_name(self) -> str:
+        return self.pool.model_name
+
+
+_pool: Optional[InferenceWorkerPool] = None
+
+
+def start_worker_pool(model_id: str = WORKER_POOL_MODEL) -> Optional[InferenceWorkerPool]:
+    """Start the process-wide worker pool if INFERENCE_WORKERS > 0."""
+    global _pool
+    if INFERENCE_WORKERS <= 0 or _pool is not None:
+        return _pool
+    pool = InferenceWorkerPool(model_id)
+    if pool.start():
+        _pool = pool
+    else:
+        pool.shutdown()
+    return _pool
+
+
+def get_worker_pool() -> Optional[InferenceWorkerPool]:
+    """The running worker pool, if any."""
+    return _pool
+
+
+def stop_worker_pool():
+    """Shut the worker pool down (on application shutdown)."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
+
+
+def pool_for(model_id: str) -> Optional[InferenceWorkerPool]:
+    """The worker pool if it is running and serves model_id, else None."""
+    if _pool is not None and _pool.ready and _pool.model_id == model_id:
+        return _pool
+    return None
+
+
+@contextmanager
+def use_detector(model_id: str) -> Iterator[BaseDetector]:
+    """
+    Detector for a long-running job: the worker pool when it serves the
+    model, otherwise the registry's instance held through registry.use().
+    A job that started on the pool moves to the registry's instance if the
+    pool goes down midway.
+    """
+    pool = pool_for(model_id)
+    if pool is not None:
+        with ExitStack() as stack:
+            yield PooledDetector(pool, lambda: stack.enter_context(get_registry().use(model_id)))
+        return
+    with get_registry().use(model_id) as detector:
+        yield detector
@@ -2,11 +2,14 @@
 YOLO COCO Detector Implementation - Pre-trained on COCO dataset
 Detects 80 classes including various vehicle types
 """
+import threading
+
 import numpy as np
-from typing import List
-from ultralytics import YOLO
+from typing import List, Optional, Sequence
 
-from .base_detector import BaseDetector, Detection
+from .base_detector import BaseDetector
+from .detection_set import DetectionSet
+from .yolo_detector import YOLO_BACKENDS, extract_boxes, load_yolo_model
 from utils.download import set_download_state, reset_download_state
 
 
@@ -41,36 +44,70 @@ COCO_CLASS_NAMES = [
 class YOLOCocoDetector(BaseDetector):
     """YOLO detector using pre-trained COCO weights for broader detection."""
     
-    def __init__(self, model_size: str = "n"):
+    def __init__(self, model_size: str = "n", backend: str = "torch"):
         """
         Initialize YOLO COCO detector.
         
         Args:
             model_size: Model size - 'n' (nano), 's' (small), 'm' (medium), 'l' (large), 'x' (xlarge)
+            backend: Inference backend - 'torch' (ultralytics) or 'onnx' (onnxruntime, CPU)
         """
+        if backend not in YOLO_BACKENDS:
+            raise ValueError(f"Unknown YOLO backend: {backend}")
+        
         # Use ultralytics pretrained model (will download automatically)
         super().__init__(f"yolo11{model_size}.pt")
         self.model_size = model_size
+        self.backend = backend
         self.filter_traffic = True  # Only return traffic-related detections
+        # One ultralytics predict() at a time (see YOLODetector)
+        self._predict_lock = threading.Lock()
+        
+        self._build_label_lookup(len(COCO_CLASS_NAMES))
+    
+    def _build_label_lookup(self, num_classes: int):
+        """
+        Build the class-name table and COCO id -> label id lookup arrays.
+        
+        Traffic classes map to their standard names; other classes keep
+        their COCO name and are marked -1 in the traffic-only lookup.
+        """
+        names = [
+            COCO_CLASS_NAMES[i] if i < len(COCO_CLASS_NAMES) else f"Class_{i}"
+            for i in range(num_classes)
+        ]
+        self.class_names = tuple(dict.fromkeys(list(COCO_TRAFFIC_MAPPING.values()) + names))
+        label_index = {name: i for i, name in enumerate(self.class_names)}
+        
+        self._full_lookup = np.array(
+            [label_index[COCO_TRAFFIC_MAPPING.get(i, names[i])] for i in range(num_classes)],
+            dtype=np.int32
+        )
+        self._traffic_lookup = np.full(num_classes, -1, dtype=np.int32)
+        for class_id, name in COCO_TRAFFIC_MAPPING.items():
+            if class_id < num_classes:
+                self._traffic_lookup[class_id] = label_index[name]
     
     def load_model(self) -> bool:
         """Load the YOLO COCO model."""
         try:
             set_download_state(
                 is_downloading=True,
-                model_name=f"YOLO11-{self.model_size.upper()} (COCO)",
+                model_name=self.get_model_name(),
                 progress=0
             )
             
             # This will auto-download pretrained COCO weights
-            self.model = YOLO(self.model_path)
+            self.model = load_yolo_model(self.model_path, self.backend)
+            if len(self.model.names) != len(self._full_lookup):
+                self._build_label_lookup(len(self.model.names))
             self.is_loaded = True
             
-            reset_download_state()
-            print(f"YOLO COCO model loaded: {self.model_path}")
+            reset_download_state(self.get_model_name())
+            print(f"YOLO COCO model loaded: {self.model_path} ({self.backend} backend)")
             return True
         except Exception as e:
-            reset_download_state()
+            reset_download_state(self.get_model_name(), error=str(e))
             print(f"Failed to load YOLO COCO model: {e}")
             self.is_loaded = False
             return False
@@ -78,58 +115,111 @@ class YOLOCocoDetector(BaseDetector):
     def detect(
         self,
         image: np.ndarray,
-        confidence_threshold: float = 0.5
-    ) -> List[Detection]:
+        confidence_threshold: float = 0.5,
+        classes: Optional[Sequence[str]] = None
+    ) -> DetectionSet:
         """
         Perform detection using COCO-trained YOLO.
         
         Args:
             image: Input image as numpy array (BGR format from OpenCV)
             confidence_threshold: Minimum confidence for detections
+            classes: Class names to keep (None keeps every class)
+            
+        Returns:
+            DetectionSet with all detections in the image
+        """
+        return self.detect_batch([image], confidence_threshold, classes)[0]
+    
+    def detect_batch(
+        self,
+        images: List[np.ndarray],
+        confidence_threshold: float = 0.5,
+        classes: Optional[Sequence[str]] = None
+    ) -> List[DetectionSet]:
+        """
+        Perform detection on a batch of images in one forward pass.
+        
+        Args:
+            images: Input images as numpy arrays (BGR format from OpenCV)
+            confidence_threshold: Minimum confidence for detections
+            classes: Class names to keep (None keeps every class)
             
         Returns:
-            List of Detection objects
+            One DetectionSet per input image, in order
         """
+        if not images:
+            return []
+        
         if not self.is_loaded:
-            if not self.load_model():
-                return []
+            return [DetectionSet.empty(self.class_names) for _ in images]
         
-        detections = []
+        # Restrict NMS to the wanted classes; nothing to run if none match
+        class_ids = self.class_ids_for(classes)
+        if class_ids is not None and not class_ids:
+            return [DetectionSet.empty(self.class_names) for _ in images]
         
         try:
-            # Run inference
-            results = self.model(image, conf=confidence_threshold, verbose=False)
+            # Run inference on the whole batch
+            if self.backend == "onnx":
+                outputs = self.model.predict(list(images), confidence_threshold, class_ids)
+                return [self._build_set(*output) for output in outputs]
             
-            for result in results:
-                boxes = result.boxes
-                if boxes is not None:
-                    for box in boxes:
-                        # Get coordinates
-                        x1, y1, x2, y2 = box.xyxy[0].cpu().numpy().astype(int)
-                        confidence = float(box.conf[0].cpu().numpy())
-                        class_id = int(box.cls[0].cpu().numpy())
-                        
-                        # Filter to traffic-related classes only
-                        if self.filter_traffic and class_id not in COCO_TRAFFIC_MAPPING:
-                            continue
-                        
-                        # Get class name (use mapped name or original COCO name)
-                        if class_id in COCO_TRAFFIC_MAPPING:
-                            class_name = COCO_TRAFFIC_MAPPING[class_id]
-                        else:
-                            class_name = COCO_CLASS_NAMES[class_id] if class_id < len(COCO_CLASS_NAMES) else f"Class_{class_id}"
-                        
-                        detections.append(Detection(
-                            class_name=class_name,
-                            confidence=confidence,
-                            bbox=(x1, y1, x2, y2),
-                            class_id=class_id
-                        ))
+            with self._predict_lock:
+                results = self.model(
+                    list(images), conf=confidence_threshold, classes=class_ids, verbose=False
+                )
+            return [self._parse_result(result) for result in results]
         
         except Exception as e:
             print(f"YOLO COCO detection error: {e}")
+            return [DetectionSet.empty(self.class_names) for _ in images]
+    
+    def class_ids_for(self, classes: Optional[Sequence[str]]) -> Optional[List[int]]:
+        """
+        COCO class ids whose mapped name is in classes.
+        
+        With filter_traffic enabled the traffic classes are always passed to
+        the model, so the other 73 COCO classes never reach NMS.
+        """
+        lookup = self._traffic_lookup if self.filter_traffic else self._full_lookup
+        
+        if classes is None:
+            if not self.filter_traffic:
+                return None
+            return np.flatnonzero(lookup >= 0).tolist()
         
-        return detections
+        names = set(classes)
+        wanted = {i for i, name in enumerate(self.class_names) if name in names}
+        return [class_id for class_id, label_id in enumerate(lookup.tolist()) if label_id in wanted]
+    
+    def _parse_result(self, result) -> DetectionSet:
+        """Convert a single ultralytics result into a DetectionSet."""
+        return self._build_set(*extract_boxes(result))
+    
+    def _build_set(
+        self,
+        xyxy: np.ndarray,
+        confidences: np.ndarray,
+        class_ids: np.ndarray
+    ) -> DetectionSet:
+        """Build a DetectionSet from extracted box arrays."""
+        # Map COCO ids to labels; -1 marks non-traffic classes to drop
+        lookup = self._traffic_lookup if self.filter_traffic else self._full_lookup
+        label_ids = lookup[class_ids]
+        keep = label_ids >= 0
+        
+        return DetectionSet(
+            xyxy[keep], confidences[keep], class_ids[keep], label_ids[keep], self.class_names
+        )
+    
+    def resident_bytes(self) -> int:
+        """Weight memory; for ONNX sessions, the size of the exported graph."""
+        if self.is_loaded and self.backend == "onnx":
+            return self.model.onnx_path.stat().st_size
+        return super().resident_bytes()
     
     def get_model_name(self) -> str:
+        if self.backend == "onnx":
+            return f"YOLO11-{self.model_size.upper()} (COCO, ONNX)"
         return f"YOLO11-{self.model_size.upper()} (COCO)"
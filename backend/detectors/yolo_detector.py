@@ -1,38 +1,97 @@
 """
 YOLO v11 Detector Implementation
 """
+import threading
+
 import numpy as np
-from typing import List
+from typing import List, Tuple, Optional, Sequence
 from ultralytics import YOLO
 
-from .base_detector import BaseDetector, Detection
-from config.settings import CLASS_NAMES, YOLO_MODEL_PATH
+from .base_detector import BaseDetector
+from .detection_set import DetectionSet
+from config.settings import CLASS_NAMES, YOLO_MODEL_PATH, ONNX_IMGSZ, ONNX_OPSET
 from utils.download import set_download_state, reset_download_state
 
 
+def extract_boxes(result) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Pull all boxes of an ultralytics result out as whole arrays.
+    
+    The (N, 6) ``boxes.data`` tensor is copied to host memory once instead
+    of indexing xyxy, conf and cls for every box separately.
+    
+    Returns:
+        (xyxy int32 (N, 4), confidences float32 (N,), class ids int32 (N,))
+    """
+    boxes = result.boxes
+    if boxes is None or len(boxes) == 0:
+        return (
+            np.empty((0, 4), dtype=np.int32),
+            np.empty(0, dtype=np.float32),
+            np.empty(0, dtype=np.int32)
+        )
+    
+    data = boxes.data.cpu().numpy()
+    xyxy = data[:, :4].astype(np.int32)
+    confidences = data[:, -2].astype(np.float32)
+    class_ids = data[:, -1].astype(np.int32)
+    return xyxy, confidences, class_ids
+
+
+YOLO_BACKENDS = ("torch", "onnx")
+
+
+def load_yolo_model(model_path: str, backend: str):
+    """
+    Load YOLO weights for the given inference backend.
+    
+    "torch" serves the .pt weights through ultralytics; "onnx" exports them
+    once to the ONNX cache and serves them through onnxruntime on CPU.
+    """
+    if backend == "onnx":
+        from .onnx_backend import OnnxYOLOSession, export_onnx
+        return OnnxYOLOSession(export_onnx(model_path, ONNX_IMGSZ, ONNX_OPSET), ONNX_IMGSZ)
+    return YOLO(model_path)
+
+
 class YOLODetector(BaseDetector):
     """YOLO v11 object detector using ultralytics."""
     
-    def __init__(self, model_path: str = None):
+    def __init__(self, model_path: str = None, backend: str = "torch"):
+        if backend not in YOLO_BACKENDS:
+            raise ValueError(f"Unknown YOLO backend: {backend}")
         super().__init__(model_path or str(YOLO_MODEL_PATH))
+        self.backend = backend
+        self.class_names = tuple(CLASS_NAMES)
+        # ultralytics' predict() stores conf/classes on the shared predictor
+        # before taking its own lock, so concurrent callers (scheduler and
+        # video jobs) could run with each other's settings
+        self._predict_lock = threading.Lock()
     
     def load_model(self) -> bool:
         """Load the YOLO model."""
         try:
             set_download_state(
                 is_downloading=True,
-                model_name="YOLO v11",
+                model_name=self.get_model_name(),
                 progress=0
             )
             
-            self.model = YOLO(self.model_path)
+            self.model = load_yolo_model(self.model_path, self.backend)
+            
+            # Name table indexed by model class id
+            num_classes = len(self.model.names)
+            self.class_names = tuple(
+                CLASS_NAMES[i] if i < len(CLASS_NAMES) else f"Class_{i}"
+                for i in range(num_classes)
+            )
             self.is_loaded = True
             
-            reset_download_state()
-            print(f"YOLO model loaded from {self.model_path}")
+            reset_download_state(self.get_model_name())
+            print(f"YOLO model loaded from {self.model_path} ({self.backend} backend)")
             return True
         except Exception as e:
-            reset_download_state()
+            reset_download_state(self.get_model_name(), error=str(e))
             print(f"Failed to load YOLO model: {e}")
             self.is_loaded = False
             return False
@@ -40,54 +99,95 @@ class YOLODetector(BaseDetector):
     def detect(
         self,
         image: np.ndarray,
-        confidence_threshold: float = 0.5
-    ) -> List[Detection]:
+        confidence_threshold: float = 0.5,
+        classes: Optional[Sequence[str]] = None
+    ) -> DetectionSet:
         """
         Perform YOLO detection on an image.
         
         Args:
             image: Input image as numpy array (BGR format from OpenCV)
             confidence_threshold: Minimum confidence for detections
+            classes: Class names to keep (None keeps every class)
             
         Returns:
-            List of Detection objects
+            DetectionSet with all detections in the image
         """
+        return self.detect_batch([image], confidence_threshold, classes)[0]
+    
+    def detect_batch(
+        self,
+        images: List[np.ndarray],
+        confidence_threshold: float = 0.5,
+        classes: Optional[Sequence[str]] = None
+    ) -> List[DetectionSet]:
+        """
+        Perform YOLO detection on a batch of images in one forward pass.
+        
+        Args:
+            images: Input images as numpy arrays (BGR format from OpenCV)
+            confidence_threshold: Minimum confidence for detections
+            classes: Class names to keep (None keeps every class)
+            
+        Returns:
+            One DetectionSet per input image, in order
+        """
+        if not images:
+            return []
+        
+        # Loading is left to the registry, which loads each model once under its lock
         if not self.is_loaded:
-            if not self.load_model():
-                return []
+            return [DetectionSet.empty(self.class_names) for _ in images]
         
-        detections = []
+        # Restrict NMS to the wanted classes; nothing to run if none match
+        class_ids = self.class_ids_for(classes)
+        if class_ids is not None and not class_ids:
+            return [DetectionSet.empty(self.class_names) for _ in images]
         
         try:
-            # Run inference
-            results = self.model(image, conf=confidence_threshold, verbose=False)
+            # Run inference on the whole batch
+            if self.backend == "onnx":
+                outputs = self.model.predict(list(images), confidence_threshold, class_ids)
+                return [self._build_set(*output) for output in outputs]
             
-            for result in results:
-                boxes = result.boxes
-                if boxes is not None:
-                    for box in boxes:
-                        # Get coordinates
-                        x1, y1, x2, y2 = box.xyxy[0].cpu().numpy().astype(int)
-                        confidence = float(box.conf[0].cpu().numpy())
-                        class_id = int(box.cls[0].cpu().numpy())
-                        
-                        # Get class name
-                        if class_id < len(CLASS_NAMES):
-                            class_name = CLASS_NAMES[class_id]
-                        else:
-                            class_name = f"Class_{class_id}"
-                        
-                        detections.append(Detection(
-                            class_name=class_name,
-                            confidence=confidence,
-                            bbox=(x1, y1, x2, y2),
-                            class_id=class_id
-                        ))
+            with self._predict_lock:
+                results = self.model(
+                    list(images), conf=confidence_threshold, classes=class_ids, verbose=False
+                )
+            return [self._parse_result(result) for result in results]
         
         except Exception as e:
             print(f"YOLO detection error: {e}")
-        
-        return detections
+            return [DetectionSet.empty(self.class_names) for _ in images]
+    
+    def class_ids_for(self, classes: Optional[Sequence[str]]) -> Optional[List[int]]:
+        """Model class ids whose name is in classes (None = all classes)."""
+        if classes is None:
+            return None
+        wanted = set(classes)
+        return [i for i, name in enumerate(self.class_names) if name in wanted]
+    
+    def _parse_result(self, result) -> DetectionSet:
+        """Convert a single ultralytics result into a DetectionSet."""
+        return self._build_set(*extract_boxes(result))
+    
+    def _build_set(
+        self,
+        xyxy: np.ndarray,
+        confidences: np.ndarray,
+        class_ids: np.ndarray
+    ) -> DetectionSet:
+        """Build a DetectionSet from extracted box arrays."""
+        # Class ids index the name table directly
+        return DetectionSet(xyxy, confidences, class_ids, class_ids, self.class_names)
+    
+    def resident_bytes(self) -> int:
+        """Weight memory; for ONNX sessions, the size of the exported graph."""
+        if self.is_loaded and self.backend == "onnx":
+            return self.model.onnx_path.stat().st_size
+        return super().resident_bytes()
     
     def get_model_name(self) -> str:
+        if self.backend == "onnx":
+            return "YOLO v11 (ONNX)"
         return "YOLO v11"
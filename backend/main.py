@@ -1,6 +1,7 @@
 """
 Traffic Detection Backend - FastAPI Application
 """
+import asyncio
 import sys
 from pathlib import Path
 
@@ -11,7 +12,10 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
-from config.settings import CORS_ORIGINS, API_PREFIX
+from config.settings import (
+    CORS_ORIGINS, API_PREFIX, PRELOAD_MODELS, INFERENCE_WORKERS, WORKER_POOL_MODEL,
+    SEGMENT_BROKER_DB, SEGMENT_LOCAL_WORKERS
+)
 from routes.detection import router as detection_router
 from routes.camera import router as camera_router
 from routes.video import router as video_router
@@ -49,22 +53,74 @@ async def root():
         "version": "1.0.0",
         "description": "YOLO v11 + SSD Traffic Detection",
         "docs": "/docs",
-        "health": "/api/health"
+        "health": "/api/health",
+        "ready": "/api/health/ready"
     }
 
 
+async def preload_models(model_ids: list):
+    """Load and warm up models one by one; /api/health/ready reports when the active one is done."""
+    from detectors.registry import get_registry
+    from detectors.worker_pool import start_worker_pool, pool_for
+    registry = get_registry()
+    
+    # Fork the inference workers before this process runs any inference itself
+    if INFERENCE_WORKERS > 0:
+        if WORKER_POOL_MODEL not in registry:
+            print(f"⚠️ Unknown WORKER_POOL_MODEL: {WORKER_POOL_MODEL}")
+        elif await asyncio.to_thread(start_worker_pool, WORKER_POOL_MODEL):
+            print(f"✅ {WORKER_POOL_MODEL} served by {INFERENCE_WORKERS} inference workers")
+        else:
+            print(f"⚠️ Could not start inference workers, {WORKER_POOL_MODEL} runs in-process")
+    
+    for model_id in dict.fromkeys(model_ids):
+        if pool_for(model_id) is not None:
+            continue
+        if model_id not in registry:
+            print(f"⚠️ Unknown model in PRELOAD_MODELS: {model_id}")
+            continue
+        try:
+            if await registry.awarm(model_id):
+                print(f"✅ {model_id} model pre-loaded and warmed up")
+            else:
+                print(f"⚠️ Could not pre-load {model_id} model")
+        except Exception as e:
+            print(f"⚠️ Could not pre-load {model_id} model: {e}")
+
+
 @app.on_event("startup")
 async def startup_event():
-    """Pre-load YOLO model on startup."""
+    """Start loading the active and configured models in the background."""
     print("🚀 Starting Traffic Detection API...")
     
-    # Pre-load YOLO model
-    try:
-        from routes.detection import get_detector
-        get_detector("yolo")
-        print("✅ YOLO model pre-loaded")
-    except Exception as e:
-        print(f"⚠️ Could not pre-load YOLO model: {e}")
+    # Keep the active model resident and unload idle ones in the background
+    from detectors.registry import get_registry
+    from routes.detection import active_models, _active_model
+    registry = get_registry()
+    registry.set_pinned(active_models(_active_model))
+    app.state.idle_sweeper = asyncio.create_task(registry.run_idle_sweeper())
+    
+    # Segment workers on this machine for the broker queue (other nodes run scripts/segment_worker.py)
+    app.state.segment_workers = []
+    if SEGMENT_BROKER_DB and SEGMENT_LOCAL_WORKERS > 0:
+        from processors.segment_broker import start_local_workers
+        app.state.segment_workers = start_local_workers(SEGMENT_LOCAL_WORKERS)
+    
+    # Serve liveness right away; readiness flips once the active model is warm
+    app.state.preload = asyncio.create_task(
+        preload_models(active_models(_active_model) + PRELOAD_MODELS)
+    )
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the inference and segment worker processes."""
+    from detectors.worker_pool import stop_worker_pool
+    from processors.segments import stop_segment_pool
+    from processors.segment_broker import stop_local_workers
+    stop_worker_pool()
+    stop_segment_pool()
+    stop_local_workers(getattr(app.state, "segment_workers", []))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,159 @@
+"""
+Video Frame Sources
+Decode input videos to BGR frames with timestamps, optionally downscaled while decoding
+"""
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+from config.settings import VIDEO_DECODER, VIDEO_DECODE_MAX_SIDE, VIDEO_DECODE_THREADS
+
+try:
+    import av
+except ImportError:  # PyAV is optional
+    av = None
+
+FRAME_DECODERS = ("auto", "opencv", "pyav")
+
+
+def scaled_size(width: int, height: int, max_side: int) -> Tuple[int, int]:
+    """
+    Size with the longer side at most max_side, keeping the aspect ratio.
+
+    Dimensions stay even (for H.264 output). max_side <= 0 or a smaller
+    source keeps the source size.
+    """
+    if max_side <= 0 or max(width, height) <= max_side:
+        return width, height
+    scale = max_side / max(width, height)
+    return max(2, int(round(width * scale / 2)) * 2), max(2, int(round(height * scale / 2)) * 2)
+
+
+class OpenCVFrameSource:
+    """
+    Frames from cv2.VideoCapture (single-threaded decode at source resolution,
+    then resized if max_side asks for it).
+    """
+
+    name = "opencv"
+
+    def __init__(self, path: str, max_side: int = 0):
+        self.cap = cv2.VideoCapture(path)
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30
+        self.frame_count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.source_width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.source_height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.width, self.height = scaled_size(self.source_width, self.source_height, max_side)
+        self.timestamp: Optional[float] = None  # seconds, of the last frame read
+
+    def isOpened(self) -> bool:
+        return self.cap.isOpened()
+
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        ret, frame = self.cap.read()
+        if not ret:
+            return False, None
+        self.timestamp = self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000
+        if (self.width, self.height) != (self.source_width, self.source_height):
+            frame = cv2.resize(frame, (self.width, self.height), interpolation=cv2.INTER_AREA)
+        return True, frame
+
+    def release(self):
+        self.cap.release()
+
+
+class PyAVFrameSource:
+    """
+    Frames decoded by PyAV (FFmpeg's decoders in-process).
+
+    Decoding uses FFmpeg's frame/slice threading, and the conversion to
+    BGR happens in swscale at the target size, so a 4K source never
+    exists as a full-size BGR array. Timestamps come from the stream's
+    presentation times, which stay correct for variable frame rate files.
+
+    ``start`` and ``end`` (seconds) restrict reading to frames with
+    start <= timestamp < end; the source seeks to the keyframe at or
+    before start.
+    """
+
+    name = "pyav"
+
+    def __init__(
+        self,
+        path: str,
+        max_side: int = 0,
+        threads: int = VIDEO_DECODE_THREADS,
+        start: float = 0.0,
+        end: Optional[float] = None
+    ):
+        self.container = None
+        self.timestamp: Optional[float] = None
+        try:
+            self.container = av.open(path)
+            stream = self.container.streams.video[0]
+        except (av.FFmpegError, IndexError) as e:
+            print(f"PyAV could not open {path}: {e}")
+            if self.container is not None:
+                self.container.close()
+                self.container = None
+            return
+
+        stream.thread_type = "AUTO"
+        if threads > 0:
+            stream.thread_count = threads
+        self.fps = float(stream.average_rate or stream.guessed_rate or 30)
+        self.frame_count = stream.frames or (
+            int(float(stream.duration * stream.time_base) * self.fps) if stream.duration else 0
+        )
+        self.source_width = stream.codec_context.width
+        self.source_height = stream.codec_context.height
+        self.width, self.height = scaled_size(self.source_width, self.source_height, max_side)
+        # Frames within half a frame of a bound count as on it
+        self._start = start - 0.5 / self.fps
+        self._end = end - 0.5 / self.fps if end is not None else None
+        if start > 0:
+            self.container.seek(int(start / stream.time_base), stream=stream, backward=True)
+        self._frames = self.container.decode(stream)
+        self._index = 0
+
+    def isOpened(self) -> bool:
+        return self.container is not None
+
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        while True:
+            frame = next(self._frames, None) if self.container is not None else None
+            if frame is None:
+                return False, None
+            self._index += 1
+            self.timestamp = frame.time if frame.time is not None else (self._index - 1) / self.fps
+            if self.timestamp >= self._start:
+                break
+        if self._end is not None and self.timestamp >= self._end:
+            return False, None
+        image = frame.to_ndarray(
+            width=self.width, height=self.height, format="bgr24", interpolation="AREA"
+        )
+        return True, image
+
+    def release(self):
+        if self.container is not None:
+            self.container.close()
+            self.container = None
+
+
+def open_frame_source(path: str, decoder: Optional[str] = None, max_side: Optional[int] = None):
+    """
+    Open a video with the given decoder ("auto" = PyAV when installed, else OpenCV).
+
+    Check isOpened() on the result.
+    """
+    decoder = decoder or VIDEO_DECODER
+    max_side = VIDEO_DECODE_MAX_SIDE if max_side is None else max_side
+    if decoder not in FRAME_DECODERS:
+        raise ValueError(f"Unknown decoder: {decoder}. Valid options: {list(FRAME_DECODERS)}")
+    if decoder == "pyav" and av is None:
+        raise ValueError("The pyav decoder needs PyAV (pip install av)")
+    if decoder == "opencv" or av is None:
+        return OpenCVFrameSource(path, max_side)
+    return PyAVFrameSource(path, max_side)
@@ -0,0 +1,170 @@
+"""
+Box Fusion for Ensembles
+Combines detections from several models with vectorized NMS or weighted box fusion
+"""
+from typing import Sequence
+
+import numpy as np
+
+from detectors.detection_set import DetectionSet
+
+FUSION_METHODS = ("nms", "wbf")
+
+
+def pairwise_iou(boxes: np.ndarray) -> np.ndarray:
+    """
+    IoU of every pair of boxes.
+
+    Args:
+        boxes: (N, 4) array of x1, y1, x2, y2
+
+    Returns:
+        (N, N) float64 IoU matrix
+    """
+    boxes = boxes.astype(np.float64)
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+
+    x1 = np.maximum(boxes[:, None, 0], boxes[None, :, 0])
+    y1 = np.maximum(boxes[:, None, 1], boxes[None, :, 1])
+    x2 = np.minimum(boxes[:, None, 2], boxes[None, :, 2])
+    y2 = np.minimum(boxes[:, None, 3], boxes[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    union = areas[:, None] + areas[None, :] - inter
+    return np.divide(inter, union, out=np.zeros(inter.shape), where=union > 0)
+
+
+def _overlaps(detections: DetectionSet, iou_threshold: float, class_aware: bool) -> np.ndarray:
+    """Boolean matrix of pairs that overlap enough to be the same object."""
+    overlaps = pairwise_iou(detections.boxes) > iou_threshold
+    if class_aware:
+        overlaps &= detections.label_ids[:, None] == detections.label_ids[None, :]
+    return overlaps
+
+
+def _clusters(overlaps: np.ndarray) -> np.ndarray:
+    """
+    Greedy clustering in row order (rows sorted by descending score).
+
+    Each row not yet taken starts a cluster and takes every untaken row it
+    overlaps. Returns the cluster index of every row; cluster k is led by
+    the k-th leader in row order.
+    """
+    cluster = np.full(len(overlaps), -1, dtype=np.int64)
+    count = 0
+    for i in range(len(overlaps)):
+        if cluster[i] >= 0:
+            continue
+        members = overlaps[i] & (cluster < 0)
+        members[i] = True
+        cluster[members] = count
+        count += 1
+    return cluster
+
+
+def nms(detections: DetectionSet, iou_threshold: float = 0.5, class_aware: bool = True) -> DetectionSet:
+    """
+    Non-maximum suppression over a set of detections.
+
+    Args:
+        detections: Detections to suppress, in any order
+        iou_threshold: Boxes overlapping a higher-scoring box by more than this are dropped
+        class_aware: Only suppress boxes with the same class name
+
+    Returns:
+        Surviving detections, highest score first
+    """
+    if len(detections) < 2:
+        return detections
+
+    order = np.argsort(-detections.scores, kind="stable")
+    ordered = detections.select(order)
+    cluster = _clusters(_overlaps(ordered, iou_threshold, class_aware))
+
+    # The first row of each cluster is its leader
+    _, leaders = np.unique(cluster, return_index=True)
+    return ordered.select(leaders)
+
+
+def weighted_box_fusion(
+    sets: Sequence[DetectionSet],
+    iou_threshold: float = 0.55,
+    class_aware: bool = True
+) -> DetectionSet:
+    """
+    Weighted box fusion across the outputs of several models.
+
+    Boxes are clustered around the highest-scoring box, and each cluster
+    becomes one box whose coordinates are the score-weighted mean of its
+    members. The cluster score is the mean member score, scaled down when
+    fewer models than were run contributed to the cluster. The class is
+    taken from the best-scoring member.
+
+    Args:
+        sets: One DetectionSet per model, for the same image
+        iou_threshold: Overlap above which boxes join a cluster
+        class_aware: Only cluster boxes with the same class name
+
+    Returns:
+        Fused detections, highest score first
+    """
+    sets = [s for s in sets if s is not None]
+    num_models = max(1, len(sets))
+    combined = DetectionSet.concatenate(sets)
+    if len(combined) == 0:
+        return combined
+
+    source = np.concatenate([np.full(len(s), i) for i, s in enumerate(sets)])
+    order = np.argsort(-combined.scores, kind="stable")
+    ordered = combined.select(order)
+    source = source[order]
+    cluster = _clusters(_overlaps(ordered, iou_threshold, class_aware))
+    count = cluster.max() + 1
+
+    scores = ordered.scores.astype(np.float64)
+    weight = np.bincount(cluster, weights=scores, minlength=count)
+    boxes = np.stack([
+        np.bincount(cluster, weights=ordered.boxes[:, k] * scores, minlength=count)
+        for k in range(4)
+    ], axis=1) / np.maximum(weight, 1e-9)[:, None]
+
+    members = np.bincount(cluster, minlength=count)
+    contributing = np.zeros((count, num_models), dtype=bool)
+    contributing[cluster, source] = True
+    fused_scores = weight / members * contributing.sum(axis=1) / num_models
+
+    _, leaders = np.unique(cluster, return_index=True)
+
+    rank = np.argsort(-fused_scores, kind="stable")
+    return DetectionSet(
+        np.rint(boxes[rank]),
+        fused_scores[rank],
+        ordered.class_ids[leaders[rank]],
+        ordered.label_ids[leaders[rank]],
+        ordered.class_names
+    )
+
+
+def fuse_detections(
+    sets: Sequence[DetectionSet],
+    method: str = "nms",
+    iou_threshold: float = 0.5,
+    class_aware: bool = True
+) -> DetectionSet:
+    """
+    Combine the detections several models produced for one image.
+
+    Args:
+        sets: One DetectionSet per model
+        method: "nms" keeps the best box of each overlapping group, "wbf"
+            averages them (weighted box fusion)
+        iou_threshold: Overlap above which boxes are considered the same object
+        class_aware: Only combine boxes with the same class name
+
+    Returns:
+        Combined DetectionSet
+    """
+    if method == "nms":
+        return nms(DetectionSet.concatenate(sets), iou_threshold, class_aware)
+    if method == "wbf":
+        return weighted_box_fusion(sets, iou_threshold, class_aware)
+    raise ValueError(f"Unknown fusion method: {method}. Valid options: {list(FUSION_METHODS)}")
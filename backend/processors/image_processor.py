@@ -4,9 +4,12 @@ Image Processing Utilities
 import cv2
 import numpy as np
 import base64
-from typing import List, Tuple, Dict
+from typing import List, Tuple, Dict, Optional, Sequence
 
-from detectors.base_detector import BaseDetector, Detection
+from detectors.base_detector import BaseDetector
+from detectors.detection_set import DetectionSet
+from config.settings import CLASS_COLORS, TRACK_MIN_HITS
+from .statistics import StreamingStatistics
 
 
 class ImageProcessor:
@@ -17,45 +20,81 @@ class ImageProcessor:
         image: np.ndarray,
         detector: BaseDetector,
         confidence_threshold: float = 0.5,
-        draw_boxes: bool = True
-    ) -> Tuple[np.ndarray, List[Dict]]:
+        draw_boxes: bool = True,
+        classes: Optional[Sequence[str]] = None
+    ) -> Tuple[np.ndarray, DetectionSet]:
         """
         Process an image: detect objects and annotate.
         """
         # Run detection
-        detections = detector.detect(image, confidence_threshold)
-        
-        # Convert detections to dictionary format using the built-in to_dict
-        detection_results = [det.to_dict() for det in detections]
+        detections = detector.detect(image, confidence_threshold, classes)
         
         # Draw annotations if requested
-        annotated_image = image.copy()
         if draw_boxes:
-            annotated_image = ImageProcessor.draw_detections(annotated_image, detections)
+            annotated_image = ImageProcessor.draw_detections(image, detections)
+        else:
+            annotated_image = image.copy()
             
-        return annotated_image, detection_results
+        return annotated_image, detections
 
     @staticmethod
-    def draw_detections(image: np.ndarray, detections: List[Detection]) -> np.ndarray:
+    def process_batch(
+        images: List[np.ndarray],
+        detector: BaseDetector,
+        confidence_threshold: float = 0.5,
+        draw_boxes: bool = True,
+        classes: Optional[Sequence[str]] = None
+    ) -> List[Tuple[np.ndarray, DetectionSet]]:
+        """
+        Process a batch of images with a single batched detector call.
+        
+        Returns one (annotated_image, detections) pair per input image.
+        """
+        batch_detections = detector.detect_batch(images, confidence_threshold, classes)
+        
+        results = []
+        for image, detections in zip(images, batch_detections):
+            if draw_boxes:
+                annotated_image = ImageProcessor.draw_detections(image, detections)
+            else:
+                annotated_image = image.copy()
+            
+            results.append((annotated_image, detections))
+        
+        return results
+
+    @staticmethod
+    def draw_detections(image: np.ndarray, detections: DetectionSet) -> np.ndarray:
         """Draw detections on the image."""
         annotated_image = image.copy()
-        for det in detections:
-            x1, y1, x2, y2 = det.bbox
+        img_h, img_w = annotated_image.shape[:2]
+        names = detections.class_names
+        
+        font = cv2.FONT_HERSHEY_SIMPLEX
+        font_scale = 0.7
+        font_thickness = 2
+        padding = 5
+        
+        track_ids = detections.track_ids.tolist() if detections.track_ids is not None else [None] * len(detections)
+        
+        for (x1, y1, x2, y2), confidence, label_id, track_id in zip(
+            detections.boxes.tolist(),
+            detections.scores.tolist(),
+            detections.label_ids.tolist(),
+            track_ids
+        ):
+            class_name = names[label_id]
             
             # Use class colors from settings
-            from config.settings import CLASS_COLORS
-            color = CLASS_COLORS.get(det.class_name, (0, 255, 0))
+            color = CLASS_COLORS.get(class_name, (0, 255, 0))
             
             # Draw thicker bounding box
             cv2.rectangle(annotated_image, (x1, y1), (x2, y2), color, 3)
             
             # Prepare label
-            label = f"{det.class_name} {det.confidence:.0%}"
-            
-            # Use larger font for better visibility
-            font = cv2.FONT_HERSHEY_SIMPLEX
-            font_scale = 0.7
-            font_thickness = 2
+            label = f"{class_name} {confidence:.0%}"
+            if track_id is not None:
+                label = f"#{track_id} {label}"
             
             # Get text size
             (text_w, text_h), baseline = cv2.getTextSize(label, font, font_scale, font_thickness)
@@ -64,17 +103,18 @@ class ImageProcessor:
             label_y = y1 - 10 if y1 > 35 else y1 + text_h + 10
             label_x = x1
             
-            # Draw background rectangle with padding
-            padding = 5
+            # Background rectangle with padding
             bg_y1 = label_y - text_h - padding
             bg_y2 = label_y + padding
             bg_x1 = label_x - padding
             bg_x2 = label_x + text_w + padding
             
-            # Semi-transparent dark background
-            overlay = annotated_image.copy()
-            cv2.rectangle(overlay, (bg_x1, bg_y1), (bg_x2, bg_y2), (0, 0, 0), -1)
-            cv2.addWeighted(overlay, 0.7, annotated_image, 0.3, 0, annotated_image)
+            # Semi-transparent dark background, blended only inside the label area
+            roi_x1, roi_y1 = max(bg_x1, 0), max(bg_y1, 0)
+            roi_x2, roi_y2 = min(bg_x2 + 1, img_w), min(bg_y2 + 1, img_h)
+            if roi_x2 > roi_x1 and roi_y2 > roi_y1:
+                roi = annotated_image[roi_y1:roi_y2, roi_x1:roi_x2]
+                cv2.convertScaleAbs(roi, roi, alpha=0.3)
             
             # Draw colored border around label
             cv2.rectangle(annotated_image, (bg_x1, bg_y1), (bg_x2, bg_y2), color, 2)
@@ -86,40 +126,20 @@ class ImageProcessor:
         return annotated_image
 
     @staticmethod
-    def calculate_statistics(detections: List[Dict]) -> Dict:
-        """Calculate complete statistics for frontend."""
-        total_objects = len(detections)
-        class_counts = {}
-        unique_classes = set()
-        confidence_sum = 0.0
-        has_pedestrians = False
-        has_vehicles = False
-        
-        vehicle_classes = ["Car", "Truck", "Van", "Cyclist", "Tram", "Motorcycle", "Bus"]
-        pedestrian_classes = ["Pedestrian", "Person", "Person_sitting"]
-        
-        for det in detections:
-            # Note: detection dict from det.to_dict() uses key "class"
-            name = det.get("class") or det.get("class_name")
-            class_counts[name] = class_counts.get(name, 0) + 1
-            unique_classes.add(name)
-            confidence_sum += det["confidence"]
-            
-            if name in pedestrian_classes:
-                has_pedestrians = True
-            if name in vehicle_classes:
-                has_vehicles = True
+    def calculate_statistics(detections: DetectionSet, min_track_hits: int = TRACK_MIN_HITS) -> Dict:
+        """
+        Calculate complete statistics for frontend.
         
-        avg_confidence = confidence_sum / total_objects if total_objects > 0 else 0
+        For detections carrying track ids, ``tracked_objects`` and
+        ``tracked_class_counts`` count every track once (under its most
+        frequent class) instead of once per row. Tracks seen fewer than
+        min_track_hits times are left out as likely noise.
         
-        return {
-            "total_objects": total_objects,
-            "unique_classes": len(unique_classes),
-            "avg_confidence": avg_confidence,
-            "class_counts": class_counts,
-            "has_pedestrians": has_pedestrians,
-            "has_vehicles": has_vehicles
-        }
+        Video paths feed StreamingStatistics frame by frame instead.
+        """
+        stats = StreamingStatistics(min_track_hits=min_track_hits)
+        stats.update(detections)
+        return stats.summary()
 
     @staticmethod
     def encode_image_to_base64(image: np.ndarray, format: str = ".jpg") -> str:
@@ -0,0 +1,237 @@
+"""
+Staged Video Pipeline
+Decoding, inference and annotation/writing run on their own threads, linked by bounded queues
+"""
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from detectors.detection_set import DetectionSet
+from config.settings import VIDEO_PIPELINE_QUEUE
+
+_END = object()
+# How often blocked stages check whether the pipeline was stopped
+_POLL_SECONDS = 0.1
+
+
+class _Failure:
+    """Carries an exception raised in a stage to the consumer."""
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+class StageStats:
+    """Time a stage spent working and waiting on its queues."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.busy = 0.0
+        self.wait_in = 0.0   # blocked on an empty input queue (upstream is slower)
+        self.wait_out = 0.0  # blocked on a full output queue (downstream is slower)
+
+    def as_dict(self, wall: float) -> Dict[str, Any]:
+        return {
+            "items": self.items,
+            "busy_seconds": round(self.busy, 3),
+            "wait_in_seconds": round(self.wait_in, 3),
+            "wait_out_seconds": round(self.wait_out, 3),
+            "utilization": round(self.busy / wall, 3) if wall > 0 else 0.0
+        }
+
+
+class FramePipeline:
+    """
+    Three-stage frame pipeline over an open frame source.
+
+    * ``decode``: reads frames (with the source's timestamps) and marks
+      which ones need inference (every ``skip_frames + 1``-th)
+    * ``infer``: collects frames until ``batch_size`` of them need
+      inference and runs ``detect_batch`` on those
+    * ``annotate``: calls ``annotate(frame_number, timestamp, frame,
+      detections)`` on every frame in source order (detections is None for
+      skipped frames) and hands its result to the consumer
+
+    Each stage runs on its own thread, so the next frames are decoded while
+    the model runs and the previous ones are drawn and written. The queues
+    between stages hold at most ``queue_size`` frames each; a full queue
+    blocks the stage in front of it, so a slow stage holds back the ones
+    before it instead of letting frames pile up in memory.
+
+    Iterate over the pipeline to run it. Leaving the loop early stops all
+    stages. An exception in a stage is raised in the consumer.
+    """
+
+    STAGES = ("decode", "infer", "annotate")
+
+    def __init__(
+        self,
+        source,
+        detect_batch: Callable[[List[np.ndarray]], List[DetectionSet]],
+        annotate: Callable[[int, float, np.ndarray, Optional[DetectionSet]], Any],
+        batch_size: int = 1,
+        skip_frames: int = 0,
+        queue_size: int = VIDEO_PIPELINE_QUEUE,
+        first_frame: int = 0
+    ):
+        self.source = source
+        self.detect_batch = detect_batch
+        self.annotate = annotate
+        self.batch_size = max(1, batch_size)
+        self.skip_frames = max(0, skip_frames)
+        self.queue_size = max(1, queue_size)
+        self.first_frame = first_frame  # frames before the source's first one (when starting mid-video)
+
+        self._stats = {name: StageStats(name) for name in self.STAGES}
+        self._stop = threading.Event()
+        self._started = None
+        self._finished = None
+
+    def _put(self, q: queue.Queue, item, stats: StageStats) -> bool:
+        """Put an item, waiting while the queue is full; False if the pipeline stopped."""
+        start = time.perf_counter()
+        try:
+            while not self._stop.is_set():
+                try:
+                    q.put(item, timeout=_POLL_SECONDS)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        finally:
+            stats.wait_out += time.perf_counter() - start
+
+    def _get(self, q: queue.Queue, stats: StageStats):
+        """Get an item, waiting while the queue is empty; _END if the pipeline stopped."""
+        start = time.perf_counter()
+        try:
+            while not self._stop.is_set():
+                try:
+                    return q.get(timeout=_POLL_SECONDS)
+                except queue.Empty:
+                    continue
+            return _END
+        finally:
+            stats.wait_in += time.perf_counter() - start
+
+    def _decode(self, out: queue.Queue):
+        stats = self._stats["decode"]
+        frame_count = self.first_frame
+        try:
+            while True:
+                start = time.perf_counter()
+                ret, frame = self.source.read()
+                stats.busy += time.perf_counter() - start
+                if not ret:
+                    break
+                frame_count += 1
+                stats.items += 1
+                needs_inference = not (self.skip_frames > 0 and frame_count % (self.skip_frames + 1) != 0)
+                item = (frame_count, self.source.timestamp, frame, needs_inference)
+                if not self._put(out, item, stats):
+                    return
+        except Exception as e:
+            self._put(out, _Failure(e), stats)
+            return
+        self._put(out, _END, stats)
+
+    def _infer(self, source: queue.Queue, out: queue.Queue):
+        stats = self._stats["infer"]
+        pending = []  # (frame_number, timestamp, frame, needs_inference)
+        to_infer = 0
+        try:
+            while True:
+                item = self._get(source, stats)
+                done = item is _END or isinstance(item, _Failure)
+                if not done:
+                    pending.append(item)
+                    to_infer += item[3]
+                    if to_infer < self.batch_size:
+                        continue
+
+                if pending:
+                    start = time.perf_counter()
+                    batch = [frame for _, _, frame, infer in pending if infer]
+                    results = iter(self.detect_batch(batch) if batch else [])
+                    stats.busy += time.perf_counter() - start
+                    stats.items += len(batch)
+                    for number, timestamp, frame, infer in pending:
+                        if not self._put(out, (number, timestamp, frame, next(results) if infer else None), stats):
+                            return
+                    pending = []
+                    to_infer = 0
+
+                if done:
+                    self._put(out, item, stats)
+                    return
+        except Exception as e:
+            self._put(out, _Failure(e), stats)
+
+    def _annotate(self, source: queue.Queue, out: queue.Queue):
+        stats = self._stats["annotate"]
+        try:
+            while True:
+                item = self._get(source, stats)
+                if item is _END or isinstance(item, _Failure):
+                    self._put(out, item, stats)
+                    return
+                start = time.perf_counter()
+                result = self.annotate(*item)
+                stats.busy += time.perf_counter() - start
+                stats.items += 1
+                if not self._put(out, result, stats):
+                    return
+        except Exception as e:
+            self._put(out, _Failure(e), stats)
+
+    def __iter__(self) -> Iterator[Any]:
+        decoded = queue.Queue(self.queue_size)
+        inferred = queue.Queue(self.queue_size)
+        annotated = queue.Queue(self.queue_size)
+        threads = [
+            threading.Thread(target=self._decode, args=(decoded,), name="pipeline-decode", daemon=True),
+            threading.Thread(target=self._infer, args=(decoded, inferred), name="pipeline-infer", daemon=True),
+            threading.Thread(target=self._annotate, args=(inferred, annotated), name="pipeline-annotate", daemon=True)
+        ]
+
+        self._stop.clear()
+        self._started = time.perf_counter()
+        self._finished = None
+        for thread in threads:
+            thread.start()
+
+        try:
+            while True:
+                item = annotated.get()
+                if item is _END:
+                    break
+                if isinstance(item, _Failure):
+                    raise item.error
+                yield item
+        finally:
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+            self._finished = time.perf_counter()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Per-stage counters.
+
+        ``utilization`` is the share of wall time a stage spent working; the
+        stage with the highest one is the ``bottleneck``.
+        """
+        if self._started is None:
+            return {}
+        wall = (self._finished or time.perf_counter()) - self._started
+        stages = {name: stats.as_dict(wall) for name, stats in self._stats.items()}
+        return {
+            "wall_seconds": round(wall, 3),
+            "queue_size": self.queue_size,
+            "stages": stages,
+            "bottleneck": max(stages, key=lambda name: stages[name]["utilization"])
+        }
@@ -0,0 +1,193 @@
+"""
+Tracking and Box Propagation for Video Frames
+Gives detections stable track ids and carries them forward so every frame can be annotated
+"""
+from typing import Dict, Optional
+
+import cv2
+import numpy as np
+
+from detectors.detection_set import DetectionSet
+from utils.tracker import Tracker
+from utils.sort_tracker import SortTracker
+from config.settings import (
+    PROPAGATION_MAX_DISTANCE, PROPAGATION_MAX_MISSES,
+    TRACKING_MODE, SORT_IOU_THRESHOLD, SORT_MAX_AGE, TRACK_MIN_HITS
+)
+
+PROPAGATION_MODES = ("none", "hold", "linear", "flow")
+TRACKING_MODES = ("centroid", "sort")
+
+# Points sampled per box side for optical flow
+_FLOW_GRID = 4
+_LK_PARAMS = dict(
+    winSize=(21, 21),
+    maxLevel=3,
+    criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 20, 0.03)
+)
+
+
+class DetectionPropagator:
+    """
+    Tracks detections across frames and estimates boxes on frames that
+    were not run through the detector.
+
+    Detections of inferred frames are fed to observe(). They update the
+    tracker selected by ``tracking`` (``centroid``: centroid distance
+    within max_distance; ``sort``: box IoU against Kalman-predicted boxes),
+    which gives every box a track id, and the propagator remembers each
+    track's latest row and its motion. propagate() then produces a
+    DetectionSet for a skipped frame from the tracks seen in the latest
+    observation:
+
+    * ``hold``: the last box as is
+    * ``linear``: the last box moved by the track's per-frame velocity
+      (measured between its last two observations)
+    * ``flow``: the box moved by the median Lucas-Kanade optical flow of
+      points sampled inside it, from the previous frame to this one
+
+    Frames must be given in playback order.
+    """
+
+    def __init__(
+        self,
+        mode: str = "linear",
+        tracking: str = TRACKING_MODE,
+        max_distance: float = PROPAGATION_MAX_DISTANCE,
+        max_misses: int = PROPAGATION_MAX_MISSES,
+        first_track_id: int = 0
+    ):
+        if mode not in PROPAGATION_MODES:
+            raise ValueError(f"Unknown propagation mode: {mode}. Valid options: {list(PROPAGATION_MODES)}")
+        if tracking not in TRACKING_MODES:
+            raise ValueError(f"Unknown tracking mode: {tracking}. Valid options: {list(TRACKING_MODES)}")
+        self.mode = mode
+        self.tracking = tracking
+        if tracking == "sort":
+            self.tracker = SortTracker(max_age=SORT_MAX_AGE, iou_threshold=SORT_IOU_THRESHOLD, min_hits=TRACK_MIN_HITS)
+        else:
+            self.tracker = Tracker(max_disappeared=max_misses, max_distance=max_distance)
+        # Ids start here, so trackers run on different parts of a video give distinct ids
+        self.tracker.next_object_id = first_track_id
+
+        self._observed: Dict[int, tuple] = {}   # track id -> (frame_number, box)
+        self._velocity: Dict[int, np.ndarray] = {}
+        self._current: Optional[DetectionSet] = None  # latest boxes, one per track seen last
+        self._current_ids = np.empty(0, dtype=np.int64)
+        self._gray: Optional[np.ndarray] = None
+
+        # Statistics
+        self.track_ids = set()
+        self.propagated_frames = 0
+        self.propagated_boxes = 0
+
+    def observe(self, frame_number: int, frame: np.ndarray, detections: DetectionSet) -> DetectionSet:
+        """
+        Record the detections of an inferred frame.
+
+        Returns:
+            The detections with their track ids set
+        """
+        ids = np.asarray(self.tracker.update(detections.boxes), dtype=np.int64)
+        detections.track_ids = ids
+        self.track_ids.update(ids.tolist())
+        for row, track_id in enumerate(ids.tolist()):
+            box = detections.boxes[row].astype(np.float64)
+            previous = self._observed.get(track_id)
+            if previous is not None and frame_number > previous[0]:
+                self._velocity[track_id] = (box - previous[1]) / (frame_number - previous[0])
+            self._observed[track_id] = (frame_number, box)
+
+        # Forget tracks the tracker dropped
+        for track_id in list(self._observed):
+            if not self.tracker.is_tracked(track_id):
+                self._observed.pop(track_id)
+                self._velocity.pop(track_id, None)
+
+        self._current = detections
+        self._current_ids = ids
+        if self.mode == "flow":
+            self._gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return detections
+
+    def propagate(self, frame_number: int, frame: np.ndarray) -> Optional[DetectionSet]:
+        """
+        Estimated detections for a skipped frame.
+
+        Returns None when propagation is off or nothing has been observed yet.
+        """
+        if self.mode == "none" or self._current is None:
+            return None
+        if len(self._current) == 0:
+            return self._current
+
+        height, width = frame.shape[:2]
+        if self.mode == "hold":
+            boxes = self._current.boxes.astype(np.float64)
+        elif self.mode == "linear":
+            boxes = np.stack([
+                self._observed[track_id][1]
+                + self._velocity.get(track_id, 0.0) * (frame_number - self._observed[track_id][0])
+                for track_id in self._current_ids.tolist()
+            ])
+        else:
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            boxes = self._flow_boxes(self._gray, gray, self._current.boxes.astype(np.float64))
+            self._gray = gray
+
+        boxes[:, [0, 2]] = np.clip(boxes[:, [0, 2]], 0, width - 1)
+        boxes[:, [1, 3]] = np.clip(boxes[:, [1, 3]], 0, height - 1)
+        visible = (boxes[:, 2] > boxes[:, 0]) & (boxes[:, 3] > boxes[:, 1])
+
+        propagated = DetectionSet(
+            np.rint(boxes),
+            self._current.scores,
+            self._current.class_ids,
+            self._current.label_ids,
+            self._current.class_names,
+            self._current_ids
+        ).select(visible)
+
+        # Optical flow chains frame to frame; the other modes extrapolate from the last observation
+        if self.mode == "flow":
+            self._current = propagated
+            self._current_ids = self._current_ids[visible]
+
+        self.propagated_frames += 1
+        self.propagated_boxes += len(propagated)
+        return propagated
+
+    @staticmethod
+    def _flow_boxes(previous: np.ndarray, current: np.ndarray, boxes: np.ndarray) -> np.ndarray:
+        """Shift each box by the median optical flow of a grid of points inside it."""
+        steps = (np.arange(_FLOW_GRID) + 0.5) / _FLOW_GRID
+        gx, gy = np.meshgrid(steps, steps)
+        gx, gy = gx.ravel(), gy.ravel()
+
+        x1, y1, x2, y2 = boxes[:, 0:1], boxes[:, 1:2], boxes[:, 2:3], boxes[:, 3:4]
+        points = np.stack([x1 + gx * (x2 - x1), y1 + gy * (y2 - y1)], axis=2)  # (N, G, 2)
+        flat = points.reshape(-1, 1, 2).astype(np.float32)
+
+        moved, status, _ = cv2.calcOpticalFlowPyrLK(previous, current, flat, None, **_LK_PARAMS)
+        shift = (moved - flat).reshape(len(boxes), -1, 2)
+        found = status.reshape(len(boxes), -1).astype(bool)
+
+        shifted = boxes.copy()
+        for i in range(len(boxes)):
+            if found[i].any():
+                dx, dy = np.median(shift[i][found[i]], axis=0)
+                shifted[i] += (dx, dy, dx, dy)
+        return shifted
+
+    def tracking_stats(self) -> dict:
+        return {
+            "mode": self.tracking,
+            "tracks": len(self.track_ids)
+        }
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "propagated_frames": self.propagated_frames,
+            "propagated_boxes": self.propagated_boxes
+        }
@@ -0,0 +1,454 @@
+"""
+Segment Job Broker
+SQLite work queue through which several backend nodes process the segments of one video
+"""
+import multiprocessing as mp
+import os
+import pickle
+import shutil
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from detectors.base_detector import BaseDetector
+from config.settings import (
+    VIDEO_BATCH_SIZE, SKIP_FRAME_PROPAGATION, TRACKING_MODE, VIDEO_DECODE_MAX_SIDE,
+    SEGMENT_BROKER_DB, SEGMENT_WORK_DIR, SEGMENT_LEASE_SECONDS, SEGMENT_MAX_ATTEMPTS,
+    SEGMENT_JOB_TIMEOUT, SEGMENT_START_METHOD, SEGMENT_TORCH_THREADS
+)
+from .segments import (
+    concat_videos, init_segment_worker, merge_segment_results, process_segment, segment_tasks
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS segments (
+    job_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    task BLOB NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result BLOB,
+    error TEXT,
+    PRIMARY KEY (job_id, idx)
+);
+CREATE INDEX IF NOT EXISTS segments_status ON segments (status, lease_expires);
+"""
+
+
+class SegmentLease:
+    """A segment handed to one worker until its lease expires."""
+
+    __slots__ = ("job_id", "index", "task", "worker")
+
+    def __init__(self, job_id: str, index: int, task: Dict[str, Any], worker: str):
+        self.job_id = job_id
+        self.index = index
+        self.task = task
+        self.worker = worker
+
+
+class SegmentBroker:
+    """
+    Work queue of video segments in a SQLite database.
+
+    A coordinator submit()s the process_segment() tasks of a video and
+    wait()s for their results. Workers, in any process on any node that
+    can open the database, lease() a segment, keep the lease alive with
+    renew() while processing it and complete() or fail() it.
+
+    Segment states: ``pending`` -> ``leased`` -> ``done``, or ``failed``
+    after ``max_attempts`` attempts. A leased segment whose lease was not
+    renewed within ``lease_seconds`` (its worker crashed or hung) can be
+    leased again by another worker; results from a worker that lost its
+    lease are discarded.
+
+    Every call opens its own connection, so a broker can be shared between
+    threads. Tasks and results are pickled: only let trusted nodes write
+    to the database.
+    """
+
+    def __init__(
+        self,
+        db_path: str = SEGMENT_BROKER_DB,
+        lease_seconds: float = SEGMENT_LEASE_SECONDS,
+        max_attempts: int = SEGMENT_MAX_ATTEMPTS
+    ):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max(1, max_attempts)
+        db = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            db.executescript(_SCHEMA)
+        finally:
+            db.close()
+
+    @contextmanager
+    def _transaction(self, write: bool = True) -> Iterator[sqlite3.Connection]:
+        """
+        Connection with an open transaction, committed on success.
+
+        Write transactions take the database write lock up front (BEGIN
+        IMMEDIATE); read-only ones (write=False) are deferred and only hold
+        a shared lock, so polling does not hold up leases and results.
+        """
+        db = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            db.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+            try:
+                yield db
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+        finally:
+            db.close()
+
+    def submit(self, tasks: List[Dict[str, Any]], job_id: Optional[str] = None) -> str:
+        """Queue one task per segment, in order; returns the job id."""
+        job_id = job_id or uuid.uuid4().hex
+        with self._transaction() as db:
+            db.execute("INSERT INTO jobs (job_id, created) VALUES (?, ?)", (job_id, time.time()))
+            db.executemany(
+                "INSERT INTO segments (job_id, idx, task) VALUES (?, ?, ?)",
+                [(job_id, index, pickle.dumps(task)) for index, task in enumerate(tasks)]
+            )
+        return job_id
+
+    def lease(self, worker: str) -> Optional[SegmentLease]:
+        """
+        Take the next available segment (oldest job first), or None.
+
+        Expired leases that used up their attempts are failed first.
+        """
+        now = time.time()
+        with self._transaction() as db:
+            db.execute(
+                "UPDATE segments SET status = 'failed', error = 'Lease expired ' || attempts || ' times' "
+                "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                (now, self.max_attempts)
+            )
+            row = db.execute(
+                "SELECT s.job_id, s.idx, s.task FROM segments s JOIN jobs j ON j.job_id = s.job_id "
+                "WHERE s.status = 'pending' OR (s.status = 'leased' AND s.lease_expires < ?) "
+                "ORDER BY j.created, s.idx LIMIT 1",
+                (now,)
+            ).fetchone()
+            if row is None:
+                return None
+            job_id, index, task = row
+            db.execute(
+                "UPDATE segments SET status = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1 "
+                "WHERE job_id = ? AND idx = ?",
+                (worker, now + self.lease_seconds, job_id, index)
+            )
+        return SegmentLease(job_id, index, pickle.loads(task), worker)
+
+    def renew(self, lease: SegmentLease) -> bool:
+        """Extend a lease; False if the worker no longer holds it."""
+        with self._transaction() as db:
+            cursor = db.execute(
+                "UPDATE segments SET lease_expires = ? "
+                "WHERE job_id = ? AND idx = ? AND worker = ? AND status = 'leased'",
+                (time.time() + self.lease_seconds, lease.job_id, lease.index, lease.worker)
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, lease: SegmentLease, result: Dict[str, Any]) -> bool:
+        """Store a segment's result; False (and nothing stored) if the lease was lost."""
+        with self._transaction() as db:
+            cursor = db.execute(
+                "UPDATE segments SET status = 'done', result = ?, lease_expires = NULL "
+                "WHERE job_id = ? AND idx = ? AND worker = ? AND status = 'leased'",
+                (pickle.dumps(result), lease.job_id, lease.index, lease.worker)
+            )
+            return cursor.rowcount == 1
+
+    def fail(self, lease: SegmentLease, error: str):
+        """Give a segment back after an error; it fails for good after max_attempts."""
+        with self._transaction() as db:
+            db.execute(
+                "UPDATE segments SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "error = ?, lease_expires = NULL "
+                "WHERE job_id = ? AND idx = ? AND worker = ? AND status = 'leased'",
+                (self.max_attempts, error, lease.job_id, lease.index, lease.worker)
+            )
+
+    def progress(self, job_id: str) -> Dict[str, int]:
+        """Number of segments of a job in each state."""
+        with self._transaction(write=False) as db:
+            rows = db.execute(
+                "SELECT status, COUNT(*) FROM segments WHERE job_id = ? GROUP BY status", (job_id,)
+            ).fetchall()
+        counts = {"pending": 0, "leased": 0, "done": 0, "failed": 0}
+        counts.update(dict(rows))
+        return counts
+
+    def wait(
+        self,
+        job_id: str,
+        timeout: float = SEGMENT_JOB_TIMEOUT,
+        poll_seconds: float = 0.5
+    ) -> List[Dict[str, Any]]:
+        """
+        Block until every segment of a job is done.
+
+        Returns:
+            The segment results in segment order
+
+        Raises:
+            RuntimeError: If a segment failed
+            TimeoutError: If the job is not done within timeout seconds
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._transaction(write=False) as db:
+                failed = db.execute(
+                    "SELECT idx, error FROM segments WHERE job_id = ? AND status = 'failed' ORDER BY idx LIMIT 1",
+                    (job_id,)
+                ).fetchone()
+                if failed is not None:
+                    raise RuntimeError(f"Segment {failed[0]} failed: {failed[1]}")
+                open_segments = db.execute(
+                    "SELECT COUNT(*) FROM segments WHERE job_id = ? AND status != 'done'", (job_id,)
+                ).fetchone()[0]
+                if open_segments == 0:
+                    rows = db.execute(
+                        "SELECT result FROM segments WHERE job_id = ? ORDER BY idx", (job_id,)
+                    ).fetchall()
+                    return [pickle.loads(row[0]) for row in rows]
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Segment job {job_id} not done after {timeout:.0f}s: {self.progress(job_id)}")
+            time.sleep(poll_seconds)
+
+    def delete(self, job_id: str):
+        """Drop a job and its segments (leases still held on them are lost)."""
+        with self._transaction() as db:
+            db.execute("DELETE FROM segments WHERE job_id = ?", (job_id,))
+            db.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+
+
+_broker: Optional[SegmentBroker] = None
+_broker_lock = threading.Lock()
+
+
+def get_segment_broker() -> Optional[SegmentBroker]:
+    """The broker at SEGMENT_BROKER_DB, or None when none is configured."""
+    global _broker
+    if not SEGMENT_BROKER_DB:
+        return None
+    with _broker_lock:
+        if _broker is None:
+            _broker = SegmentBroker(SEGMENT_BROKER_DB)
+        return _broker
+
+
+def work_dir(broker: SegmentBroker) -> str:
+    """Shared directory for job inputs and segment outputs."""
+    return SEGMENT_WORK_DIR or os.path.join(os.path.dirname(os.path.abspath(broker.db_path)), "segment_jobs")
+
+
+def worker_name(label: Optional[str] = None) -> str:
+    """
+    Unique name for a worker's leases: host, label (default the pid) and a
+    random suffix, so workers of two API processes on one host, or of a
+    restarted one, never pass for each other.
+    """
+    return f"{socket.gethostname()}:{label or os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+def run_worker(
+    broker: SegmentBroker,
+    worker: Optional[str] = None,
+    stop: Optional[threading.Event] = None,
+    poll_seconds: float = 1.0,
+    max_idle_seconds: Optional[float] = None
+) -> int:
+    """
+    Lease and process segments until stopped.
+
+    While a segment is processed, a background thread renews its lease
+    every third of the lease time.
+
+    Args:
+        broker: Queue to take segments from
+        worker: Worker name stored with its leases (default worker_name())
+        stop: Set to stop after the current segment
+        poll_seconds: Wait between polls of an empty queue
+        max_idle_seconds: Return after the queue was empty this long
+
+    Returns:
+        Number of segments completed
+    """
+    worker = worker or worker_name()
+    stop = stop or threading.Event()
+    completed = 0
+    idle_since = time.monotonic()
+    while not stop.is_set():
+        lease = broker.lease(worker)
+        if lease is None:
+            if max_idle_seconds is not None and time.monotonic() - idle_since > max_idle_seconds:
+                break
+            stop.wait(poll_seconds)
+            continue
+
+        done = threading.Event()
+
+        def heartbeat():
+            while not done.wait(broker.lease_seconds / 3):
+                if not broker.renew(lease):
+                    print(f"Worker {worker} lost the lease on segment {lease.index} of job {lease.job_id}")
+                    return
+
+        renewer = threading.Thread(target=heartbeat, name="segment-lease", daemon=True)
+        renewer.start()
+        try:
+            result = process_segment(lease.task)
+        except Exception as e:
+            print(f"Worker {worker}: segment {lease.index} of job {lease.job_id} failed: {e}")
+            broker.fail(lease, f"{type(e).__name__}: {e}")
+        else:
+            if broker.complete(lease, result):
+                completed += 1
+            else:
+                print(f"Worker {worker}: result of segment {lease.index} of job {lease.job_id} discarded (lease lost)")
+        finally:
+            done.set()
+            renewer.join()
+        idle_since = time.monotonic()
+    return completed
+
+
+def _local_worker_main(
+    db_path: str,
+    worker: str,
+    torch_threads: int,
+    lease_seconds: float,
+    max_attempts: int,
+    max_idle_seconds: Optional[float]
+):
+    init_segment_worker(torch_threads)
+    try:
+        run_worker(SegmentBroker(db_path, lease_seconds, max_attempts), worker, max_idle_seconds=max_idle_seconds)
+    except KeyboardInterrupt:
+        pass
+
+
+def start_local_workers(
+    count: int,
+    db_path: str = SEGMENT_BROKER_DB,
+    lease_seconds: float = SEGMENT_LEASE_SECONDS,
+    max_attempts: int = SEGMENT_MAX_ATTEMPTS,
+    start_method: str = SEGMENT_START_METHOD,
+    max_idle_seconds: Optional[float] = None
+) -> List[mp.Process]:
+    """
+    Start worker processes on this machine (each standing in for a node).
+
+    Workers run until stopped, or until the queue was empty for
+    max_idle_seconds when given.
+
+    Stop them with stop_local_workers(); a segment a stopped worker was
+    processing is picked up again once its lease expires.
+    """
+    SegmentBroker(db_path, lease_seconds, max_attempts)  # create the schema once, up front
+    torch_threads = SEGMENT_TORCH_THREADS or max(1, (os.cpu_count() or 1) // max(1, count))
+    context = mp.get_context(start_method)
+    processes = []
+    for index in range(count):
+        process = context.Process(
+            target=_local_worker_main,
+            args=(
+                db_path, worker_name(f"local-{index}"), torch_threads,
+                lease_seconds, max_attempts, max_idle_seconds
+            ),
+            name=f"segment-worker-{index}",
+            daemon=True
+        )
+        process.start()
+        processes.append(process)
+    print(f"Started {count} segment broker workers on {db_path} ({torch_threads} torch threads each)")
+    return processes
+
+
+def stop_local_workers(processes: List[mp.Process], timeout: float = 5.0):
+    """Terminate local worker processes."""
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.join(timeout)
+
+
+def process_video_distributed(
+    broker: SegmentBroker,
+    video_path: str,
+    segments: List[Dict[str, Any]],
+    detector_factory: Callable[[], BaseDetector],
+    confidence_threshold: float = 0.5,
+    output_path: Optional[str] = None,
+    skip_frames: int = 0,
+    include_frames: bool = False,
+    batch_size: int = VIDEO_BATCH_SIZE,
+    propagation: str = SKIP_FRAME_PROPAGATION,
+    tracking: str = TRACKING_MODE,
+    decode_max_side: int = VIDEO_DECODE_MAX_SIDE,
+    timeout: float = SEGMENT_JOB_TIMEOUT
+) -> Dict[str, Any]:
+    """
+    Process the segments of a video (see plan_segments) through the broker.
+
+    The coordinator copies the input into the shared work directory,
+    queues one task per segment and waits; workers write their annotated
+    segment next to it. The segments are then joined into output_path and
+    the results merged as in process_video_segmented().
+
+    Returns:
+        The result of VideoProcessor.process_video_file, plus ``segments``
+        and ``job_id``
+    """
+    started = time.perf_counter()
+    job_id = uuid.uuid4().hex
+    job_dir = os.path.join(work_dir(broker), job_id)
+    os.makedirs(job_dir)
+    try:
+        shared_input = os.path.join(job_dir, "input" + os.path.splitext(video_path)[1])
+        shutil.copyfile(video_path, shared_input)
+        suffix = os.path.splitext(output_path)[1] if output_path else ""
+        segment_paths = [
+            os.path.join(job_dir, f"segment_{segment['index']}{suffix}") if output_path else None
+            for segment in segments
+        ]
+        tasks = segment_tasks(
+            shared_input, segments, segment_paths, detector_factory, confidence_threshold, skip_frames,
+            include_frames, batch_size, propagation, tracking, decode_max_side
+        )
+
+        broker.submit(tasks, job_id)
+        try:
+            results = broker.wait(job_id, timeout)
+        finally:
+            broker.delete(job_id)
+        if output_path:
+            concat_videos(segment_paths, output_path)
+    finally:
+        shutil.rmtree(job_dir, ignore_errors=True)
+
+    merged = merge_segment_results(segments, results, include_frames, propagation, tracking)
+    merged.update({
+        "pipeline": {
+            "wall_seconds": round(time.perf_counter() - started, 3),
+            "workers": len({result["worker"] for result in results})
+        },
+        "job_id": job_id,
+        "output_path": output_path
+    })
+    return merged
@@ -0,0 +1,542 @@
+"""
+Segment-Parallel Video Processing
+Splits a video at keyframes, processes the segments in worker processes and stitches the results back together
+"""
+import functools
+import multiprocessing as mp
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_EXCEPTION, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from detectors.base_detector import BaseDetector
+from detectors.detection_set import DetectionSet
+from detectors.registry import ModelSpec
+from utils.sort_tracker import overlapping_pairs
+from utils.tracker import greedy_assignment
+from config.settings import (
+    VIDEO_BATCH_SIZE, SKIP_FRAME_PROPAGATION, TRACKING_MODE, VIDEO_DECODE_MAX_SIDE,
+    ENSEMBLE_VIDEO_STRATEGY, ENSEMBLE_SECONDARY_INTERVAL, SORT_IOU_THRESHOLD, FFMPEG_BINARY,
+    SEGMENT_WORKERS, SEGMENT_MIN_SECONDS, SEGMENT_START_METHOD, SEGMENT_TORCH_THREADS
+)
+from .frame_sources import PyAVFrameSource, av
+from .statistics import StreamingStatistics
+from .video_ensemble import VideoEnsembleDetector
+from .video_processor import VideoProcessor
+from .video_writer import open_video_writer
+
+# Track ids of segment i start at i << TRACK_ID_BITS, so segments never hand out the same id
+TRACK_ID_BITS = 20
+
+
+def scan_frames(path: str):
+    """
+    Presentation times of all frames and of the keyframes, from demuxing only.
+
+    Returns:
+        (frame_times, keyframe_times) sorted arrays in seconds
+    """
+    with av.open(path) as container:
+        stream = container.streams.video[0]
+        times, keyframes = [], []
+        for packet in container.demux(stream):
+            if packet.pts is None:
+                continue
+            times.append(packet.pts)
+            if packet.is_keyframe:
+                keyframes.append(packet.pts)
+        time_base = float(stream.time_base)
+    times = np.sort(np.array(times, dtype=np.float64)) * time_base
+    keyframes = np.sort(np.array(keyframes, dtype=np.float64)) * time_base
+    return times, keyframes
+
+
+def plan_segments(
+    path: str,
+    workers: int = SEGMENT_WORKERS,
+    min_seconds: float = SEGMENT_MIN_SECONDS
+) -> List[Dict[str, Any]]:
+    """
+    Split a video into up to ``workers`` segments of at least about ``min_seconds``.
+
+    Cut points are the keyframes closest to equal splits, so every segment
+    can be decoded on its own.
+
+    Returns:
+        One dict per segment: ``index``, ``start`` / ``end`` (seconds; end
+        is None for the last one), ``first_frame`` (frames before the
+        segment) and ``frames``. Empty if the video has no frames or
+        cannot be read with PyAV (or PyAV is not installed).
+    """
+    if av is None:
+        return []
+    try:
+        times, keyframes = scan_frames(path)
+    except (av.FFmpegError, IndexError) as e:
+        print(f"Could not scan {path} for segments: {e}")
+        return []
+    if len(times) == 0:
+        return []
+    duration = times[-1] - times[0]
+    count = max(1, int(min(workers, duration // min_seconds if min_seconds > 0 else workers)))
+
+    bounds = [times[0]]
+    for i in range(1, count):
+        target = times[0] + duration * i / count
+        keyframe = keyframes[np.argmin(np.abs(keyframes - target))]
+        if keyframe > bounds[-1]:
+            bounds.append(keyframe)
+
+    segments = []
+    for index, start in enumerate(bounds):
+        end = bounds[index + 1] if index + 1 < len(bounds) else None
+        first_frame = int(np.searchsorted(times, start))
+        last_frame = int(np.searchsorted(times, end)) if end is not None else len(times)
+        segments.append({
+            "index": index,
+            "start": float(start) if index > 0 else 0.0,
+            "end": float(end) if end is not None else None,
+            "first_frame": first_frame,
+            "frames": last_frame - first_frame
+        })
+    return segments
+
+
+# Detectors loaded in this (worker) process, by model id
+_replicas: Dict[str, BaseDetector] = {}
+
+
+def load_replica(spec: ModelSpec) -> BaseDetector:
+    """Detector for a model spec, loaded once per process."""
+    detector = _replicas.get(spec.model_id)
+    if detector is None:
+        detector = spec.create()
+        if not detector.load_model():
+            raise RuntimeError(f"Could not load {spec.model_id}")
+        _replicas[spec.model_id] = detector
+    return detector
+
+
+def build_segment_detector(
+    specs: Sequence[ModelSpec],
+    strategy: str = ENSEMBLE_VIDEO_STRATEGY,
+    secondary_interval: int = ENSEMBLE_SECONDARY_INTERVAL
+) -> BaseDetector:
+    """Detector for one segment: the model, or a VideoEnsembleDetector for two."""
+    detectors = [load_replica(spec) for spec in specs]
+    if len(detectors) == 2:
+        return VideoEnsembleDetector(*detectors, strategy=strategy, secondary_interval=secondary_interval)
+    return detectors[0]
+
+
+def segment_detector_factory(
+    specs: Sequence[ModelSpec],
+    strategy: str = ENSEMBLE_VIDEO_STRATEGY,
+    secondary_interval: int = ENSEMBLE_SECONDARY_INTERVAL
+) -> Callable[[], BaseDetector]:
+    """Picklable factory that builds the segment detector inside a worker."""
+    return functools.partial(build_segment_detector, list(specs), strategy, secondary_interval)
+
+
+def process_segment(task: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Process one segment (runs in a worker process).
+
+    Frames are numbered and tracks are numbered from where the segment
+    sits in the video, so results from all segments can be put together.
+    """
+    segment = task["segment"]
+    started = time.perf_counter()
+    detector = task["detector_factory"]()
+    processor = VideoProcessor(
+        detector,
+        batch_size=task["batch_size"],
+        propagation=task["propagation"],
+        tracking=task["tracking"],
+        decoder="pyav",
+        decode_max_side=task["decode_max_side"]
+    )
+    source = PyAVFrameSource(
+        task["path"], task["decode_max_side"], task["decode_threads"],
+        start=segment["start"], end=segment["end"]
+    )
+    if not source.isOpened():
+        raise RuntimeError(f"Could not open segment {segment['index']}")
+
+    writer = None
+    try:
+        if task["output_path"]:
+            writer = open_video_writer(task["output_path"], source.fps, source.width, source.height)
+        result = processor.process_source(
+            source,
+            task["confidence_threshold"],
+            task["skip_frames"],
+            writer=writer,
+            include_frames=task["include_frames"],
+            first_frame=segment["first_frame"],
+            first_track_id=segment["index"] << TRACK_ID_BITS
+        )
+        if writer is not None:
+            finished, writer = writer, None
+            finished.release()
+    finally:
+        source.release()
+        if writer is not None:
+            writer.abort()
+
+    result.update({
+        "fps": source.fps,
+        "width": source.width,
+        "height": source.height,
+        "source_width": source.source_width,
+        "source_height": source.source_height,
+        "track_ids": processor.propagator.track_ids,
+        "propagation": processor.propagator.stats(),
+        "pipeline": processor.pipeline.stats(),
+        "ensemble": detector.stats() if isinstance(detector, VideoEnsembleDetector) else None,
+        "worker": f"{socket.gethostname()}:{os.getpid()}",
+        "seconds": round(time.perf_counter() - started, 3)
+    })
+    return result
+
+
+def init_segment_worker(torch_threads: int):
+    """Thread limits for a process that runs segments next to others."""
+    import cv2
+    import torch
+
+    torch.set_num_threads(torch_threads)
+    cv2.setNumThreads(1)
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_segment_pool(workers: int = SEGMENT_WORKERS) -> ProcessPoolExecutor:
+    """
+    The process pool segments run in, started on first use.
+
+    Workers stay up between videos, so each loads its model replicas once.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            torch_threads = SEGMENT_TORCH_THREADS or max(1, (os.cpu_count() or 1) // workers)
+            _pool = ProcessPoolExecutor(
+                workers,
+                mp_context=mp.get_context(SEGMENT_START_METHOD),
+                initializer=init_segment_worker,
+                initargs=(torch_threads,)
+            )
+            print(f"Started {workers} segment workers ({SEGMENT_START_METHOD}, {torch_threads} torch threads each)")
+        return _pool
+
+
+def _discard_segment_pool(pool: ProcessPoolExecutor):
+    """Forget a broken pool, so the next video starts a fresh one."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def stop_segment_pool():
+    """Shut the segment workers down (no-op if they were never started)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+
+def link_tracks(previous: Optional[DetectionSet], following: Optional[DetectionSet]) -> Dict[int, int]:
+    """
+    Match tracks across a segment boundary.
+
+    Boxes of the last inferred frame before the boundary and the first one
+    after it are paired by IoU (at least SORT_IOU_THRESHOLD, same class,
+    best overlap first), like the tracker pairs consecutive frames.
+
+    Returns:
+        Map from track ids after the boundary to the ids they continue
+    """
+    if (
+        previous is None or following is None or not len(previous) or not len(following)
+        or previous.track_ids is None or following.track_ids is None
+    ):
+        return {}
+    rows, cols, iou = overlapping_pairs(previous.boxes, following.boxes, SORT_IOU_THRESHOLD)
+    previous_names = np.asarray(previous.class_names, dtype=object)[previous.label_ids[rows]]
+    following_names = np.asarray(following.class_names, dtype=object)[following.label_ids[cols]]
+    same_class = previous_names == following_names
+    rows, cols = greedy_assignment(rows[same_class], cols[same_class], 1.0 - iou[same_class])
+    return dict(zip(following.track_ids[cols].tolist(), previous.track_ids[rows].tolist()))
+
+
+def concat_videos(paths: Sequence[str], output_path: str):
+    """
+    Join videos with identical encoding settings without re-encoding.
+
+    Uses ffmpeg's concat demuxer when ffmpeg is available and remuxes with
+    PyAV otherwise.
+    """
+    if shutil.which(FFMPEG_BINARY):
+        with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as listing:
+            for path in paths:
+                listing.write(f"file '{path}'\n")
+        try:
+            subprocess.run(
+                [
+                    FFMPEG_BINARY, '-y', '-loglevel', 'error',
+                    '-f', 'concat', '-safe', '0', '-i', listing.name,
+                    '-c', 'copy', '-movflags', '+faststart', output_path
+                ],
+                capture_output=True, check=True
+            )
+            return
+        except subprocess.CalledProcessError as e:
+            print(f"FFmpeg concat error: {e.stderr.decode()}")
+        finally:
+            os.unlink(listing.name)
+    _remux_concat(paths, output_path)
+
+
+def _remux_concat(paths: Sequence[str], output_path: str):
+    inputs = [av.open(path) for path in paths]
+    try:
+        names = inputs[0].format.name.split(",")
+        format_name = "mp4" if "mp4" in names else names[0]
+        options = {"movflags": "+faststart"} if format_name in ("mp4", "mov") else {}
+        with av.open(output_path, "w", format=format_name, options=options) as output:
+            stream = output.add_stream_from_template(inputs[0].streams.video[0])
+            offset = 0.0  # seconds of video written so far
+            for container in inputs:
+                in_stream = container.streams.video[0]
+                time_base = float(in_stream.time_base)
+                shift = int(round(offset / time_base))
+                end = offset
+                for packet in container.demux(in_stream):
+                    if packet.dts is None:
+                        continue
+                    end = max(end, (packet.pts + (packet.duration or 0)) * time_base + offset)
+                    packet.pts += shift
+                    packet.dts += shift
+                    packet.stream = stream
+                    output.mux(packet)
+                offset = end
+    finally:
+        for container in inputs:
+            container.close()
+
+
+def segment_tasks(
+    video_path: str,
+    segments: List[Dict[str, Any]],
+    segment_paths: Sequence[Optional[str]],
+    detector_factory: Callable[[], BaseDetector],
+    confidence_threshold: float = 0.5,
+    skip_frames: int = 0,
+    include_frames: bool = False,
+    batch_size: int = VIDEO_BATCH_SIZE,
+    propagation: str = SKIP_FRAME_PROPAGATION,
+    tracking: str = TRACKING_MODE,
+    decode_max_side: int = VIDEO_DECODE_MAX_SIDE,
+    decode_threads: int = 0
+) -> List[Dict[str, Any]]:
+    """process_segment() arguments for every segment; segment i is written to segment_paths[i]."""
+    return [
+        {
+            "path": video_path,
+            "output_path": segment_path,
+            "segment": segment,
+            "detector_factory": detector_factory,
+            "confidence_threshold": confidence_threshold,
+            "skip_frames": skip_frames,
+            "include_frames": include_frames,
+            "batch_size": batch_size,
+            "propagation": propagation,
+            "tracking": tracking,
+            "decode_max_side": decode_max_side,
+            "decode_threads": decode_threads
+        }
+        for segment, segment_path in zip(segments, segment_paths)
+    ]
+
+
+def merge_segment_results(
+    segments: List[Dict[str, Any]],
+    results: List[Dict[str, Any]],
+    include_frames: bool = False,
+    propagation: str = SKIP_FRAME_PROPAGATION,
+    tracking: str = TRACKING_MODE
+) -> Dict[str, Any]:
+    """
+    Put the process_segment() results of all segments together, in order.
+
+    Track ids are reconciled at every boundary (see link_tracks), so a
+    track crossing it keeps the id it had in the earlier segment in
+    ``frames`` and in the statistics.
+
+    Returns:
+        The fields of VideoProcessor.process_video_file except ``pipeline``
+        and ``output_path``, plus ``segments``
+    """
+    # Chain the boundary matches into one id map for the whole video
+    track_map: Dict[int, int] = {}
+    stats = StreamingStatistics()
+    frames = [] if include_frames else None
+    track_ids = set()
+    previous = None
+    summaries = []
+    for segment, result in zip(segments, results):
+        links = link_tracks(previous, result["first_detections"])
+        for track_id, continued in links.items():
+            track_map[track_id] = track_map.get(continued, continued)
+        if result["last_detections"] is not None:
+            previous = result["last_detections"]
+
+        stats.merge(result["stats"], track_map)
+        track_ids.update(track_map.get(track_id, track_id) for track_id in result["track_ids"])
+        if include_frames:
+            for frame in result["frames"]:
+                for detection in frame["detections"]:
+                    if "track_id" in detection:
+                        detection["track_id"] = track_map.get(detection["track_id"], detection["track_id"])
+                frames.append(frame)
+        summaries.append({
+            **segment,
+            "processed_frames": result["processed_frames"],
+            "linked_tracks": len(links),
+            "seconds": result["seconds"],
+            "worker": result["worker"],
+            "pipeline": result["pipeline"],
+            "ensemble": result["ensemble"]
+        })
+
+    first = results[0]
+    fps = int(first["fps"]) or 30
+    total_frames = sum(segment["frames"] for segment in segments)
+    propagated = [result["propagation"] for result in results]
+    return {
+        "video_info": {
+            "fps": fps,
+            "total_frames": total_frames,
+            "processed_frames": sum(result["processed_frames"] for result in results),
+            "width": first["width"],
+            "height": first["height"],
+            "source_width": first["source_width"],
+            "source_height": first["source_height"],
+            "decoder": "pyav",
+            "duration_seconds": total_frames / fps if fps > 0 else 0
+        },
+        "statistics": stats.summary(),
+        "timeline": stats.timeline(),
+        "propagation": {
+            "mode": propagation,
+            "propagated_frames": sum(p["propagated_frames"] for p in propagated),
+            "propagated_boxes": sum(p["propagated_boxes"] for p in propagated)
+        },
+        "tracking": {
+            "mode": tracking,
+            "tracks": len(track_ids)
+        },
+        "segments": summaries,
+        "frames": frames
+    }
+
+
+def _run_in_pool(pool: ProcessPoolExecutor, tasks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Run the segment tasks in the pool; results in task order."""
+    futures = [pool.submit(process_segment, task) for task in tasks]
+    _, pending = wait(futures, return_when=FIRST_EXCEPTION)
+    if pending:
+        # A segment failed: drop the queued ones and let the running ones finish
+        # before their output files are removed
+        for future in pending:
+            future.cancel()
+        wait(pending)
+    return [future.result() for future in futures]
+
+
+def process_video_segmented(
+    video_path: str,
+    segments: List[Dict[str, Any]],
+    detector_factory: Callable[[], BaseDetector],
+    confidence_threshold: float = 0.5,
+    output_path: Optional[str] = None,
+    skip_frames: int = 0,
+    include_frames: bool = False,
+    batch_size: int = VIDEO_BATCH_SIZE,
+    propagation: str = SKIP_FRAME_PROPAGATION,
+    tracking: str = TRACKING_MODE,
+    decode_max_side: int = VIDEO_DECODE_MAX_SIDE,
+    workers: int = SEGMENT_WORKERS
+) -> Dict[str, Any]:
+    """
+    Process the segments of a video (see plan_segments) in the segment pool.
+
+    Each worker decodes only its segment and builds its own detector with
+    detector_factory, which must be picklable (segment_detector_factory).
+    The annotated segments are joined into output_path and the results
+    merged with merge_segment_results(); the labels drawn into the video
+    keep their per-segment track ids.
+
+    If a worker dies and breaks the pool, the pool is dropped (the next
+    video starts a fresh one) and the segments run one after another in
+    this process instead.
+
+    Returns:
+        The result of VideoProcessor.process_video_file, plus ``segments``
+    """
+    started = time.perf_counter()
+    parallel = min(workers, len(segments))
+    suffix = os.path.splitext(output_path)[1] if output_path else ""
+    segment_paths = [
+        tempfile.NamedTemporaryFile(delete=False, suffix=suffix).name if output_path else None
+        for _ in segments
+    ]
+    tasks = segment_tasks(
+        video_path, segments, segment_paths, detector_factory, confidence_threshold, skip_frames,
+        include_frames, batch_size, propagation, tracking, decode_max_side,
+        decode_threads=max(1, (os.cpu_count() or 1) // max(1, parallel))
+    )
+
+    try:
+        pool = get_segment_pool(workers)
+        try:
+            results = _run_in_pool(pool, tasks)
+        except BrokenProcessPool as e:
+            # A worker died (e.g. killed while loading its replicas) and took the pool with it
+            print(f"Segment pool is broken ({e}), processing the segments in this process")
+            _discard_segment_pool(pool)
+            parallel = 1
+            try:
+                results = [process_segment(task) for task in tasks]
+            finally:
+                _replicas.clear()
+        if output_path:
+            concat_videos(segment_paths, output_path)
+    finally:
+        for segment_path in segment_paths:
+            if segment_path is not None and os.path.exists(segment_path):
+                os.unlink(segment_path)
+
+    merged = merge_segment_results(segments, results, include_frames, propagation, tracking)
+    merged.update({
+        "pipeline": {
+            "wall_seconds": round(time.perf_counter() - started, 3),
+            "workers": parallel
+        },
+        "output_path": output_path
+    })
+    return merged
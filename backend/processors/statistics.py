@@ -0,0 +1,174 @@
+"""
+Streaming Detection Statistics
+Accumulates per-class counts, confidence and a time line frame by frame
+"""
+from collections import deque
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from detectors.detection_set import DetectionSet
+from config.settings import TRACK_MIN_HITS
+
+VEHICLE_CLASSES = ["Car", "Truck", "Van", "Cyclist", "Tram", "Motorcycle", "Bus"]
+PEDESTRIAN_CLASSES = ["Pedestrian", "Person", "Person_sitting"]
+
+
+class _Bucket:
+    """Totals for one time line bucket."""
+
+    __slots__ = ("index", "frames", "objects", "class_counts")
+
+    def __init__(self, index: int):
+        self.index = index
+        self.frames = 0
+        self.objects = 0
+        self.class_counts: Dict[str, int] = {}
+
+
+class StreamingStatistics:
+    """
+    Detection statistics updated one frame at a time.
+
+    update() costs O(boxes in the frame) and nothing per frame is kept, so
+    a long video needs no more memory than a short one. What is kept:
+
+    * running totals: objects and confidence sum per class name
+    * a time line of ``bucket_seconds`` buckets (frames, objects and class
+      counts per bucket), capped at ``max_buckets`` most recent buckets
+      when given
+    * for detections carrying track ids, hits and class votes per track, so
+      each tracked object can be counted once
+
+    summary() returns the same fields as ImageProcessor.calculate_statistics.
+    """
+
+    def __init__(
+        self,
+        bucket_seconds: float = 1.0,
+        max_buckets: Optional[int] = None,
+        min_track_hits: int = TRACK_MIN_HITS
+    ):
+        self.bucket_seconds = bucket_seconds
+        self.min_track_hits = min_track_hits
+        self.frames = 0
+        self.total_objects = 0
+        self._score_sum = 0.0
+        self._class_counts: Dict[str, int] = {}
+        self._timeline = deque(maxlen=max_buckets)
+        self._tracked = False
+        self._track_votes: Dict[int, Dict[str, int]] = {}
+
+    def update(self, detections: DetectionSet, timestamp: Optional[float] = None):
+        """
+        Add one frame's detections.
+
+        Args:
+            detections: Detections of the frame
+            timestamp: Frame time in seconds; frames without one are left
+                out of the time line
+        """
+        # Boxes carried over from an earlier frame were counted there
+        if detections.carried is not None and detections.carried.any():
+            detections = detections.select(~detections.carried)
+
+        self.frames += 1
+        names = detections.class_names
+        frame_counts: Dict[str, int] = {}
+        if len(detections):
+            counts = np.bincount(detections.label_ids, minlength=len(names))
+            for label_id in np.flatnonzero(counts).tolist():
+                name = names[label_id]
+                frame_counts[name] = frame_counts.get(name, 0) + int(counts[label_id])
+            self.total_objects += len(detections)
+            self._score_sum += float(detections.scores.sum(dtype=np.float64))
+            _merge(self._class_counts, frame_counts)
+
+        if timestamp is not None:
+            index = int(timestamp // self.bucket_seconds)
+            if not self._timeline or self._timeline[-1].index != index:
+                self._timeline.append(_Bucket(index))
+            bucket = self._timeline[-1]
+            bucket.frames += 1
+            bucket.objects += len(detections)
+            _merge(bucket.class_counts, frame_counts)
+
+        if detections.track_ids is not None:
+            self._tracked = True
+            for track_id, label_id in zip(detections.track_ids.tolist(), detections.label_ids.tolist()):
+                votes = self._track_votes.setdefault(track_id, {})
+                votes[names[label_id]] = votes.get(names[label_id], 0) + 1
+
+    def merge(self, other: "StreamingStatistics", track_ids: Optional[Dict[int, int]] = None):
+        """
+        Add the totals of another accumulator, e.g. of a later part of the video.
+
+        Args:
+            other: Statistics to add
+            track_ids: Renames other's track ids (a track continuing one of
+                ours counts once); ids not in it are kept
+        """
+        track_ids = track_ids or {}
+        self.frames += other.frames
+        self.total_objects += other.total_objects
+        self._score_sum += other._score_sum
+        _merge(self._class_counts, other._class_counts)
+
+        buckets = {bucket.index: bucket for bucket in self._timeline}
+        for theirs in other._timeline:
+            bucket = buckets.setdefault(theirs.index, _Bucket(theirs.index))
+            bucket.frames += theirs.frames
+            bucket.objects += theirs.objects
+            _merge(bucket.class_counts, theirs.class_counts)
+        self._timeline = deque(
+            sorted(buckets.values(), key=lambda bucket: bucket.index), maxlen=self._timeline.maxlen
+        )
+
+        self._tracked = self._tracked or other._tracked
+        for track_id, votes in other._track_votes.items():
+            _merge(self._track_votes.setdefault(track_ids.get(track_id, track_id), {}), votes)
+
+    def summary(self) -> Dict:
+        """Totals over all frames so far."""
+        class_counts = dict(self._class_counts)
+        stats = {
+            "total_objects": self.total_objects,
+            "unique_classes": len(class_counts),
+            "avg_confidence": self._score_sum / self.total_objects if self.total_objects > 0 else 0,
+            "class_counts": class_counts,
+            "has_pedestrians": any(name in class_counts for name in PEDESTRIAN_CLASSES),
+            "has_vehicles": any(name in class_counts for name in VEHICLE_CLASSES)
+        }
+
+        if self._tracked:
+            # Each track counts once, under the class it was seen as most often
+            tracked_counts: Dict[str, int] = {}
+            tracked = 0
+            for votes in self._track_votes.values():
+                if sum(votes.values()) < self.min_track_hits:
+                    continue
+                name = max(votes, key=votes.get)
+                tracked_counts[name] = tracked_counts.get(name, 0) + 1
+                tracked += 1
+            stats["tracked_objects"] = tracked
+            stats["tracked_class_counts"] = tracked_counts
+
+        return stats
+
+    def timeline(self) -> List[Dict]:
+        """Time line buckets in time order."""
+        return [
+            {
+                "start": bucket.index * self.bucket_seconds,
+                "frames": bucket.frames,
+                "objects": bucket.objects,
+                "avg_objects": bucket.objects / bucket.frames,
+                "class_counts": dict(bucket.class_counts)
+            }
+            for bucket in self._timeline
+        ]
+
+
+def _merge(into: Dict[str, int], counts: Dict[str, int]):
+    for name, count in counts.items():
+        into[name] = into.get(name, 0) + count
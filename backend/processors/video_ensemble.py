@@ -0,0 +1,211 @@
+"""
+Video Ensemble
+Runs a secondary detector on a subset of frames and carries its boxes in between
+"""
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from detectors.base_detector import BaseDetector
+from detectors.detection_set import DetectionSet
+from config.settings import (
+    ENSEMBLE_FUSION, ENSEMBLE_IOU_THRESHOLD, ENSEMBLE_CLASS_AWARE,
+    ENSEMBLE_VIDEO_STRATEGY, ENSEMBLE_SECONDARY_INTERVAL,
+    ENSEMBLE_CASCADE_LOW, ENSEMBLE_CASCADE_HIGH, ENSEMBLE_CASCADE_MAX_GAP
+)
+from .fusion import fuse_detections, pairwise_iou
+from .propagation import DetectionPropagator
+
+VIDEO_ENSEMBLE_STRATEGIES = ("alternate", "cascade")
+
+
+class VideoEnsembleDetector(BaseDetector):
+    """
+    Ensemble of two detectors at close to the cost of the primary one.
+
+    The primary detector runs on every frame it is given. The secondary one
+    only runs on some of them:
+
+    * ``alternate``: every ``secondary_interval``-th frame
+    * ``cascade``: frames where the primary reports a borderline detection
+      (a score between cascade_low and cascade_high), and at least every
+      ``cascade_max_gap`` frames (0 = only when borderline)
+
+    On those frames both outputs are fused. Boxes only the secondary model
+    found are then carried forward: on the following frames they are fused
+    with the primary's output again, until the secondary runs next or
+    ``max_carry`` frames (at most ``secondary_interval``) have passed.
+    Carried boxes move with the velocity of their track, which links the
+    secondary-only boxes of successive secondary runs. A carried box that a
+    primary box now overlaps is dropped, since the primary has picked the
+    object up. Carried rows are flagged in ``DetectionSet.carried``, so
+    statistics count them only on the frame the secondary found them.
+
+    Frames must be passed in playback order. The detector keeps state
+    between calls, so use one instance per video.
+    """
+
+    def __init__(
+        self,
+        primary: BaseDetector,
+        secondary: BaseDetector,
+        strategy: str = ENSEMBLE_VIDEO_STRATEGY,
+        secondary_interval: int = ENSEMBLE_SECONDARY_INTERVAL,
+        cascade_low: float = ENSEMBLE_CASCADE_LOW,
+        cascade_high: float = ENSEMBLE_CASCADE_HIGH,
+        cascade_max_gap: int = ENSEMBLE_CASCADE_MAX_GAP,
+        max_carry: Optional[int] = None,
+        fusion: str = ENSEMBLE_FUSION,
+        iou_threshold: float = ENSEMBLE_IOU_THRESHOLD,
+        class_aware: bool = ENSEMBLE_CLASS_AWARE
+    ):
+        if strategy not in VIDEO_ENSEMBLE_STRATEGIES:
+            raise ValueError(
+                f"Unknown video ensemble strategy: {strategy}. Valid options: {list(VIDEO_ENSEMBLE_STRATEGIES)}"
+            )
+        super().__init__()
+        self.primary = primary
+        self.secondary = secondary
+        self.strategy = strategy
+        self.secondary_interval = max(1, secondary_interval)
+        self.cascade_low = cascade_low
+        self.cascade_high = cascade_high
+        self.cascade_max_gap = max(0, cascade_max_gap)
+        self.max_carry = self.secondary_interval if max_carry is None else min(max(0, max_carry), self.secondary_interval)
+        self.fusion = fusion
+        self.iou_threshold = iou_threshold
+        self.class_aware = class_aware
+        self.is_loaded = primary.is_loaded and secondary.is_loaded
+
+        # Tracks the secondary-only boxes across secondary runs for their velocity
+        self._carry_tracks = DetectionPropagator("linear", tracking="centroid")
+        self._carried_ids = set()
+        self._carried_age = 0
+        self._since_secondary = None  # None until the secondary first runs
+
+        # Statistics
+        self.frames = 0
+        self.secondary_frames = 0
+        self.carried_boxes = 0
+
+    def load_model(self) -> bool:
+        self.is_loaded = self.primary.load_model() and self.secondary.load_model()
+        return self.is_loaded
+
+    def get_model_name(self) -> str:
+        return f"Ensemble ({self.primary.get_model_name()} + {self.secondary.get_model_name()}, {self.strategy})"
+
+    def detect(
+        self,
+        image: np.ndarray,
+        confidence_threshold: float = 0.5,
+        classes: Optional[Sequence[str]] = None
+    ) -> DetectionSet:
+        return self.detect_batch([image], confidence_threshold, classes)[0]
+
+    def detect_batch(
+        self,
+        images: List[np.ndarray],
+        confidence_threshold: float = 0.5,
+        classes: Optional[Sequence[str]] = None
+    ) -> List[DetectionSet]:
+        """
+        Detect on consecutive frames; the secondary model gets one batched call
+        for the frames that need it.
+        """
+        if not images:
+            return []
+
+        # Cascade looks at scores below the threshold to spot borderline frames
+        primary_threshold = confidence_threshold
+        if self.strategy == "cascade":
+            primary_threshold = min(confidence_threshold, self.cascade_low)
+        primary = self.primary.detect_batch(images, primary_threshold, classes)
+
+        run_secondary = self._plan_secondary(primary)
+        selected = [image for image, run in zip(images, run_secondary) if run]
+        secondary = iter(self.secondary.detect_batch(selected, confidence_threshold, classes) if selected else [])
+
+        results = []
+        for frame_number, (image, detections, run) in enumerate(zip(images, primary, run_secondary), self.frames):
+            detections = detections.filter(confidence_threshold)
+            if run:
+                results.append(self._fuse_with_secondary(frame_number, image, detections, next(secondary)))
+            else:
+                results.append(self._fuse_with_carried(frame_number, image, detections))
+        self.frames += len(images)
+        return results
+
+    def _plan_secondary(self, primary: List[DetectionSet]) -> List[bool]:
+        """Decide, frame by frame, where the secondary model runs."""
+        plan = []
+        since = self._since_secondary
+        for detections in primary:
+            if self.strategy == "alternate":
+                run = since is None or since + 1 >= self.secondary_interval
+            else:
+                borderline = bool(np.any(
+                    (detections.scores >= self.cascade_low) & (detections.scores < self.cascade_high)
+                ))
+                overdue = self.cascade_max_gap > 0 and (since is None or since + 1 >= self.cascade_max_gap)
+                run = borderline or overdue
+            since = 0 if run else (since + 1 if since is not None else None)
+            plan.append(run)
+        return plan
+
+    def _fuse_with_secondary(
+        self,
+        frame_number: int,
+        image: np.ndarray,
+        primary: DetectionSet,
+        secondary: DetectionSet
+    ) -> DetectionSet:
+        fused = fuse_detections([primary, secondary], self.fusion, self.iou_threshold, self.class_aware)
+        secondary_only = self._unmatched(fused, primary).select(slice(None))
+        self._carried_ids = set(self._carry_tracks.observe(frame_number, image, secondary_only).track_ids.tolist())
+        self._carried_age = 0
+        self._since_secondary = 0
+        self.secondary_frames += 1
+        return fused
+
+    def _fuse_with_carried(self, frame_number: int, image: np.ndarray, primary: DetectionSet) -> DetectionSet:
+        if self._since_secondary is not None:
+            self._since_secondary += 1
+        self._carried_age += 1
+        if not self._carried_ids or self._carried_age > self.max_carry:
+            self._carried_ids = set()
+            return primary
+
+        moved = self._carry_tracks.propagate(frame_number, image)
+        carried = moved.select(np.isin(moved.track_ids, list(self._carried_ids)))
+        # Objects the primary has picked up again no longer need carrying
+        carried = self._unmatched(carried, primary)
+        self._carried_ids = set(carried.track_ids.tolist())
+        if len(carried) == 0:
+            return primary
+        self.carried_boxes += len(carried)
+        return DetectionSet.concatenate([primary, DetectionSet(
+            carried.boxes, carried.scores, carried.class_ids, carried.label_ids, carried.class_names,
+            carried=np.ones(len(carried), dtype=bool)
+        )])
+
+    def _unmatched(self, detections: DetectionSet, reference: DetectionSet) -> DetectionSet:
+        """Detections that no reference box overlaps (same class, if class aware)."""
+        if len(detections) == 0 or len(reference) == 0:
+            return detections
+        combined = DetectionSet.concatenate([detections, reference])
+        n = len(detections)
+        overlaps = pairwise_iou(combined.boxes)[:n, n:] > self.iou_threshold
+        if self.class_aware:
+            overlaps &= combined.label_ids[:n, None] == combined.label_ids[None, n:]
+        return detections.select(~overlaps.any(axis=1))
+
+    def stats(self) -> dict:
+        """Counters for the response."""
+        return {
+            "strategy": self.strategy,
+            "frames": self.frames,
+            "secondary_frames": self.secondary_frames,
+            "secondary_share": round(self.secondary_frames / self.frames, 3) if self.frames else 0.0,
+            "carried_boxes": self.carried_boxes
+        }
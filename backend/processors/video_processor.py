@@ -3,119 +3,212 @@ Video Processing Utilities
 """
 import cv2
 import numpy as np
-import tempfile
-import subprocess
-import os
-from typing import List, Dict, Any, Generator, Tuple
+from typing import List, Dict, Any, Generator, Tuple, Optional
 from detectors.base_detector import BaseDetector
+from detectors.detection_set import DetectionSet
+from config.settings import (
+    VIDEO_BATCH_SIZE, SKIP_FRAME_PROPAGATION, TRACKING_MODE, VIDEO_DECODER, VIDEO_DECODE_MAX_SIDE
+)
 from .image_processor import ImageProcessor
+from .propagation import DetectionPropagator
+from .statistics import StreamingStatistics
+from .pipeline import FramePipeline
+from .video_writer import open_video_writer
+from .frame_sources import open_frame_source
 
 
 class VideoProcessor:
     """Handles video processing for detection."""
     
-    def __init__(self, detector: BaseDetector):
+    def __init__(
+        self,
+        detector: BaseDetector,
+        batch_size: int = VIDEO_BATCH_SIZE,
+        propagation: str = SKIP_FRAME_PROPAGATION,
+        tracking: str = TRACKING_MODE,
+        decoder: str = VIDEO_DECODER,
+        decode_max_side: int = VIDEO_DECODE_MAX_SIDE
+    ):
         self.detector = detector
+        self.batch_size = max(1, batch_size)
+        self.propagation = propagation
+        self.tracking = tracking
+        self.decoder = decoder
+        self.decode_max_side = decode_max_side
+        self.propagator: Optional[DetectionPropagator] = None
+        self.pipeline: Optional[FramePipeline] = None
+    
+    def open_source(self, video_path: str):
+        """Open a video with this processor's decoder and decode size (check isOpened())."""
+        return open_frame_source(video_path, self.decoder, self.decode_max_side)
+    
+    def iter_processed_frames(
+        self,
+        source,
+        confidence_threshold: float = 0.5,
+        skip_frames: int = 0,
+        writer: Optional[cv2.VideoWriter] = None,
+        first_frame: int = 0,
+        first_track_id: int = 0
+    ) -> Generator[Tuple[int, float, np.ndarray, Optional[DetectionSet]], None, None]:
+        """
+        Read frames from an open frame source and run batched detection.
+        
+        Runs a FramePipeline: frames are decoded on one thread, batched
+        inference runs on another (``batch_size`` frames that need it per
+        detector call), and tracking, annotation and writing to ``writer``
+        happen on a third, so the stages overlap. Detections are tracked
+        across inferred frames and carry their track ids. Skipped frames
+        are annotated with boxes propagated from the last inferred frame
+        unless propagation is "none".
+        
+        For a source that starts mid-video, first_frame is the number of
+        frames before it (frame numbers and the skip pattern continue from
+        there) and first_track_id the first track id to hand out.
+        
+        Yields:
+            (frame_number, timestamp, output_frame, detections) in source
+            order, where timestamp is in seconds and detections is None for
+            skipped frames
+        """
+        self.propagator = DetectionPropagator(self.propagation, self.tracking, first_track_id=first_track_id)
+        
+        def annotate(number: int, timestamp: float, frame: np.ndarray, detections: Optional[DetectionSet]):
+            if detections is not None:
+                # Annotate after tracking so the labels show track ids
+                detections = self.propagator.observe(number, frame, detections)
+                frame = ImageProcessor.draw_detections(frame, detections)
+            else:
+                propagated = self.propagator.propagate(number, frame)
+                if propagated is not None:
+                    frame = ImageProcessor.draw_detections(frame, propagated)
+            if writer is not None:
+                writer.write(frame)
+            return number, timestamp, frame, detections
+        
+        self.pipeline = FramePipeline(
+            source,
+            lambda frames: self.detector.detect_batch(frames, confidence_threshold),
+            annotate,
+            batch_size=self.batch_size,
+            skip_frames=skip_frames,
+            first_frame=first_frame
+        )
+        yield from self.pipeline
+    
+    def process_source(
+        self,
+        source,
+        confidence_threshold: float = 0.5,
+        skip_frames: int = 0,
+        writer: Optional[cv2.VideoWriter] = None,
+        include_frames: bool = False,
+        first_frame: int = 0,
+        first_track_id: int = 0
+    ) -> Dict[str, Any]:
+        """
+        Run an open source through the pipeline and accumulate the results.
+        
+        Statistics are accumulated frame by frame, so memory does not grow
+        with the length of the video. Per-frame detections (with track ids)
+        are only collected into ``frames`` when include_frames is set.
+        
+        Returns:
+            Dictionary with the StreamingStatistics (``stats``), ``frames``,
+            ``processed_frames`` and the detections of the first and last
+            inferred frames (``first_detections``, ``last_detections``)
+        """
+        stats = StreamingStatistics()
+        frames = [] if include_frames else None
+        processed_count = 0
+        first_detections = last_detections = None
+        
+        for frame_number, timestamp, _, detections in self.iter_processed_frames(
+            source, confidence_threshold, skip_frames, writer, first_frame, first_track_id
+        ):
+            if detections is not None:
+                stats.update(detections, timestamp=timestamp)
+                if include_frames:
+                    frames.append({
+                        "frame": frame_number,
+                        "timestamp": timestamp,
+                        "detections": detections.to_dicts()
+                    })
+                processed_count += 1
+                if first_detections is None:
+                    first_detections = detections
+                last_detections = detections
+        
+        return {
+            "stats": stats,
+            "frames": frames,
+            "processed_frames": processed_count,
+            "first_detections": first_detections,
+            "last_detections": last_detections
+        }
     
     def process_video_file(
         self,
         video_path: str,
         confidence_threshold: float = 0.5,
         output_path: str = None,
-        skip_frames: int = 0
+        skip_frames: int = 0,
+        include_frames: bool = False
     ) -> Dict[str, Any]:
         """
         Process a video file and return detection results.
+        
+        Per-frame detections are only returned (in ``frames``) when
+        include_frames is set.
         """
-        cap = cv2.VideoCapture(video_path)
+        source = self.open_source(video_path)
         
-        if not cap.isOpened():
+        if not source.isOpened():
             return {"error": "Could not open video file"}
         
         # Get video properties
-        fps = int(cap.get(cv2.CAP_PROP_FPS)) or 30
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        fps = int(source.fps) or 30
+        total_frames = source.frame_count
+        width, height = source.width, source.height
         duration = total_frames / fps if fps > 0 else 0
         
-        # Create temp file for raw output
-        temp_raw = tempfile.NamedTemporaryFile(delete=False, suffix=".avi")
-        temp_raw_path = temp_raw.name
-        temp_raw.close()
-        
-        # Use MJPG codec for temp file (more compatible)
-        fourcc = cv2.VideoWriter_fourcc(*'MJPG')
-        out = cv2.VideoWriter(temp_raw_path, fourcc, fps, (width, height))
-        
-        all_detections = []
-        frame_count = 0
-        processed_count = 0
-        
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            frame_count += 1
-            
-            # Skip frames if requested
-            if skip_frames > 0 and frame_count % (skip_frames + 1) != 0:
-                out.write(frame)
-                continue
+        out = None
+        try:
+            # Encode the annotated video as it is produced
+            if output_path:
+                out = open_video_writer(output_path, source.fps, width, height)
             
-            # Process frame
-            annotated, detections = ImageProcessor.process_image(
-                frame, self.detector, confidence_threshold
+            result = self.process_source(
+                source, confidence_threshold, skip_frames, writer=out, include_frames=include_frames
             )
-            
-            all_detections.extend(detections)
-            processed_count += 1
-            out.write(annotated)
-        
-        cap.release()
-        out.release()
-        
-        # Convert to H.264 using ffmpeg for browser compatibility
-        if output_path:
-            try:
-                subprocess.run([
-                    'ffmpeg', '-y', '-i', temp_raw_path,
-                    '-c:v', 'libx264', '-preset', 'fast',
-                    '-crf', '23', '-pix_fmt', 'yuv420p',
-                    '-movflags', '+faststart',
-                    output_path
-                ], capture_output=True, check=True)
-            except subprocess.CalledProcessError as e:
-                print(f"FFmpeg error: {e.stderr.decode()}")
-                # Fallback: just copy the raw file
-                import shutil
-                shutil.copy(temp_raw_path, output_path)
-            except FileNotFoundError:
-                # ffmpeg not installed, use raw file
-                import shutil
-                shutil.copy(temp_raw_path, output_path)
-            
-            # Cleanup temp file
-            try:
-                os.unlink(temp_raw_path)
-            except:
-                pass
-        
-        # Calculate statistics
-        stats = ImageProcessor.calculate_statistics(all_detections)
+            if out is not None:
+                # Finish encoding
+                writer, out = out, None
+                writer.release()
+        finally:
+            source.release()
+            if out is not None:
+                out.abort()
+        stats = result["stats"]
         
         return {
             "video_info": {
                 "fps": fps,
                 "total_frames": total_frames,
-                "processed_frames": processed_count,
+                "processed_frames": result["processed_frames"],
                 "width": width,
                 "height": height,
+                "source_width": source.source_width,
+                "source_height": source.source_height,
+                "decoder": source.name,
                 "duration_seconds": duration
             },
-            "statistics": stats,
-            "detections": all_detections,
+            "statistics": stats.summary(),
+            "timeline": stats.timeline(),
+            "propagation": self.propagator.stats(),
+            "tracking": self.propagator.tracking_stats(),
+            "pipeline": self.pipeline.stats(),
+            "frames": result["frames"],
             "output_path": output_path
         }
     
@@ -124,37 +217,25 @@ class VideoProcessor:
         video_path: str,
         confidence_threshold: float = 0.5,
         skip_frames: int = 0
-    ) -> Generator[Tuple[np.ndarray, List[Dict[str, Any]], float], None, None]:
+    ) -> Generator[Tuple[np.ndarray, DetectionSet, float], None, None]:
         """
         Process video as a stream, yielding frames with detections.
         """
-        cap = cv2.VideoCapture(video_path)
+        source = self.open_source(video_path)
         
-        if not cap.isOpened():
+        if not source.isOpened():
             return
         
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        frame_count = 0
-        
-        fps = int(cap.get(cv2.CAP_PROP_FPS)) or 30
+        total_frames = source.frame_count
         
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            frame_count += 1
-            progress = frame_count / total_frames if total_frames > 0 else 0
-            
-            # Skip frames if requested
-            if skip_frames > 0 and frame_count % (skip_frames + 1) != 0:
+        for frame_count, _, annotated, detections in self.iter_processed_frames(
+            source, confidence_threshold, skip_frames
+        ):
+            # Only processed frames are streamed
+            if detections is None:
                 continue
             
-            # Process frame
-            annotated, detections = ImageProcessor.process_image(
-                frame, self.detector, confidence_threshold, fps=fps
-            )
-            
+            progress = frame_count / total_frames if total_frames > 0 else 0
             yield annotated, detections, progress
         
-        cap.release()
+        source.release()
@@ -0,0 +1,178 @@
+"""
+Video Output Writers
+Encode annotated frames to browser-playable H.264 MP4
+"""
+import collections
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from typing import Optional
+
+import cv2
+import numpy as np
+
+from config.settings import FFMPEG_BINARY, VIDEO_WRITER, VIDEO_ENCODER_PRESET, VIDEO_ENCODER_CRF
+
+VIDEO_WRITERS = ("pipe", "transcode")
+
+
+def _h264_args(output_path: str) -> list:
+    return [
+        '-c:v', 'libx264', '-preset', VIDEO_ENCODER_PRESET,
+        '-crf', str(VIDEO_ENCODER_CRF), '-pix_fmt', 'yuv420p',
+        '-movflags', '+faststart',
+        output_path
+    ]
+
+
+class FFmpegPipeWriter:
+    """
+    Streams raw BGR frames into one long-lived ffmpeg process over stdin.
+
+    ffmpeg encodes to H.264 while frames are still being produced, so there
+    is no intermediate file and no second pass. Has the write()/release()
+    interface of cv2.VideoWriter; abort() stops without finishing the file.
+    """
+
+    def __init__(self, output_path: str, fps: float, width: int, height: int):
+        self.output_path = output_path
+        self.width = width
+        self.height = height
+        self._stderr = collections.deque(maxlen=20)
+        self._process = subprocess.Popen(
+            [
+                FFMPEG_BINARY, '-y', '-loglevel', 'error',
+                '-f', 'rawvideo', '-pix_fmt', 'bgr24',
+                '-s', f'{width}x{height}', '-r', str(fps),
+                '-i', '-',
+                # yuv420p needs even dimensions
+                '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2'
+            ] + _h264_args(output_path),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE
+        )
+        # Drain stderr so ffmpeg never blocks on a full pipe
+        self._stderr_reader = threading.Thread(target=self._read_stderr, daemon=True)
+        self._stderr_reader.start()
+
+    def _read_stderr(self):
+        for line in self._process.stderr:
+            self._stderr.append(line.decode(errors="replace").rstrip())
+
+    def isOpened(self) -> bool:
+        return self._process.poll() is None
+
+    def write(self, frame: np.ndarray):
+        if frame.shape[:2] != (self.height, self.width):
+            frame = cv2.resize(frame, (self.width, self.height))
+        try:
+            self._process.stdin.write(np.ascontiguousarray(frame).data)
+        except BrokenPipeError:
+            raise RuntimeError(f"ffmpeg exited: {self._error()}")
+
+    def _error(self) -> str:
+        self._stderr_reader.join(timeout=1)
+        return "\n".join(self._stderr) or f"exit code {self._process.returncode}"
+
+    def release(self):
+        """Finish encoding; raises RuntimeError if ffmpeg failed."""
+        if self._process.stdin.closed:
+            return
+        try:
+            self._process.stdin.close()
+        except BrokenPipeError:
+            pass
+        if self._process.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed: {self._error()}")
+
+    def abort(self):
+        """Stop ffmpeg without finishing the output (after an error or disconnect)."""
+        if self._process.poll() is None:
+            self._process.kill()
+        try:
+            self._process.stdin.close()
+        except (BrokenPipeError, OSError):
+            pass
+        self._process.wait()
+        self._stderr_reader.join(timeout=1)
+
+
+class TranscodingWriter:
+    """
+    Writes MJPG to a temporary AVI, then transcodes it to H.264 with ffmpeg
+    on release().
+
+    Fallback for when frames cannot be piped to ffmpeg. Without ffmpeg, or
+    if the transcode fails, the AVI itself is copied to the output path.
+    """
+
+    def __init__(self, output_path: str, fps: float, width: int, height: int):
+        self.output_path = output_path
+        temp_raw = tempfile.NamedTemporaryFile(delete=False, suffix=".avi")
+        self.temp_path = temp_raw.name
+        temp_raw.close()
+        # Use MJPG codec for temp file (more compatible)
+        fourcc = cv2.VideoWriter_fourcc(*'MJPG')
+        self._writer = cv2.VideoWriter(self.temp_path, fourcc, fps, (width, height))
+        self._released = False
+
+    def isOpened(self) -> bool:
+        return self._writer.isOpened()
+
+    def write(self, frame: np.ndarray):
+        self._writer.write(frame)
+
+    def release(self):
+        if self._released:
+            return
+        self._released = True
+        self._writer.release()
+        try:
+            subprocess.run(
+                [FFMPEG_BINARY, '-y', '-i', self.temp_path] + _h264_args(self.output_path),
+                capture_output=True, check=True
+            )
+        except subprocess.CalledProcessError as e:
+            print(f"FFmpeg error: {e.stderr.decode()}")
+            # Fallback: just copy the raw file
+            shutil.copy(self.temp_path, self.output_path)
+        except FileNotFoundError:
+            # ffmpeg not installed, use raw file
+            shutil.copy(self.temp_path, self.output_path)
+        finally:
+            try:
+                os.unlink(self.temp_path)
+            except OSError:
+                pass
+
+    def abort(self):
+        """Drop the temporary AVI without transcoding it."""
+        if self._released:
+            return
+        self._released = True
+        self._writer.release()
+        try:
+            os.unlink(self.temp_path)
+        except OSError:
+            pass
+
+
+def open_video_writer(output_path: str, fps: float, width: int, height: int, method: Optional[str] = None):
+    """
+    Writer for the annotated output video.
+
+    Uses FFmpegPipeWriter when ffmpeg is available (and VIDEO_WRITER is
+    "pipe"), and TranscodingWriter otherwise.
+    """
+    method = method or VIDEO_WRITER
+    if method not in VIDEO_WRITERS:
+        raise ValueError(f"Unknown video writer: {method}. Valid options: {list(VIDEO_WRITERS)}")
+    if method == "pipe" and shutil.which(FFMPEG_BINARY):
+        try:
+            return FFmpegPipeWriter(output_path, fps, width, height)
+        except OSError as e:
+            print(f"FFmpeg pipe unavailable ({e}), falling back to transcoding")
+    return TranscodingWriter(output_path, fps, width, height)
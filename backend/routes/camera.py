@@ -3,27 +3,36 @@ WebSocket Camera Streaming Routes
 """
 import asyncio
 import base64
+import time
 import cv2
 import numpy as np
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 from typing import Optional
 
-from detectors import YOLODetector, SSDDetector
+from detectors import DetectionSet
+from detectors.scheduler import get_scheduler
 from processors.image_processor import ImageProcessor
+from processors.statistics import StreamingStatistics
+from utils.executor import ServerBusy, get_executor
+from config.settings import CAMERA_TIMELINE_SECONDS
 
 router = APIRouter(prefix="/api", tags=["camera"])
 
-# Global detector instances
-_camera_detector: Optional[YOLODetector] = None
+# Registry model used for camera frames
+CAMERA_MODEL = "yolo"
 
 
-def get_camera_detector():
-    """Get or create detector for camera."""
-    global _camera_detector
-    if _camera_detector is None:
-        _camera_detector = YOLODetector()
-        _camera_detector.load_model()
-    return _camera_detector
+def decode_frame(data: str) -> Optional[np.ndarray]:
+    """Decode a base64 JPEG frame (None if it is not an image)."""
+    nparr = np.frombuffer(base64.b64decode(data), np.uint8)
+    return cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+
+
+def annotate_frame(frame: np.ndarray, detections: DetectionSet) -> str:
+    """Draw detections on a frame and encode it as base64 JPEG."""
+    annotated = ImageProcessor.draw_detections(frame, detections)
+    _, buffer = cv2.imencode('.jpg', annotated, [cv2.IMWRITE_JPEG_QUALITY, 80])
+    return base64.b64encode(buffer).decode('utf-8')
 
 
 @router.websocket("/camera")
@@ -32,11 +41,14 @@ async def camera_websocket(websocket: WebSocket):
     WebSocket endpoint for real-time camera detection.
     
     Client sends: base64 encoded JPEG frames
-    Server responds: JSON with annotated frame and detections
+    Server responds: JSON with annotated frame, detections, frame stats and
+    running stats for the session; once a second also the session's
+    per-second time line
     """
     await websocket.accept()
-    
-    detector = get_camera_detector()
+    session = StreamingStatistics(max_buckets=CAMERA_TIMELINE_SECONDS)
+    started = time.monotonic()
+    last_second = -1
     
     try:
         while True:
@@ -44,34 +56,37 @@ async def camera_websocket(websocket: WebSocket):
             data = await websocket.receive_text()
             
             try:
-                # Decode base64 image
-                img_data = base64.b64decode(data)
-                nparr = np.frombuffer(img_data, np.uint8)
-                frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-                
-                if frame is None:
-                    await websocket.send_json({"error": "Invalid frame"})
-                    continue
-                
-                # Run detection
-                annotated, detections = ImageProcessor.process_image(
-                    frame, detector, confidence_threshold=0.5
-                )
-                
-                # Encode annotated frame
-                _, buffer = cv2.imencode('.jpg', annotated, [cv2.IMWRITE_JPEG_QUALITY, 80])
-                annotated_base64 = base64.b64encode(buffer).decode('utf-8')
+                async with get_executor().job() as job:
+                    frame = await job.run(decode_frame, data)
+                    
+                    if frame is None:
+                        await websocket.send_json({"error": "Invalid frame"})
+                        continue
+                    
+                    # Run detection, batched with frames from other cameras and uploads
+                    detections = await get_scheduler(CAMERA_MODEL).submit(frame, confidence_threshold=0.5)
+                    annotated_base64 = await job.run(annotate_frame, frame, detections)
                 
                 # Calculate stats
                 stats = ImageProcessor.calculate_statistics(detections)
+                elapsed = time.monotonic() - started
+                session.update(detections, timestamp=elapsed)
                 
                 # Send response
-                await websocket.send_json({
+                response = {
                     "frame": annotated_base64,
-                    "detections": detections,
-                    "stats": stats
-                })
+                    "detections": detections.to_dicts(),
+                    "stats": stats,
+                    "session_stats": session.summary()
+                }
+                if int(elapsed) != last_second:
+                    last_second = int(elapsed)
+                    response["timeline"] = session.timeline()
+                await websocket.send_json(response)
                 
+            except ServerBusy as e:
+                # Drop the frame; the client keeps streaming and later frames get through
+                await websocket.send_json({"error": str(e), "retry_after": e.retry_after})
             except Exception as e:
                 await websocket.send_json({"error": str(e)})
                 
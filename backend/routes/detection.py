@@ -1,239 +1,252 @@
 """
 Detection API Routes
 """
+import asyncio
+import time
 import cv2
 import numpy as np
 import tempfile
 import os
-import base64
+from contextlib import ExitStack
 from typing import Optional
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 
-from detectors import YOLODetector, YOLOCocoDetector, SSDDetector, BaseDetector
+from detectors import BaseDetector, DetectionSet
+from detectors.registry import get_registry
+from detectors.scheduler import get_scheduler, scheduler_stats
+from detectors.worker_pool import PooledDetector, pool_for, use_detector, get_worker_pool
 from processors.image_processor import ImageProcessor
 from processors.video_processor import VideoProcessor
-from config.settings import CLASS_COLORS, CLASS_NAMES
+from processors.fusion import FUSION_METHODS, fuse_detections
+from processors.video_ensemble import VIDEO_ENSEMBLE_STRATEGIES, VideoEnsembleDetector
+from processors.propagation import PROPAGATION_MODES, TRACKING_MODES
+from processors.frame_sources import FRAME_DECODERS
+from routes.video import read_base64
+from processors.segments import plan_segments, process_video_segmented, segment_detector_factory
+from processors.segment_broker import get_segment_broker, process_video_distributed
+from utils.executor import ServerBusy, get_executor, get_video_executor
+from config.settings import (
+    CLASS_COLORS, CLASS_NAMES, VIDEO_BATCH_SIZE, DEFAULT_MODEL,
+    ENSEMBLE_FUSION, ENSEMBLE_IOU_THRESHOLD, ENSEMBLE_CLASS_AWARE,
+    ENSEMBLE_VIDEO_STRATEGY, ENSEMBLE_SECONDARY_INTERVAL, SKIP_FRAME_PROPAGATION, TRACKING_MODE,
+    VIDEO_DECODER, VIDEO_DECODE_MAX_SIDE, SEGMENT_WORKERS
+)
 
 
 router = APIRouter(prefix="/api", tags=["detection"])
 
-# Global detector instances
-_detectors = {
-    "yolo": None,
-    "yolo11n": None,  # nano
-    "yolo11s": None,  # small
-    "yolo11m": None,  # medium
-    "yolo11l": None,  # large
-    "yolo11x": None,  # xlarge
-    "ssd": None
-}
-_active_model = "yolo11x"  # Default to xlarge for best accuracy
+_active_model = DEFAULT_MODEL  # yolo11x (best accuracy) unless configured
 
 
 class DetectionRequest(BaseModel):
     confidence: float = 0.5
-    model: str = "yolo11x"
+    model: str = DEFAULT_MODEL
 
 
 class ModelSelectRequest(BaseModel):
     model: str
 
 
+def active_models(model_name: str) -> list:
+    """Registry ids behind a selectable model ("ensemble" runs two)."""
+    if model_name == "ensemble":
+        return ["yolo", "ssd"]
+    return [model_name]
+
+
 def get_detector(model_name: str) -> BaseDetector:
-    """Get or create a detector instance."""
-    global _detectors
-    
-    if model_name == "yolo":
-        if _detectors["yolo"] is None:
-            _detectors["yolo"] = YOLODetector()
-            _detectors["yolo"].load_model()
-        return _detectors["yolo"]
-    
-    elif model_name == "yolo11n":
-        if _detectors["yolo11n"] is None:
-            _detectors["yolo11n"] = YOLOCocoDetector(model_size="n")
-            _detectors["yolo11n"].load_model()
-        return _detectors["yolo11n"]
-    
-    elif model_name == "yolo11s":
-        if _detectors["yolo11s"] is None:
-            _detectors["yolo11s"] = YOLOCocoDetector(model_size="s")
-            _detectors["yolo11s"].load_model()
-        return _detectors["yolo11s"]
-    
-    elif model_name == "yolo11m":
-        if _detectors["yolo11m"] is None:
-            _detectors["yolo11m"] = YOLOCocoDetector(model_size="m")
-            _detectors["yolo11m"].load_model()
-        return _detectors["yolo11m"]
-    
-    elif model_name == "yolo11l":
-        if _detectors["yolo11l"] is None:
-            _detectors["yolo11l"] = YOLOCocoDetector(model_size="l")
-            _detectors["yolo11l"].load_model()
-        return _detectors["yolo11l"]
-    
-    elif model_name == "yolo11x":
-        if _detectors["yolo11x"] is None:
-            _detectors["yolo11x"] = YOLOCocoDetector(model_size="x")
-            _detectors["yolo11x"].load_model()
-        return _detectors["yolo11x"]
-    
-    elif model_name == "ssd":
-        if _detectors["ssd"] is None:
-            _detectors["ssd"] = SSDDetector()
-            _detectors["ssd"].load_model()
-        return _detectors["ssd"]
-    
-    else:
-        raise ValueError(f"Unknown model: {model_name}")
+    """Get a detector from the model registry, loading it on first use."""
+    return get_registry().get(model_name)
 
 
-def merge_detections(det1: list, det2: list, iou_threshold: float = 0.5) -> list:
-    """Merge detections from two models using NMS."""
-    if not det1:
-        return det2
-    if not det2:
-        return det1
-    
-    all_dets = det1 + det2
+async def load_detector(model_name: str) -> BaseDetector:
+    """
+    Async get_detector for request handlers.
     
-    # Simple NMS based on IoU
-    keep = []
-    used = set()
+    A model that is not loaded yet is loaded in a worker thread; concurrent
+    requests for it wait on that single load instead of starting their own.
+    A model served by the inference worker pool is not loaded in this process.
+    """
+    pool = pool_for(model_name)
+    if pool is not None:
+        return PooledDetector(pool)
+    try:
+        return await get_registry().aget(model_name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def busy_error(error: ServerBusy) -> HTTPException:
+    """503 response telling the client when to retry."""
+    return HTTPException(
+        status_code=503,
+        detail=str(error),
+        headers={"Retry-After": str(error.retry_after)}
+    )
+
+
+def parse_class_filter(classes: Optional[str], detectors: list) -> Optional[list]:
+    """
+    Parse a comma-separated class filter and validate it against the detectors.
     
-    # Sort by confidence
-    sorted_dets = sorted(enumerate(all_dets), key=lambda x: x[1]["confidence"], reverse=True)
+    Returns None when no filter was given.
+    """
+    if not classes or not classes.strip():
+        return None
     
-    for idx, det in sorted_dets:
-        if idx in used:
-            continue
-        
-        keep.append(det)
-        used.add(idx)
-        
-        # Mark overlapping detections as used
-        for idx2, det2 in sorted_dets:
-            if idx2 in used:
-                continue
-            
-            # Calculate IoU
-            b1 = det["bbox"]
-            b2 = det2["bbox"]
-            
-            # Use dictionary access (now standardized)
-            x1 = max(b1["x1"], b2["x1"])
-            y1 = max(b1["y1"], b2["y1"])
-            x2 = min(b1["x2"], b2["x2"])
-            y2 = min(b1["y2"], b2["y2"])
-            
-            inter = max(0, x2 - x1) * max(0, y2 - y1)
-            area1 = (b1["x2"] - b1["x1"]) * (b1["y2"] - b1["y1"])
-            area2 = (b2["x2"] - b2["x1"]) * (b2["y2"] - b2["y1"])
-            
-            union = area1 + area2 - inter
-            
-            iou = inter / union if union > 0 else 0
-            
-            if iou > iou_threshold:
-                used.add(idx2)
+    requested = [name.strip() for name in classes.split(",") if name.strip()]
+    known = set()
+    for detector in detectors:
+        known.update(detector.class_names)
     
-    return keep
+    unknown = [name for name in requested if name not in known]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown classes: {unknown}. Valid options: {sorted(known)}"
+        )
+    return requested
+
+
+async def timed_submit(
+    model_id: str,
+    image: np.ndarray,
+    confidence: float,
+    classes: Optional[list]
+) -> tuple:
+    """Submit a frame to a model's scheduler; returns (detections, milliseconds)."""
+    start = time.perf_counter()
+    detections = await get_scheduler(model_id).submit(image, confidence, classes)
+    return detections, (time.perf_counter() - start) * 1000
+
+
+def is_ready() -> bool:
+    """Whether every model behind the active selection is loaded and warmed up."""
+    registry = get_registry()
+    return all(
+        pool_for(model_id) is not None or registry.is_warm(model_id)
+        for model_id in active_models(_active_model)
+    )
 
 
 @router.get("/health")
 async def health_check():
     """Health check endpoint."""
-    return {"status": "healthy", "active_model": _active_model}
+    return {"status": "healthy", "active_model": _active_model, "ready": is_ready()}
+
+
+@router.get("/health/live")
+async def liveness():
+    """Liveness probe: the process is up and handling requests."""
+    return {"status": "alive"}
+
+
+@router.get("/health/ready")
+async def readiness():
+    """Readiness probe: 200 once the active model is loaded and warmed up, 503 before."""
+    registry = get_registry()
+    ready = is_ready()
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": "ready" if ready else "not_ready",
+            "active_model": _active_model,
+            "models": {
+                model_id: {
+                    "state": registry.load_status(model_id)["state"],
+                    "warmed": registry.is_warm(model_id),
+                    "worker_pool": pool_for(model_id) is not None
+                }
+                for model_id in active_models(_active_model)
+            }
+        }
+    )
 
 
 @router.get("/models")
 async def list_models():
-    """List available models."""
+    """List available models with their resident memory and last use."""
+    registry = get_registry()
+    models = []
+    for spec in registry.specs():
+        models.append({
+            "id": spec.model_id,
+            "name": spec.name,
+            "description": spec.description,
+            "size": spec.size,
+            "backend": spec.backend,
+            **registry.status(spec.model_id)
+        })
+    
+    models.append({
+        "id": "ensemble",
+        "name": "Ensemble",
+        "description": "YOLO + SSD combined",
+        "size": "Multi",
+        "backend": "torch",
+        "loaded": False
+    })
+    
     return {
-        "models": [
-            {
-                "id": "yolo",
-                "name": "YOLO (Custom)",
-                "description": "Custom-trained for traffic (8 classes)",
-                "size": "~25MB",
-                "loaded": _detectors["yolo"] is not None and _detectors["yolo"].is_loaded
-            },
-            {
-                "id": "yolo11n",
-                "name": "YOLO11 Nano",
-                "description": "Fastest, basic accuracy",
-                "size": "~5MB",
-                "loaded": _detectors["yolo11n"] is not None and _detectors["yolo11n"].is_loaded
-            },
-            {
-                "id": "yolo11s",
-                "name": "YOLO11 Small",
-                "description": "Fast, good accuracy",
-                "size": "~18MB",
-                "loaded": _detectors["yolo11s"] is not None and _detectors["yolo11s"].is_loaded
-            },
-            {
-                "id": "yolo11m",
-                "name": "YOLO11 Medium",
-                "description": "Balanced speed/accuracy",
-                "size": "~40MB",
-                "loaded": _detectors["yolo11m"] is not None and _detectors["yolo11m"].is_loaded
-            },
-            {
-                "id": "yolo11l",
-                "name": "YOLO11 Large",
-                "description": "High accuracy",
-                "size": "~75MB",
-                "loaded": _detectors["yolo11l"] is not None and _detectors["yolo11l"].is_loaded
-            },
-            {
-                "id": "yolo11x",
-                "name": "YOLO11 XLarge",
-                "description": "Best accuracy (default)",
-                "size": "~140MB",
-                "loaded": _detectors["yolo11x"] is not None and _detectors["yolo11x"].is_loaded
-            },
-            {
-                "id": "ssd",
-                "name": "SSD300",
-                "description": "VGG16 backbone, COCO",
-                "size": "~100MB",
-                "loaded": _detectors["ssd"] is not None and _detectors["ssd"].is_loaded
-            },
-            {
-                "id": "ensemble",
-                "name": "Ensemble",
-                "description": "YOLO + SSD combined",
-                "size": "Multi",
-                "loaded": False
-            }
-        ],
+        "models": models,
         "active": _active_model,
+        "memory": {
+            "resident_mb": round(registry.resident_bytes() / (1024 * 1024), 1),
+            "budget_mb": registry.budget_bytes // (1024 * 1024),
+            "idle_ttl_seconds": registry.idle_ttl_seconds
+        },
         "class_names": CLASS_NAMES,
         "class_colors": {k: f"rgb({v[2]},{v[1]},{v[0]})" for k, v in CLASS_COLORS.items()}
     }
 
 
+@router.get("/models/status")
+async def models_load_status():
+    """Load state and progress of every model."""
+    registry = get_registry()
+    return {"models": [registry.load_status(model_id) for model_id in registry.model_ids()]}
+
+
+@router.get("/models/{model_id}/status")
+async def model_load_status(model_id: str):
+    """Load state and progress of one model, for polling while it loads."""
+    registry = get_registry()
+    if model_id not in registry:
+        raise HTTPException(status_code=404, detail=f"Unknown model: {model_id}")
+    return {**registry.load_status(model_id), **registry.status(model_id)}
+
+
+@router.get("/scheduler/stats")
+async def get_scheduler_stats():
+    """Micro-batching statistics per model, worker pool and executor load."""
+    pool = get_worker_pool()
+    return {
+        "schedulers": scheduler_stats(),
+        "executor": get_executor().stats(),
+        "video_executor": get_video_executor().stats(),
+        "worker_pool": pool.stats() if pool is not None else None
+    }
+
+
 @router.post("/models/select")
 async def select_model(request: ModelSelectRequest):
     """Select the active model."""
     global _active_model
     
-    valid_models = ["yolo", "yolo11n", "yolo11s", "yolo11m", "yolo11l", "yolo11x", "ssd", "ensemble"]
+    registry = get_registry()
+    valid_models = registry.model_ids() + ["ensemble"]
     if request.model not in valid_models:
         raise HTTPException(status_code=400, detail=f"Invalid model. Valid options: {valid_models}")
     
     _active_model = request.model
     
-    # Pre-load the selected model
-    if request.model == "ensemble":
-        get_detector("yolo")
-        get_detector("ssd")
-    elif request.model != "ensemble":
-        get_detector(request.model)
+    # Keep the active model resident, then load and warm it up
+    registry.set_pinned(active_models(request.model))
+    for model_id in active_models(request.model):
+        if pool_for(model_id) is None:
+            await registry.awarm(model_id)
     
     return {"status": "success", "active_model": _active_model}
 
@@ -242,62 +255,88 @@ async def select_model(request: ModelSelectRequest):
 async def detect_image(
     file: UploadFile = File(...),
     confidence: float = Form(0.5),
-    model: str = Form(None)
+    model: str = Form(None),
+    classes: str = Form(None),
+    fusion: str = Form(ENSEMBLE_FUSION),
+    fusion_iou: float = Form(ENSEMBLE_IOU_THRESHOLD),
+    class_aware: bool = Form(ENSEMBLE_CLASS_AWARE)
 ):
-    """Detect objects in an uploaded image."""
+    """
+    Detect objects in an uploaded image.
+    
+    ``classes`` optionally restricts detection to a comma-separated list of
+    class names (e.g. "Car,Pedestrian"); the filter is applied inside the
+    model so other classes never reach NMS.
+    
+    In ensemble mode the member models run concurrently and their boxes are
+    combined with ``fusion`` ("nms" or "wbf"), per class unless
+    ``class_aware`` is false. The response reports the time spent in each
+    model and in the fusion step.
+    """
+    if fusion not in FUSION_METHODS:
+        raise HTTPException(status_code=400, detail=f"Invalid fusion. Valid options: {list(FUSION_METHODS)}")
+    
     try:
-        # Read image
-        contents = await file.read()
-        nparr = np.frombuffer(contents, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-        if image is None:
-            raise HTTPException(status_code=400, detail="Invalid image file")
-        
-        # Use specified model or active model
-        model_to_use = model or _active_model
-        
-        if model_to_use == "ensemble":
-            # Run both detectors
-            yolo_detector = get_detector("yolo")
-            ssd_detector = get_detector("ssd")
+        async with get_executor().job() as job:
+            # Read image
+            contents = await file.read()
+            nparr = np.frombuffer(contents, np.uint8)
+            image = await job.run(cv2.imdecode, nparr, cv2.IMREAD_COLOR)
             
-            _, yolo_dets = ImageProcessor.process_image(image, yolo_detector, confidence, draw_boxes=False)
-            _, ssd_dets = ImageProcessor.process_image(image, ssd_detector, confidence, draw_boxes=False)
+            if image is None:
+                raise HTTPException(status_code=400, detail="Invalid image file")
             
-            # Merge detections (now lists of dicts)
-            detections = merge_detections(yolo_dets, ssd_dets)
+            # Use specified model or active model
+            model_to_use = model or _active_model
             
-            # Draw merged detections
-            from detectors.base_detector import Detection
-            det_objects = [
-                Detection(
-                    class_name=d.get("class") or d.get("class_name"),
-                    confidence=d["confidence"],
-                    bbox=(d["bbox"]["x1"], d["bbox"]["y1"], d["bbox"]["x2"], d["bbox"]["y2"]),
-                    class_id=d["class_id"]
+            if model_to_use == "ensemble":
+                # Run the member models concurrently; latency is the slowest one, not the sum
+                members = active_models(model_to_use)
+                detectors = await asyncio.gather(*(load_detector(model_id) for model_id in members))
+                class_filter = parse_class_filter(classes, detectors)
+                
+                results = await asyncio.gather(*(
+                    timed_submit(model_id, image, confidence, class_filter) for model_id in members
+                ))
+                
+                start = time.perf_counter()
+                detections = await job.run(
+                    fuse_detections, [dets for dets, _ in results], fusion, fusion_iou, class_aware
                 )
-                for d in detections
-            ]
-            annotated = ImageProcessor.draw_detections(image, det_objects)
-        else:
-            detector = get_detector(model_to_use)
-            annotated, detections = ImageProcessor.process_image(image, detector, confidence)
-        
-        # Calculate statistics (handles new dict format)
-        stats = ImageProcessor.calculate_statistics(detections)
-        
-        # Encode annotated image
-        annotated_base64 = ImageProcessor.encode_image_to_base64(annotated)
+                timings = {
+                    "models_ms": {model_id: round(ms, 1) for model_id, (_, ms) in zip(members, results)},
+                    "fusion_ms": round((time.perf_counter() - start) * 1000, 1)
+                }
+            else:
+                detector = await load_detector(model_to_use)
+                class_filter = parse_class_filter(classes, [detector])
+                
+                # Batched with concurrent requests for the same model
+                detections, inference_ms = await timed_submit(model_to_use, image, confidence, class_filter)
+                timings = {"models_ms": {model_to_use: round(inference_ms, 1)}}
+            
+            annotated = await job.run(ImageProcessor.draw_detections, image, detections)
+            
+            # Calculate statistics
+            stats = ImageProcessor.calculate_statistics(detections)
+            
+            # Encode annotated image
+            annotated_base64 = await job.run(ImageProcessor.encode_image_to_base64, annotated)
         
         return {
             "success": True,
             "model_used": model_to_use,
+            "classes": class_filter,
             "annotated_image": annotated_base64,
-            "detections": detections,
-            "statistics": stats
+            "detections": detections.to_dicts(),
+            "statistics": stats,
+            "timings": timings
         }
     
+    except ServerBusy as e:
+        raise busy_error(e)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -307,52 +346,166 @@ async def detect_video(
     file: UploadFile = File(...),
     confidence: float = Form(0.5),
     model: str = Form(None),
-    skip_frames: int = Form(0)
+    skip_frames: int = Form(0),
+    batch_size: int = Form(VIDEO_BATCH_SIZE),
+    ensemble_strategy: str = Form(ENSEMBLE_VIDEO_STRATEGY),
+    secondary_interval: int = Form(ENSEMBLE_SECONDARY_INTERVAL),
+    propagation: str = Form(SKIP_FRAME_PROPAGATION),
+    tracking: str = Form(TRACKING_MODE),
+    include_frames: bool = Form(False),
+    decoder: str = Form(VIDEO_DECODER),
+    decode_max_side: int = Form(VIDEO_DECODE_MAX_SIDE)
 ):
-    """Process a video file for detection."""
-    try:
-        # Save uploaded video to temp file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as tmp:
-            contents = await file.read()
-            tmp.write(contents)
-            video_path = tmp.name
-        
-        # Create temp output path
-        output_path = tempfile.NamedTemporaryFile(delete=False, suffix=".mp4").name
-        
-        # Use specified model or active model
-        model_to_use = model or _active_model
-        
-        if model_to_use == "ensemble":
-            # For video, just use YOLO for speed (ensemble is too slow for video)
-            model_to_use = "yolo"
-        
-        detector = get_detector(model_to_use)
-        processor = VideoProcessor(detector)
-        
-        # Process video
-        result = processor.process_video_file(
-            video_path,
-            confidence_threshold=confidence,
-            output_path=output_path,
-            skip_frames=skip_frames
+    """
+    Process a video file for detection.
+    
+    In ensemble mode YOLO runs on every processed frame and SSD only on
+    some of them (see VideoEnsembleDetector): every ``secondary_interval``-th
+    frame with ``ensemble_strategy`` "alternate", or where YOLO is unsure
+    with "cascade".
+    
+    With ``skip_frames`` > 0, skipped frames are annotated with boxes
+    propagated from the last inferred frame (``propagation``: "hold",
+    "linear", "flow" or "none").
+    
+    Detections carry a ``track_id`` from the tracker selected by
+    ``tracking`` ("centroid" or "sort") and the statistics count each track
+    once. With ``include_frames``, ``frames`` lists the detections of every
+    inferred frame; ``timeline`` has per-second counts.
+    
+    ``decoder`` picks the frame source ("pyav", "opencv" or "auto") and
+    ``decode_max_side`` > 0 downscales frames while decoding, so the
+    output video and boxes are at that size.
+    
+    With SEGMENT_WORKERS set, long videos are split at keyframes and the
+    segments processed in parallel worker processes (PyAV decoding only),
+    or queued in the SEGMENT_BROKER_DB broker for the workers of all nodes
+    when one is configured; ``segments`` then describes the split and
+    ``ensemble`` has the counters of each segment.
+    """
+    if ensemble_strategy not in VIDEO_ENSEMBLE_STRATEGIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid ensemble_strategy. Valid options: {list(VIDEO_ENSEMBLE_STRATEGIES)}"
         )
-        
-        # Read output video and encode
-        with open(output_path, "rb") as f:
-            video_data = base64.b64encode(f.read()).decode("utf-8")
-        
-        # Cleanup temp files
-        os.unlink(video_path)
-        os.unlink(output_path)
+    if propagation not in PROPAGATION_MODES:
+        raise HTTPException(status_code=400, detail=f"Invalid propagation. Valid options: {list(PROPAGATION_MODES)}")
+    if tracking not in TRACKING_MODES:
+        raise HTTPException(status_code=400, detail=f"Invalid tracking. Valid options: {list(TRACKING_MODES)}")
+    if decoder not in FRAME_DECODERS:
+        raise HTTPException(status_code=400, detail=f"Invalid decoder. Valid options: {list(FRAME_DECODERS)}")
+    
+    video_path = output_path = None
+    try:
+        # Admit the job before accepting the upload, so a busy server rejects it early
+        async with get_video_executor().job() as job:
+            # Save uploaded video to temp file
+            with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as tmp:
+                contents = await file.read()
+                tmp.write(contents)
+                video_path = tmp.name
+            
+            # Create temp output path
+            output_path = tempfile.NamedTemporaryFile(delete=False, suffix=".mp4").name
+            
+            # Use specified model or active model
+            model_to_use = model or _active_model
+            
+            members = active_models(model_to_use)
+            
+            segments = []
+            if SEGMENT_WORKERS > 0 and decoder != "opencv":
+                segments = await job.run(plan_segments, video_path, SEGMENT_WORKERS)
+            
+            if len(segments) > 1:
+                # Long video: segments run in worker processes with their own model replicas
+                specs = {spec.model_id: spec for spec in get_registry().specs()}
+                unknown = [model_id for model_id in members if model_id not in specs]
+                if unknown:
+                    raise HTTPException(status_code=400, detail=f"Unknown model: {unknown[0]}")
+                detector_factory = segment_detector_factory(
+                    [specs[model_id] for model_id in members], ensemble_strategy, secondary_interval
+                )
+                options = dict(
+                    confidence_threshold=confidence,
+                    output_path=output_path,
+                    skip_frames=skip_frames,
+                    include_frames=include_frames,
+                    batch_size=batch_size,
+                    propagation=propagation,
+                    tracking=tracking,
+                    decode_max_side=decode_max_side
+                )
+                broker = get_segment_broker()
+                if broker is not None:
+                    # Queue the segments for the broker's workers, on this and other nodes
+                    result = await job.run(
+                        process_video_distributed, broker, video_path, segments, detector_factory, **options
+                    )
+                else:
+                    result = await job.run(
+                        process_video_segmented, video_path, segments, detector_factory,
+                        workers=SEGMENT_WORKERS, **options
+                    )
+                ensemble = [segment["ensemble"] for segment in result["segments"]]
+            else:
+                await asyncio.gather(*(load_detector(model_id) for model_id in members))
+                
+                # Hold the models for the whole video so they cannot be evicted midway
+                with ExitStack() as stack:
+                    detectors = [stack.enter_context(use_detector(model_id)) for model_id in members]
+                    if model_to_use == "ensemble":
+                        detector = VideoEnsembleDetector(
+                            *detectors,
+                            strategy=ensemble_strategy,
+                            secondary_interval=secondary_interval
+                        )
+                    else:
+                        detector = detectors[0]
+                    processor = VideoProcessor(
+                        detector, batch_size=batch_size, propagation=propagation, tracking=tracking,
+                        decoder=decoder, decode_max_side=decode_max_side
+                    )
+                    
+                    # Process video off the event loop
+                    result = await job.run(
+                        processor.process_video_file,
+                        video_path,
+                        confidence_threshold=confidence,
+                        output_path=output_path,
+                        skip_frames=skip_frames,
+                        include_frames=include_frames
+                    )
+                if "error" in result:
+                    raise HTTPException(status_code=400, detail=result["error"])
+                ensemble = detector.stats() if model_to_use == "ensemble" else None
+            
+            # Read output video and encode
+            video_data = await job.run(read_base64, output_path)
         
         return {
             "success": True,
             "model_used": model_to_use,
             "video_base64": video_data,
             "video_info": result["video_info"],
-            "statistics": result["statistics"]
+            "statistics": result["statistics"],
+            "timeline": result["timeline"],
+            "propagation": result["propagation"],
+            "tracking": result["tracking"],
+            "pipeline": result["pipeline"],
+            "frames": result["frames"],
+            "segments": result.get("segments"),
+            "ensemble": ensemble if model_to_use == "ensemble" else None
         }
     
+    except ServerBusy as e:
+        raise busy_error(e)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        # Cleanup temp files, also when processing failed
+        for path in (video_path, output_path):
+            if path is not None and os.path.exists(path):
+                os.unlink(path)
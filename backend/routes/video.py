@@ -3,20 +3,60 @@ Video Processing WebSocket Routes
 """
 import asyncio
 import base64
-import cv2
 import numpy as np
 import tempfile
-import subprocess
 import os
 import json
+import threading
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from typing import Optional
+from typing import Callable, Optional
 
-from detectors import YOLODetector
-from processors.image_processor import ImageProcessor
+from detectors.registry import get_registry
+from detectors.worker_pool import pool_for, use_detector
+from processors.video_processor import VideoProcessor
+from processors.statistics import StreamingStatistics
+from processors.video_writer import open_video_writer
+from processors.frame_sources import FRAME_DECODERS, open_frame_source
+from utils.executor import ServerBusy, get_video_executor
+from processors.propagation import PROPAGATION_MODES, TRACKING_MODES
+from config.settings import (
+    VIDEO_BATCH_SIZE, SKIP_FRAME_PROPAGATION, TRACKING_MODE, VIDEO_DECODER, VIDEO_DECODE_MAX_SIDE
+)
 
 router = APIRouter(prefix="/api", tags=["video"])
 
+# Registry model used for video processing
+VIDEO_MODEL = "yolo"
+
+
+def save_upload(chunks: list) -> str:
+    """Decode the base64 upload chunks into a temporary .mp4 and return its path."""
+    video_data = base64.b64decode(''.join(chunks))
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as temp_input:
+        temp_input.write(video_data)
+    return temp_input.name
+
+
+def read_base64(path: str) -> str:
+    with open(path, 'rb') as f:
+        return base64.b64encode(f.read()).decode('utf-8')
+
+
+def discard(stop: Optional[Callable], source, writer, *paths: Optional[str]):
+    """
+    Stop the frame pipeline, abort an unfinished writer, close the frame
+    source and remove temp files (any of them may be None).
+    """
+    if stop is not None:
+        stop()
+    if writer is not None:
+        writer.abort()
+    if source is not None:
+        source.release()
+    for path in paths:
+        if path is not None and os.path.exists(path):
+            os.unlink(path)
+
 
 @router.websocket("/video/process")
 async def video_process_websocket(websocket: WebSocket):
@@ -26,6 +66,8 @@ async def video_process_websocket(websocket: WebSocket):
     await websocket.accept()
     print("Video WebSocket: Connection accepted")
     
+    temp_input_path = temp_output_path = None
+    source = out = stop_frames = None
     try:
         # First message: metadata
         print("Video WebSocket: Waiting for metadata...")
@@ -35,162 +77,177 @@ async def video_process_websocket(websocket: WebSocket):
         total_size = metadata.get("size", 0)
         confidence = metadata.get("confidence", 0.5)
         skip_frames = metadata.get("skip_frames", 2)
+        batch_size = metadata.get("batch_size", VIDEO_BATCH_SIZE)
+        propagation = metadata.get("propagation", SKIP_FRAME_PROPAGATION)
+        tracking = metadata.get("tracking", TRACKING_MODE)
+        include_frames = bool(metadata.get("include_frames", False))
+        decoder = metadata.get("decoder", VIDEO_DECODER)
+        decode_max_side = int(metadata.get("decode_max_side", VIDEO_DECODE_MAX_SIDE))
         
-        print(f"Video WebSocket: Receiving video ({total_size} bytes)")
-        
-        # Send acknowledgment
-        await websocket.send_json({"type": "ready"})
-        
-        # Receive video chunks
-        chunks = []
-        received = 0
-        
-        while received < total_size:
-            chunk = await asyncio.wait_for(websocket.receive_text(), timeout=60.0)
-            chunks.append(chunk)
-            received += len(base64.b64decode(chunk))
-            
-            # Send receive progress
-            progress = int((received / total_size) * 100)
-            await websocket.send_json({
-                "type": "upload",
-                "progress": progress
-            })
-        
-        print(f"Video WebSocket: Received {received} bytes")
-        
-        # Decode and save video
-        video_data = base64.b64decode(''.join(chunks))
-        temp_input = tempfile.NamedTemporaryFile(delete=False, suffix=".mp4")
-        temp_input.write(video_data)
-        temp_input.close()
-        
-        print(f"Video WebSocket: Saved to {temp_input.name}")
-        
-        # Load detector
-        await websocket.send_json({"type": "status", "message": "Loading model..."})
-        detector = YOLODetector()
-        detector.load_model()
-        
-        # Open video
-        cap = cv2.VideoCapture(temp_input.name)
-        
-        if not cap.isOpened():
-            await websocket.send_json({"error": "Could not open video"})
-            os.unlink(temp_input.name)
+        if propagation not in PROPAGATION_MODES:
+            await websocket.send_json({"error": f"Invalid propagation. Valid options: {list(PROPAGATION_MODES)}"})
+            return
+        if tracking not in TRACKING_MODES:
+            await websocket.send_json({"error": f"Invalid tracking. Valid options: {list(TRACKING_MODES)}"})
+            return
+        if decoder not in FRAME_DECODERS:
+            await websocket.send_json({"error": f"Invalid decoder. Valid options: {list(FRAME_DECODERS)}"})
             return
         
-        fps = int(cap.get(cv2.CAP_PROP_FPS)) or 30
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        
-        print(f"Video WebSocket: {total_frames} frames, {fps} fps, {width}x{height}")
-        
-        # Temp output
-        temp_raw = tempfile.NamedTemporaryFile(delete=False, suffix=".avi")
-        temp_raw_path = temp_raw.name
-        temp_raw.close()
-        
-        fourcc = cv2.VideoWriter_fourcc(*'MJPG')
-        out = cv2.VideoWriter(temp_raw_path, fourcc, fps, (width, height))
-        
-        all_detections = []
-        frame_count = 0
-        processed_count = 0
-        last_progress = 0
-        
-        await websocket.send_json({"type": "status", "message": "Processing frames..."})
+        print(f"Video WebSocket: Receiving video ({total_size} bytes)")
         
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
+        # Admit the job before the upload starts, so a busy server turns it away early
+        async with get_video_executor().job() as job:
+            # Send acknowledgment
+            await websocket.send_json({"type": "ready"})
             
-            frame_count += 1
-            progress = int((frame_count / total_frames) * 100)
+            # Receive video chunks
+            chunks = []
+            received = 0
             
-            # Send progress every 5%
-            if progress >= last_progress + 5:
-                last_progress = progress
+            while received < total_size:
+                chunk = await asyncio.wait_for(websocket.receive_text(), timeout=60.0)
+                chunks.append(chunk)
+                received += len(base64.b64decode(chunk))
+                
+                # Send receive progress
+                progress = int((received / total_size) * 100)
                 await websocket.send_json({
-                    "type": "progress",
-                    "progress": progress,
-                    "frame": frame_count,
-                    "total": total_frames
+                    "type": "upload",
+                    "progress": progress
                 })
-                await asyncio.sleep(0)
             
-            # Skip frames
-            if skip_frames > 0 and frame_count % (skip_frames + 1) != 0:
-                out.write(frame)
-                continue
+            print(f"Video WebSocket: Received {received} bytes")
             
-            # Process frame
-            annotated, detections = ImageProcessor.process_image(
-                frame, detector, confidence
-            )
+            # Decode and save video
+            temp_input_path = await job.run(save_upload, chunks)
             
-            all_detections.extend(detections)
-            processed_count += 1
-            out.write(annotated)
-        
-        cap.release()
-        out.release()
-        
-        print(f"Video WebSocket: Processed {processed_count} frames")
-        
-        # Encode
-        await websocket.send_json({
-            "type": "status",
-            "message": "Encoding video...",
-            "progress": 100
-        })
-        
-        temp_output = tempfile.NamedTemporaryFile(delete=False, suffix=".mp4")
-        temp_output_path = temp_output.name
-        temp_output.close()
-        
-        try:
-            subprocess.run([
-                'ffmpeg', '-y', '-i', temp_raw_path,
-                '-c:v', 'libx264', '-preset', 'fast',
-                '-crf', '23', '-pix_fmt', 'yuv420p',
-                '-movflags', '+faststart',
-                temp_output_path
-            ], capture_output=True, check=True)
-        except Exception as e:
-            print(f"FFmpeg error: {e}")
-            import shutil
-            shutil.copy(temp_raw_path, temp_output_path)
-        
-        # Read and encode output
-        with open(temp_output_path, 'rb') as f:
-            output_video = base64.b64encode(f.read()).decode('utf-8')
-        
-        # Cleanup
-        os.unlink(temp_input.name)
-        os.unlink(temp_raw_path)
-        os.unlink(temp_output_path)
-        
-        stats = ImageProcessor.calculate_statistics(all_detections)
-        
-        print("Video WebSocket: Sending result")
-        
-        await websocket.send_json({
-            "type": "complete",
-            "video_base64": output_video,
-            "video_info": {
-                "fps": fps,
-                "total_frames": total_frames,
-                "processed_frames": processed_count,
-                "width": width,
-                "height": height,
-                "duration_seconds": total_frames / fps if fps > 0 else 0
-            },
-            "statistics": stats
-        })
+            print(f"Video WebSocket: Saved to {temp_input_path}")
+            
+            # Load detector
+            await websocket.send_json({"type": "status", "message": "Loading model..."})
+            if pool_for(VIDEO_MODEL) is None:
+                await get_registry().aget(VIDEO_MODEL)
+            
+            # Open video
+            source = await job.run(open_frame_source, temp_input_path, decoder, decode_max_side)
+            
+            if not source.isOpened():
+                await websocket.send_json({"error": "Could not open video"})
+                return
+            
+            fps = int(source.fps) or 30
+            total_frames = source.frame_count
+            width, height = source.width, source.height
+            
+            print(f"Video WebSocket: {total_frames} frames, {fps} fps, {width}x{height} ({source.name})")
+            
+            # Output is encoded while frames are processed
+            temp_output = tempfile.NamedTemporaryFile(delete=False, suffix=".mp4")
+            temp_output_path = temp_output.name
+            temp_output.close()
+            out = await job.run(open_video_writer, temp_output_path, source.fps, width, height)
+            
+            stats = StreamingStatistics()
+            processed_count = 0
+            last_progress = 0
+            
+            # Hold the model for the whole video so it cannot be evicted midway
+            with use_detector(VIDEO_MODEL) as detector:
+                processor = VideoProcessor(
+                    detector, batch_size=batch_size, propagation=propagation, tracking=tracking
+                )
+                frames = processor.iter_processed_frames(source, confidence, skip_frames, writer=out)
+                frames_lock = threading.Lock()
+                
+                def step():
+                    """Wait for the next processed (and written) frame on the executor (None at the end)."""
+                    with frames_lock:
+                        return next(frames, None)
+                
+                def stop_frames():
+                    """Stop the pipeline threads once the step in flight (if any) has returned."""
+                    with frames_lock:
+                        frames.close()
+                
+                await websocket.send_json({"type": "status", "message": "Processing frames..."})
+                
+                try:
+                    while True:
+                        item = await job.run(step)
+                        if item is None:
+                            break
+                        frame_count, timestamp, output_frame, detections = item
+                        progress = int((frame_count / total_frames) * 100) if total_frames > 0 else 0
+                
+                        # Send progress every 5%
+                        if progress >= last_progress + 5:
+                            last_progress = progress
+                            await websocket.send_json({
+                                "type": "progress",
+                                "progress": progress,
+                                "frame": frame_count,
+                                "total": total_frames
+                            })
+                
+                        if detections is not None:
+                            stats.update(detections, timestamp=timestamp)
+                            processed_count += 1
+                            if include_frames:
+                                # Streamed as they come, so nothing per frame is kept here
+                                await websocket.send_json({
+                                    "type": "frame",
+                                    "frame": frame_count,
+                                    "timestamp": timestamp,
+                                    "detections": detections.to_dicts()
+                                })
+                finally:
+                    # Stop the pipeline threads (on the executor, as they may be mid-batch)
+                    # before the model is released
+                    await job.run(stop_frames)
+            
+            source.release()
+            
+            print(f"Video WebSocket: Processed {processed_count} frames")
+            
+            # Finish encoding
+            await websocket.send_json({
+                "type": "status",
+                "message": "Encoding video...",
+                "progress": 100
+            })
+            writer, out = out, None
+            await job.run(writer.release)
+            
+            # Read and encode output
+            output_video = await job.run(read_base64, temp_output_path)
+            
+            print("Video WebSocket: Sending result")
+            
+            await websocket.send_json({
+                "type": "complete",
+                "video_base64": output_video,
+                "video_info": {
+                    "fps": fps,
+                    "total_frames": total_frames,
+                    "processed_frames": processed_count,
+                    "width": width,
+                    "height": height,
+                    "source_width": source.source_width,
+                    "source_height": source.source_height,
+                    "decoder": source.name,
+                    "duration_seconds": total_frames / fps if fps > 0 else 0
+                },
+                "statistics": stats.summary(),
+                "timeline": stats.timeline(),
+                "propagation": processor.propagator.stats(),
+                "tracking": processor.propagator.tracking_stats(),
+                "pipeline": processor.pipeline.stats()
+            })
         
+    except ServerBusy as e:
+        print("Video WebSocket: Server busy")
+        await websocket.send_json({"error": str(e), "retry_after": e.retry_after})
     except asyncio.TimeoutError:
         print("Video WebSocket: Timeout")
         await websocket.send_json({"error": "Timeout waiting for data"})
@@ -204,3 +261,7 @@ async def video_process_websocket(websocket: WebSocket):
             await websocket.send_json({"error": str(e)})
         except:
             pass
+    finally:
+        # Also after a disconnect, an error or cancellation: stop the pipeline, ffmpeg and
+        # the decoder and drop the temp files (submitted at once, so it runs even if cancelled)
+        await asyncio.to_thread(discard, stop_frames, source, out, temp_input_path, temp_output_path)
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+YOLO Post-processing Micro-benchmark
+
+Compares the old per-box result extraction (three .cpu().numpy() calls per
+box) with the vectorized extraction used by the YOLO detectors, on
+synthetic ultralytics results with 10, 100 and 300 boxes.
+
+Usage:
+    python scripts/bench_postprocess.py [--repeats 200]
+"""
+import argparse
+import os
+import sys
+import time
+
+# Add the backend directory to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import torch
+from ultralytics.engine.results import Boxes
+
+from detectors.yolo_coco_detector import (
+    YOLOCocoDetector, COCO_TRAFFIC_MAPPING, COCO_CLASS_NAMES
+)
+
+
+class _Result:
+    """Minimal stand-in for an ultralytics Results object."""
+
+    def __init__(self, boxes: Boxes):
+        self.boxes = boxes
+
+
+def make_result(num_boxes: int, seed: int = 0) -> _Result:
+    """Build a result with random boxes over all 80 COCO classes."""
+    rng = np.random.default_rng(seed)
+    xy = rng.uniform(0, 1200, size=(num_boxes, 2))
+    wh = rng.uniform(10, 200, size=(num_boxes, 2))
+    conf = rng.uniform(0.25, 1.0, size=(num_boxes, 1))
+    cls = rng.integers(0, len(COCO_CLASS_NAMES), size=(num_boxes, 1))
+    data = np.hstack([xy, xy + wh, conf, cls]).astype(np.float32)
+    return _Result(Boxes(torch.from_numpy(data), (1280, 1280)))
+
+
+def legacy_parse(result) -> list:
+    """Per-box extraction as done before vectorization."""
+    detections = []
+    for box in result.boxes:
+        x1, y1, x2, y2 = box.xyxy[0].cpu().numpy().astype(int)
+        confidence = float(box.conf[0].cpu().numpy())
+        class_id = int(box.cls[0].cpu().numpy())
+        if class_id not in COCO_TRAFFIC_MAPPING:
+            continue
+        detections.append((COCO_TRAFFIC_MAPPING[class_id], confidence, (x1, y1, x2, y2), class_id))
+    return detections
+
+
+def time_per_call(fn, arg, repeats: int) -> float:
+    """Return the median time per call in milliseconds."""
+    fn(arg)  # warm-up
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(arg)
+        samples.append(time.perf_counter() - start)
+    return float(np.median(samples)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=200, help="Timed calls per measurement")
+    args = parser.parse_args()
+
+    detector = YOLOCocoDetector(model_size="n")
+
+    print(f"{'boxes':>6} {'before (ms)':>12} {'after (ms)':>11} {'speedup':>8}")
+    for num_boxes in (10, 100, 300):
+        result = make_result(num_boxes)
+
+        # Both paths must agree before their timings mean anything
+        assert len(legacy_parse(result)) == len(detector._parse_result(result))
+
+        before = time_per_call(legacy_parse, result, args.repeats)
+        after = time_per_call(detector._parse_result, result, args.repeats)
+        print(f"{num_boxes:>6} {before:>12.3f} {after:>11.3f} {before / after:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+API Startup Benchmark
+
+Measures, in fresh interpreters:
+  * how long ``import main`` takes and which heavy ML packages it pulls in
+  * time from launching uvicorn until /api/health/live first answers
+  * optionally, time until /api/health/ready reports the active model warm
+
+Usage:
+    python scripts/bench_startup.py [--runs 5] [--ready] [--timeout 300]
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("torch", "torchvision", "ultralytics", "onnxruntime", "scipy")
+
+IMPORT_PROBE = f"""
+import sys, time, json
+start = time.perf_counter()
+import main
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "heavy": [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))
+"""
+
+
+def measure_import() -> dict:
+    """Time ``import main`` in a fresh interpreter."""
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_PROBE],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(url: str, deadline: float) -> bool:
+    """Poll url until it returns 200 or the deadline passes."""
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return True
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.02)
+    return False
+
+
+def measure_server(check_ready: bool, timeout: float) -> dict:
+    """Launch uvicorn and time the first live (and optionally ready) response."""
+    port = free_port()
+    base = f"http://127.0.0.1:{port}/api/health"
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        deadline = start + timeout
+        result = {"live": None, "ready": None}
+        if wait_for(f"{base}/live", deadline):
+            result["live"] = time.perf_counter() - start
+        if check_ready and wait_for(f"{base}/ready", deadline):
+            result["ready"] = time.perf_counter() - start
+        return result
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def summarize(label: str, samples: list):
+    samples = [s for s in samples if s is not None]
+    if not samples:
+        print(f"{label:<22} timed out")
+        return
+    print(f"{label:<22} median {np.median(samples):6.2f}s  min {min(samples):6.2f}s  max {max(samples):6.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Fresh processes per measurement")
+    parser.add_argument("--ready", action="store_true", help="Also wait for /api/health/ready")
+    parser.add_argument("--timeout", type=float, default=300, help="Seconds to wait per server start")
+    args = parser.parse_args()
+
+    imports = [measure_import() for _ in range(args.runs)]
+    servers = [measure_server(args.ready, args.timeout) for _ in range(args.runs)]
+
+    summarize("import main", [run["seconds"] for run in imports])
+    heavy = sorted({module for run in imports for module in run["heavy"]})
+    print(f"{'heavy modules loaded':<22} {', '.join(heavy) if heavy else 'none'}")
+    summarize("first /health/live", [run["live"] for run in servers])
+    if args.ready:
+        summarize("first /health/ready", [run["ready"] for run in servers])
+
+
+if __name__ == "__main__":
+    main()
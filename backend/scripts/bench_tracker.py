@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Tracker Benchmark
+
+Simulates N objects moving across a 1920x1080 scene. Each frame a share of
+detections is missed, and objects leave while new ones enter. The tracker is
+fed the boxes and the script reports:
+  * mean and p95 time per update()
+  * identity consistency: how often a detection keeps the id its object had
+    when last matched
+
+Usage:
+    python scripts/bench_tracker.py [--objects 10 100 1000] [--frames 200]
+        [--assignment greedy|optimal] [--tracker centroid|sort] [--baseline path/to/tracker.py]
+
+--tracker sort runs the IoU + Kalman SortTracker instead of the centroid Tracker.
+
+--baseline loads a Tracker class from another file (e.g. an older version
+exported with git show) and runs the same scenes through it for comparison.
+"""
+import argparse
+import importlib.util
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.tracker import Tracker  # noqa: E402
+from utils.sort_tracker import SortTracker  # noqa: E402
+
+WIDTH, HEIGHT = 1920, 1080
+
+
+def make_scene(objects: int, frames: int, miss_rate: float, turnover: float, seed: int = 0):
+    """
+    Per-frame (boxes, object_ids) lists for a synthetic scene.
+
+    Objects are spread so that neighbours are usually farther apart than
+    they move between frames, as in real traffic footage.
+    """
+    rng = np.random.default_rng(seed)
+    next_id = objects
+    ids = np.arange(objects)
+    pos = rng.uniform((0, 0), (WIDTH, HEIGHT), (objects, 2))
+    vel = rng.normal(0, 3, (objects, 2))
+    size = rng.uniform(20, 60, (objects, 2))
+
+    scene = []
+    for _ in range(frames):
+        pos += vel + rng.normal(0, 0.5, pos.shape)
+
+        # Objects leaving the scene are replaced by new ones
+        leaving = rng.random(objects) < turnover
+        count = int(leaving.sum())
+        if count:
+            ids[leaving] = np.arange(next_id, next_id + count)
+            next_id += count
+            pos[leaving] = rng.uniform((0, 0), (WIDTH, HEIGHT), (count, 2))
+            vel[leaving] = rng.normal(0, 3, (count, 2))
+
+        seen = rng.random(objects) >= miss_rate
+        boxes = np.concatenate([pos - size / 2, pos + size / 2], axis=1)[seen].astype(np.int64)
+        order = rng.permutation(len(boxes))
+        scene.append((boxes[order], ids[seen][order]))
+    return scene
+
+
+def run(tracker_class, scene, **kwargs) -> dict:
+    if tracker_class is SortTracker:
+        tracker = tracker_class(max_age=5, **kwargs)
+    else:
+        tracker = tracker_class(max_disappeared=5, max_distance=30, **kwargs)
+    times = []
+    consistent = total = 0
+    last_track = {}
+
+    for boxes, truth in scene:
+        rects = boxes if hasattr(tracker, "assignments") else boxes.tolist()
+        start = time.perf_counter()
+        tracker.update(rects)
+        times.append(time.perf_counter() - start)
+
+        assignments = getattr(tracker, "assignments", None)
+        if assignments is None:
+            continue
+        for object_id, track_id in zip(truth.tolist(), list(assignments)):
+            if object_id in last_track:
+                total += 1
+                consistent += last_track[object_id] == track_id
+            last_track[object_id] = track_id
+
+    times = np.array(times) * 1000
+    return {
+        "mean_ms": times.mean(),
+        "p95_ms": np.percentile(times, 95),
+        "consistency": consistent / total if total else float("nan")
+    }
+
+
+def load_tracker_class(path: str):
+    spec = importlib.util.spec_from_file_location("baseline_tracker", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.Tracker
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--objects", type=int, nargs="+", default=[10, 100, 1000], help="Objects per frame")
+    parser.add_argument("--frames", type=int, default=200, help="Frames per scene")
+    parser.add_argument("--miss-rate", type=float, default=0.05, help="Share of detections missed per frame")
+    parser.add_argument("--turnover", type=float, default=0.01, help="Share of objects replaced per frame")
+    parser.add_argument("--assignment", choices=["greedy", "optimal"], default="greedy")
+    parser.add_argument("--tracker", choices=["centroid", "sort"], default="centroid")
+    parser.add_argument("--baseline", help="File with a Tracker class to compare against")
+    args = parser.parse_args()
+
+    tracker_class = SortTracker if args.tracker == "sort" else Tracker
+    trackers = [("current", tracker_class, {"assignment": args.assignment})]
+    if args.baseline:
+        trackers.append(("baseline", load_tracker_class(args.baseline), {}))
+
+    print(f"{'objects':>8} {'tracker':>9} {'mean ms':>9} {'p95 ms':>9} {'id consistency':>15}")
+    for objects in args.objects:
+        scene = make_scene(objects, args.frames, args.miss_rate, args.turnover)
+        for name, tracker_class, kwargs in trackers:
+            result = run(tracker_class, scene, **kwargs)
+            print(f"{objects:>8} {name:>9} {result['mean_ms']:>9.3f} {result['p95_ms']:>9.3f} "
+                  f"{result['consistency']:>15.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Event Loop Responsiveness Check
+
+Against a running server:
+  * uploads a synthetic video to /api/detect/video and, while it is being
+    processed, polls /api/health and records its latency
+  * optionally sends a burst of concurrent video jobs and checks that the
+    ones beyond the executor's capacity get 503 with a Retry-After header
+
+Exits non-zero if health latency during the video job exceeds --max-latency
+or if an overloaded request is not rejected properly.
+
+Usage:
+    python scripts/check_responsiveness.py [--url http://127.0.0.1:8000]
+        [--frames 300] [--max-latency 0.5] [--burst 0]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import cv2
+import numpy as np
+import requests
+
+
+def make_video(path: str, frames: int, width: int = 640, height: int = 480, fps: int = 30):
+    """Write a synthetic video of moving rectangles."""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    rng = np.random.default_rng(0)
+    background = cv2.GaussianBlur((rng.random((height, width, 3)) * 255).astype(np.uint8), (15, 15), 5)
+    for i in range(frames):
+        frame = background.copy()
+        x = (i * 4) % (width - 120)
+        cv2.rectangle(frame, (x, 200), (x + 120, 280), (40, 40, 200), -1)
+        writer.write(frame)
+    writer.release()
+
+
+def post_video(url: str, path: str, result: dict):
+    start = time.perf_counter()
+    with open(path, "rb") as f:
+        response = requests.post(
+            f"{url}/api/detect/video",
+            files={"file": ("check.mp4", f, "video/mp4")},
+            data={"confidence": "0.5"},
+            timeout=3600
+        )
+    result["status"] = response.status_code
+    result["retry_after"] = response.headers.get("Retry-After")
+    result["seconds"] = time.perf_counter() - start
+
+
+def check_health_during_job(url: str, video_path: str, max_latency: float) -> bool:
+    job = {}
+    worker = threading.Thread(target=post_video, args=(url, video_path, job))
+    worker.start()
+
+    latencies = []
+    while worker.is_alive():
+        start = time.perf_counter()
+        requests.get(f"{url}/api/health", timeout=60).raise_for_status()
+        latencies.append(time.perf_counter() - start)
+        time.sleep(0.05)
+    worker.join()
+
+    if job.get("status") != 200:
+        print(f"video job failed with HTTP {job.get('status')}")
+        return False
+    if not latencies:
+        print("video job finished before any health check was made; use more --frames")
+        return False
+
+    latencies = np.array(latencies) * 1000
+    print(f"video job             {job['seconds']:.1f}s")
+    print(f"health checks         {len(latencies)}")
+    print(f"health latency        median {np.median(latencies):.1f}ms  "
+          f"p95 {np.percentile(latencies, 95):.1f}ms  max {latencies.max():.1f}ms")
+    ok = latencies.max() <= max_latency * 1000
+    print("responsive            " + ("yes" if ok else f"NO (limit {max_latency * 1000:.0f}ms)"))
+    return ok
+
+
+def check_admission(url: str, video_path: str, burst: int) -> bool:
+    jobs = [{} for _ in range(burst)]
+    threads = [threading.Thread(target=post_video, args=(url, video_path, job)) for job in jobs]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    accepted = [job for job in jobs if job.get("status") == 200]
+    rejected = [job for job in jobs if job.get("status") == 503]
+    other = [job.get("status") for job in jobs if job.get("status") not in (200, 503)]
+    print(f"burst of {burst}           {len(accepted)} accepted, {len(rejected)} rejected with 503"
+          + (f", unexpected {other}" if other else ""))
+
+    if rejected:
+        retry = [job["retry_after"] for job in rejected]
+        print(f"Retry-After           {sorted(set(retry))}")
+        if any(value is None or not value.isdigit() for value in retry):
+            print("a 503 response is missing a numeric Retry-After header")
+            return False
+    return not other
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="Base URL of the running server")
+    parser.add_argument("--frames", type=int, default=300, help="Frames in the synthetic video")
+    parser.add_argument("--max-latency", type=float, default=0.5, help="Allowed /api/health latency (seconds)")
+    parser.add_argument("--burst", type=int, default=0, help="Concurrent video jobs for the admission check")
+    args = parser.parse_args()
+
+    fd, video_path = tempfile.mkstemp(suffix=".mp4")
+    os.close(fd)
+    try:
+        make_video(video_path, args.frames)
+        ok = check_health_during_job(args.url, video_path, args.max_latency)
+        if args.burst > 0:
+            ok = check_admission(args.url, video_path, args.burst) and ok
+    finally:
+        os.unlink(video_path)
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
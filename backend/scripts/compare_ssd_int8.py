@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+SSD300 fp32 vs INT8 Comparison
+
+Runs the fp32 and INT8 SSD detectors on the same frames and reports
+per-frame latency and how well the INT8 detections agree with fp32.
+A detection agrees when it has the same class and IoU >= --iou with an
+unmatched fp32 box.
+
+Usage:
+    python scripts/compare_ssd_int8.py --frames path/to/frames [--confidence 0.5]
+
+The INT8 model is calibrated on SSD_CALIBRATION_DIR (see config/settings.py);
+use a different folder for --frames to measure on unseen data.
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+# Add the backend directory to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+
+from detectors.ssd_detector import SSDDetector
+from detectors.ssd_int8_detector import SSDInt8Detector, CALIBRATION_FORMATS
+
+
+def pairwise_iou(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """IoU matrix between two (N, 4) and (M, 4) xyxy box arrays."""
+    a = a.astype(np.float64)
+    b = b.astype(np.float64)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+
+def match(reference, candidate, iou_threshold: float):
+    """Greedy same-class matching in reference score order; returns (ious, score diffs)."""
+    if len(reference) == 0 or len(candidate) == 0:
+        return [], []
+
+    iou = pairwise_iou(reference.boxes, candidate.boxes)
+    iou[reference.class_ids[:, None] != candidate.class_ids[None, :]] = 0
+
+    used = np.zeros(len(candidate), dtype=bool)
+    ious, score_diffs = [], []
+    for i in np.argsort(-reference.scores):
+        row = np.where(used, 0, iou[i])
+        j = int(row.argmax())
+        if row[j] >= iou_threshold:
+            used[j] = True
+            ious.append(row[j])
+            score_diffs.append(abs(float(reference.scores[i]) - float(candidate.scores[j])))
+    return ious, score_diffs
+
+
+def timed_detect(detector, image, confidence):
+    """Run one detection and return (detections, milliseconds)."""
+    start = time.perf_counter()
+    detections = detector.detect(image, confidence)
+    return detections, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", required=True, help="Folder of .jpg/.png frames to evaluate on")
+    parser.add_argument("--confidence", type=float, default=0.5, help="Detection confidence threshold")
+    parser.add_argument("--iou", type=float, default=0.5, help="IoU needed for two boxes to agree")
+    parser.add_argument("--limit", type=int, default=200, help="Maximum number of frames to use")
+    args = parser.parse_args()
+
+    paths = sorted(
+        path for path in Path(args.frames).iterdir()
+        if path.suffix.lower() in CALIBRATION_FORMATS
+    )[:args.limit]
+    if not paths:
+        sys.exit(f"No frames found in {args.frames}")
+
+    fp32 = SSDDetector()
+    int8 = SSDInt8Detector()
+    if not fp32.load_model() or not int8.load_model():
+        sys.exit("Could not load both SSD models")
+
+    latencies = {"fp32": [], "int8": []}
+    fp32_boxes = int8_boxes = 0
+    all_ious, all_score_diffs = [], []
+
+    for index, path in enumerate(paths):
+        image = cv2.imread(str(path), cv2.IMREAD_COLOR)
+        if image is None:
+            continue
+
+        reference, fp32_ms = timed_detect(fp32, image, args.confidence)
+        candidate, int8_ms = timed_detect(int8, image, args.confidence)
+
+        # The first frame includes one-off allocation costs
+        if index > 0:
+            latencies["fp32"].append(fp32_ms)
+            latencies["int8"].append(int8_ms)
+
+        ious, score_diffs = match(reference, candidate, args.iou)
+        fp32_boxes += len(reference)
+        int8_boxes += len(candidate)
+        all_ious.extend(ious)
+        all_score_diffs.extend(score_diffs)
+
+    print(f"Frames: {len(paths)}  confidence: {args.confidence}  match IoU: {args.iou}")
+    print()
+    print(f"{'model':<6} {'mean ms':>9} {'median ms':>10} {'p95 ms':>8}")
+    for name, samples in latencies.items():
+        if samples:
+            print(f"{name:<6} {np.mean(samples):>9.1f} {np.median(samples):>10.1f} {np.percentile(samples, 95):>8.1f}")
+    if latencies["fp32"] and latencies["int8"]:
+        print(f"speedup: {np.median(latencies['fp32']) / np.median(latencies['int8']):.2f}x (median)")
+
+    matched = len(all_ious)
+    print()
+    print(f"fp32 boxes: {fp32_boxes}  int8 boxes: {int8_boxes}  matched: {matched}")
+    print(f"recall vs fp32:    {matched / fp32_boxes if fp32_boxes else 1.0:.3f}")
+    print(f"precision vs fp32: {matched / int8_boxes if int8_boxes else 1.0:.3f}")
+    if matched:
+        print(f"mean IoU of matches: {np.mean(all_ious):.3f}")
+        print(f"mean |score diff|:   {np.mean(all_score_diffs):.4f}")
+
+
+if __name__ == "__main__":
+    main()
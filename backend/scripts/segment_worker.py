@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Segment Broker Worker
+
+Runs on any node that shares the broker database and work directory with
+the API server (SEGMENT_BROKER_DB / SEGMENT_WORK_DIR). Each worker process
+leases video segments queued by /api/detect/video, processes them with its
+own model replicas and commits the results. A worker killed mid-segment
+loses its lease after SEGMENT_LEASE_SECONDS and another one redoes it.
+
+--workers N starts N processes on this machine, e.g. to try several
+"nodes" locally. Stop with Ctrl+C.
+
+Usage:
+    python scripts/segment_worker.py [--db path/to/broker.sqlite] [--workers 1]
+        [--max-idle SECONDS]
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.settings import SEGMENT_BROKER_DB  # noqa: E402
+from processors.segment_broker import (  # noqa: E402
+    SegmentBroker, run_worker, start_local_workers, stop_local_workers
+)
+from processors.segments import init_segment_worker  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=SEGMENT_BROKER_DB, help="Broker database (default SEGMENT_BROKER_DB)")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes on this machine")
+    parser.add_argument("--max-idle", type=float, help="Exit after the queue was empty this many seconds")
+    args = parser.parse_args()
+    if not args.db:
+        parser.error("--db or SEGMENT_BROKER_DB is required")
+
+    if args.workers == 1:
+        init_segment_worker(max(1, os.cpu_count() or 1))
+        try:
+            completed = run_worker(SegmentBroker(args.db), max_idle_seconds=args.max_idle)
+            print(f"Completed {completed} segments")
+        except KeyboardInterrupt:
+            pass
+        return
+
+    processes = start_local_workers(args.workers, args.db, max_idle_seconds=args.max_idle)
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_local_workers(processes)
+
+
+if __name__ == "__main__":
+    main()
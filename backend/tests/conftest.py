@@ -0,0 +1,7 @@
+"""
+Test setup: make the backend packages importable when pytest runs from backend/
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
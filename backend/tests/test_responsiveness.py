@@ -0,0 +1,142 @@
+"""
+Event loop responsiveness under video load
+
+Video jobs are stubbed to sleep on their executor thread, so these tests
+need no models. They check that /api/health answers quickly while videos
+are being processed, and that video uploads beyond the video executor's
+capacity get 503 with a numeric Retry-After.
+"""
+import asyncio
+import contextlib
+import time
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from routes import detection
+from utils import executor
+
+JOB_SECONDS = 1.0
+MAX_HEALTH_LATENCY = 0.2
+
+
+class SleepingProcessor:
+    """Stands in for VideoProcessor: blocks its thread like a real video job."""
+
+    def __init__(self, detector, **options):
+        self.detector = detector
+
+    def process_video_file(self, video_path, confidence_threshold=0.5, output_path=None,
+                           skip_frames=0, include_frames=False):
+        time.sleep(JOB_SECONDS)
+        with open(output_path, "wb") as f:
+            f.write(b"\0" * 1024)
+        return {
+            "video_info": {}, "statistics": {}, "timeline": [], "propagation": {},
+            "tracking": {}, "pipeline": {}, "frames": None
+        }
+
+
+@pytest.fixture
+def app(monkeypatch):
+    async def load_detector(model_id):
+        return None
+
+    @contextlib.contextmanager
+    def use_detector(model_id):
+        yield object()
+
+    monkeypatch.setattr(detection, "VideoProcessor", SleepingProcessor)
+    monkeypatch.setattr(detection, "load_detector", load_detector)
+    monkeypatch.setattr(detection, "use_detector", use_detector)
+    monkeypatch.setattr(detection, "SEGMENT_WORKERS", 0)
+    # One video at a time plus one queued
+    monkeypatch.setattr(executor, "_video_executor", executor.BoundedExecutor(1, 1, name="video"))
+
+    app = FastAPI()
+    app.include_router(detection.router)
+    return app
+
+
+async def upload_video(client: httpx.AsyncClient) -> httpx.Response:
+    return await client.post(
+        "/api/detect/video",
+        files={"file": ("clip.mp4", b"\0" * 1024, "video/mp4")},
+        data={"model": "yolo"}
+    )
+
+
+async def health_latencies(client: httpx.AsyncClient, seconds: float):
+    latencies = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        response = await client.get("/api/health")
+        latencies.append(time.perf_counter() - start)
+        assert response.status_code == 200
+        await asyncio.sleep(0.02)
+    return latencies
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_health_stays_responsive_during_video_jobs(app):
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            videos = [asyncio.create_task(upload_video(client)) for _ in range(2)]
+            await asyncio.sleep(0.1)
+            latencies = await health_latencies(client, JOB_SECONDS)
+            responses = await asyncio.gather(*videos)
+        return latencies, responses
+
+    latencies, responses = run(scenario())
+    assert [response.status_code for response in responses] == [200, 200]
+    assert len(latencies) > 10
+    assert max(latencies) < MAX_HEALTH_LATENCY
+
+
+def test_videos_over_capacity_get_503_with_retry_after(app):
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*(upload_video(client) for _ in range(4)))
+
+    responses = run(scenario())
+    statuses = sorted(response.status_code for response in responses)
+    assert statuses == [200, 200, 503, 503]
+    for response in responses:
+        if response.status_code == 503:
+            assert response.headers["Retry-After"].isdigit()
+            assert int(response.headers["Retry-After"]) >= 1
+
+
+def test_video_jobs_do_not_take_the_cpu_executor(app):
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            video = asyncio.create_task(upload_video(client))
+            await asyncio.sleep(0.1)
+            running = executor.get_executor().stats()["active_jobs"]
+            await video
+        return running
+
+    assert run(scenario()) == 0
+
+
+def test_unreadable_video_is_a_client_error(app, monkeypatch):
+    from processors.video_processor import VideoProcessor
+
+    monkeypatch.setattr(detection, "VideoProcessor", VideoProcessor)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await upload_video(client)
+
+    response = run(scenario())
+    assert response.status_code == 400
+    assert "Could not open" in response.json()["detail"]
@@ -0,0 +1,89 @@
+"""
+Segment broker leases
+
+Runs the SQLite broker against a database in a temp directory, with
+short leases instead of real workers.
+"""
+import time
+
+import pytest
+
+from processors.segment_broker import SegmentBroker, worker_name
+
+LEASE_SECONDS = 0.2
+
+
+@pytest.fixture
+def broker(tmp_path):
+    return SegmentBroker(str(tmp_path / "broker.sqlite"), lease_seconds=LEASE_SECONDS, max_attempts=2)
+
+
+def expire_leases():
+    time.sleep(LEASE_SECONDS * 1.5)
+
+
+def test_segments_are_leased_in_order_and_results_collected(broker):
+    job_id = broker.submit([{"segment": 0}, {"segment": 1}])
+
+    first = broker.lease("a")
+    second = broker.lease("b")
+    assert (first.index, first.task) == (0, {"segment": 0})
+    assert (second.index, second.task) == (1, {"segment": 1})
+    assert broker.lease("c") is None
+
+    assert broker.complete(second, {"result": 1})
+    assert broker.complete(first, {"result": 0})
+    assert broker.progress(job_id) == {"pending": 0, "leased": 0, "done": 2, "failed": 0}
+    assert broker.wait(job_id, timeout=1) == [{"result": 0}, {"result": 1}]
+
+
+def test_expired_lease_is_re_leased_and_stale_result_rejected(broker):
+    job_id = broker.submit([{"segment": 0}])
+
+    stale = broker.lease("a")
+    assert broker.lease("b") is None
+    assert broker.renew(stale)
+
+    expire_leases()
+    current = broker.lease("b")
+    assert current is not None and current.index == 0
+
+    # The worker that lost the lease can no longer renew, complete or fail it
+    assert not broker.renew(stale)
+    assert not broker.complete(stale, {"result": "stale"})
+    broker.fail(stale, "ignored")
+    assert broker.progress(job_id)["leased"] == 1
+
+    assert broker.complete(current, {"result": "current"})
+    assert broker.wait(job_id, timeout=1) == [{"result": "current"}]
+
+
+def test_segment_fails_after_max_attempts(broker):
+    job_id = broker.submit([{"segment": 0}])
+
+    assert broker.lease("a") is not None
+    expire_leases()
+    assert broker.lease("b") is not None
+    expire_leases()
+
+    # Both attempts are used up: the expired lease fails instead of being handed out again
+    assert broker.lease("c") is None
+    assert broker.progress(job_id)["failed"] == 1
+    with pytest.raises(RuntimeError, match="Lease expired 2 times"):
+        broker.wait(job_id, timeout=1)
+
+
+def test_failed_segment_is_retried_until_max_attempts(broker):
+    job_id = broker.submit([{"segment": 0}])
+
+    broker.fail(broker.lease("a"), "ValueError: first")
+    assert broker.progress(job_id)["pending"] == 1
+    broker.fail(broker.lease("b"), "ValueError: second")
+    assert broker.lease("c") is None
+    with pytest.raises(RuntimeError, match="second"):
+        broker.wait(job_id, timeout=1)
+
+
+def test_worker_names_are_unique():
+    assert worker_name("local-0") != worker_name("local-0")
+    assert worker_name() != worker_name()
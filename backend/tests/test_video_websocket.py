@@ -0,0 +1,154 @@
+"""
+Video WebSocket cleanup
+
+The decoder, the model and the encoder are stubbed. A client that goes
+away mid-video must not leave the pipeline or the ffmpeg writer running,
+the frame source open or the temporary files on disk.
+"""
+import base64
+import contextlib
+import os
+import threading
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from detectors.detection_set import DetectionSet
+from routes import video
+from utils import executor
+
+
+class StubSource:
+    fps = 25
+    width = height = source_width = source_height = 64
+    name = "stub"
+
+    def __init__(self, path, frame_count):
+        self.path = path
+        self.frame_count = frame_count
+        self.released = False
+
+    def isOpened(self):
+        return True
+
+    def release(self):
+        self.released = True
+
+
+class StubWriter:
+    def __init__(self, path):
+        self.path = path
+        self.released = False
+        self.aborted = False
+
+    def release(self):
+        self.released = True
+
+    def abort(self):
+        self.aborted = True
+
+
+class SlowProcessor:
+    """Yields one detected frame every 20 ms, like a real (slow) video."""
+
+    propagator = type("Propagator", (), {"stats": lambda self: {}, "tracking_stats": lambda self: {}})()
+    pipeline = type("Pipeline", (), {"stats": lambda self: {}})()
+
+    def __init__(self, detector, **options):
+        self.closed = threading.Event()
+
+    def iter_processed_frames(self, source, confidence_threshold, skip_frames, writer=None):
+        try:
+            for number in range(source.frame_count):
+                time.sleep(0.02)
+                yield number, number / source.fps, None, DetectionSet.empty(("Car",))
+        finally:
+            self.closed.set()
+
+
+def make_stubs(monkeypatch, frame_count):
+    opened = {}
+
+    def open_frame_source(path, decoder, max_side):
+        opened["source"] = StubSource(path, frame_count)
+        return opened["source"]
+
+    def open_video_writer(path, fps, width, height):
+        opened["writer"] = StubWriter(path)
+        return opened["writer"]
+
+    def make_processor(detector, **options):
+        opened["processor"] = SlowProcessor(detector, **options)
+        return opened["processor"]
+
+    @contextlib.contextmanager
+    def use_detector(model_id):
+        yield object()
+
+    monkeypatch.setattr(video, "pool_for", lambda model_id: object())
+    monkeypatch.setattr(video, "open_frame_source", open_frame_source)
+    monkeypatch.setattr(video, "open_video_writer", open_video_writer)
+    monkeypatch.setattr(video, "use_detector", use_detector)
+    monkeypatch.setattr(video, "VideoProcessor", make_processor)
+    monkeypatch.setattr(video, "read_base64", lambda path: "")
+    monkeypatch.setattr(executor, "_video_executor", executor.BoundedExecutor(1, 0, name="video"))
+    return opened
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(video.router)
+    with TestClient(app) as client:
+        yield client
+
+
+def start_upload(websocket, size: int = 1024):
+    websocket.send_text('{"size": %d, "skip_frames": 0}' % size)
+    assert websocket.receive_json()["type"] == "ready"
+    websocket.send_text(base64.b64encode(b"\0" * size).decode())
+
+
+def wait_for(condition, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+def test_disconnect_mid_video_releases_everything(client, monkeypatch):
+    opened = make_stubs(monkeypatch, frame_count=200)
+    with client.websocket_connect("/api/video/process") as websocket:
+        start_upload(websocket)
+        while websocket.receive_json().get("type") != "progress":
+            pass
+        # Leave while frames are still being processed
+
+    assert wait_for(lambda: opened["processor"].closed.is_set())
+    assert wait_for(lambda: not os.path.exists(opened["writer"].path))
+    assert opened["writer"].aborted
+    assert not opened["writer"].released
+    assert opened["source"].released
+    assert not os.path.exists(opened["source"].path)
+    assert executor.get_video_executor().stats()["active_jobs"] == 0
+
+
+def test_completed_video_finishes_encoding(client, monkeypatch):
+    opened = make_stubs(monkeypatch, frame_count=3)
+    with client.websocket_connect("/api/video/process") as websocket:
+        start_upload(websocket)
+        message = websocket.receive_json()
+        while message.get("type") != "complete":
+            assert "error" not in message, message
+            message = websocket.receive_json()
+        assert message["video_info"]["processed_frames"] == 3
+
+    assert wait_for(lambda: not os.path.exists(opened["writer"].path))
+    assert opened["writer"].released
+    assert not opened["writer"].aborted
+    assert opened["source"].released
+    assert not os.path.exists(opened["source"].path)
@@ -1,28 +1,61 @@
 """
-Download state tracking - simplified (no progress tracking)
+Download state tracking - per model, safe to update from loader threads
 """
+import threading
+import time
+from typing import Dict, Optional
 
-_download_state = {
-    "is_downloading": False,
-    "model_name": "",
-    "progress": 0
-}
+_lock = threading.Lock()
+_download_states: Dict[str, dict] = {}
+
+
+def _idle_state(model_name: str = "") -> dict:
+    return {
+        "is_downloading": False,
+        "model_name": model_name,
+        "progress": 0,
+        "error": None,
+        "updated_at": None
+    }
 
 
 def set_download_state(is_downloading: bool, model_name: str = "", progress: int = 0):
-    """Set download state."""
-    _download_state["is_downloading"] = is_downloading
-    _download_state["model_name"] = model_name
-    _download_state["progress"] = progress
+    """Set the download state of one model."""
+    with _lock:
+        state = _download_states.setdefault(model_name, _idle_state(model_name))
+        state["is_downloading"] = is_downloading
+        state["progress"] = progress
+        state["error"] = None
+        state["updated_at"] = time.time()
+
+
+def reset_download_state(model_name: str = "", error: Optional[str] = None):
+    """Mark a model as no longer downloading, recording the error if loading failed."""
+    with _lock:
+        state = _download_states.setdefault(model_name, _idle_state(model_name))
+        state["is_downloading"] = False
+        state["progress"] = 0 if error else 100
+        state["error"] = error
+        state["updated_at"] = time.time()
+
 
+def get_download_state(model_name: Optional[str] = None) -> dict:
+    """
+    Get the download state of one model.
 
-def reset_download_state():
-    """Reset download state."""
-    _download_state["is_downloading"] = False
-    _download_state["model_name"] = ""
-    _download_state["progress"] = 0
+    Without a name, returns the state of a model that is currently
+    downloading, or an idle state if none is.
+    """
+    with _lock:
+        if model_name is not None:
+            return dict(_download_states.get(model_name) or _idle_state(model_name))
+        for state in _download_states.values():
+            if state["is_downloading"]:
+                return dict(state)
+        return _idle_state()
 
 
-def get_download_state():
-    """Get current download state."""
-    return _download_state.copy()
+def get_download_states() -> Dict[str, dict]:
+    """Download state of every model seen so far, keyed by model name."""
+    with _lock:
+        return {name: dict(state) for name, state in _download_states.items()}
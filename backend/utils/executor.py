@@ -0,0 +1,143 @@
+"""
+Bounded executor for blocking work started from async handlers
+"""
+import asyncio
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Callable, Optional
+
+from config.settings import (
+    CPU_EXECUTOR_WORKERS, CPU_EXECUTOR_QUEUE, VIDEO_EXECUTOR_WORKERS, VIDEO_EXECUTOR_QUEUE
+)
+
+
+class ServerBusy(Exception):
+    """Raised when a job cannot be admitted because the executor is full."""
+
+    def __init__(self, retry_after: int, message: str = "Server busy, try again later"):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class BlockingJob:
+    """An admitted job; run() executes blocking calls on the executor's threads."""
+
+    def __init__(self, executor: "BoundedExecutor"):
+        self._executor = executor
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        """Run fn(*args, **kwargs) on an executor thread and wait for the result."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor._threads, self._executor._call, fn, args, kwargs)
+
+
+class BoundedExecutor:
+    """
+    Thread pool for CPU-bound and blocking work with bounded admission.
+
+    A request is admitted with ``async with executor.job() as job`` and
+    runs its blocking calls through ``await job.run(fn, ...)``. At most
+    max_workers calls run at a time and the rest wait for a thread. The
+    number of admitted jobs is capped at max_workers + max_queued. A long
+    video counts as one job however many calls it makes. Once the cap is
+    reached, job() raises ServerBusy straight away with a Retry-After
+    estimate rather than letting work pile up without bound.
+
+    Admission counts jobs, not busy threads, so jobs that hold a thread for
+    long (whole videos) get their own executor (get_video_executor());
+    otherwise they would leave admitted short requests waiting behind them.
+    """
+
+    def __init__(self, max_workers: int = CPU_EXECUTOR_WORKERS, max_queued: int = CPU_EXECUTOR_QUEUE, name: str = "cpu"):
+        self.max_workers = max(1, max_workers)
+        self.max_queued = max(0, max_queued)
+        self.name = name
+        self._threads = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"{name}-job")
+        self._lock = threading.Lock()
+
+        # Statistics
+        self.active = 0
+        self.running_calls = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_seconds = 0.0
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queued
+
+    def retry_after(self) -> int:
+        """Seconds a rejected client should wait, from the average job duration."""
+        average = self.total_seconds / self.completed if self.completed else 1.0
+        backlog = max(0, self.active - self.max_workers) + 1
+        return max(1, math.ceil(average * backlog / self.max_workers))
+
+    @asynccontextmanager
+    async def job(self):
+        """
+        Admit a job for the duration of the block.
+
+        Raises:
+            ServerBusy: If max_workers + max_queued jobs are already admitted
+        """
+        with self._lock:
+            if self.active >= self.capacity:
+                self.rejected += 1
+                raise ServerBusy(self.retry_after())
+            self.active += 1
+
+        start = time.perf_counter()
+        try:
+            yield BlockingJob(self)
+        finally:
+            with self._lock:
+                self.active -= 1
+                self.completed += 1
+                self.total_seconds += time.perf_counter() - start
+
+    def _call(self, fn: Callable, args, kwargs):
+        with self._lock:
+            self.running_calls += 1
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self.running_calls -= 1
+
+    def stats(self) -> dict:
+        """Counters for the stats endpoint."""
+        return {
+            "max_workers": self.max_workers,
+            "max_queued": self.max_queued,
+            "active_jobs": self.active,
+            "running_calls": self.running_calls,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_job_seconds": round(self.total_seconds / self.completed, 3) if self.completed else 0.0
+        }
+
+    def shutdown(self):
+        self._threads.shutdown(wait=False, cancel_futures=True)
+
+
+_executor: Optional[BoundedExecutor] = None
+_video_executor: Optional[BoundedExecutor] = None
+
+
+def get_executor() -> BoundedExecutor:
+    """Process-wide executor for short request handlers (images, camera frames)."""
+    global _executor
+    if _executor is None:
+        _executor = BoundedExecutor()
+    return _executor
+
+
+def get_video_executor() -> BoundedExecutor:
+    """Process-wide executor for whole-video jobs."""
+    global _video_executor
+    if _video_executor is None:
+        _video_executor = BoundedExecutor(VIDEO_EXECUTOR_WORKERS, VIDEO_EXECUTOR_QUEUE, name="video")
+    return _video_executor
@@ -0,0 +1,212 @@
+"""
+IoU + Kalman Tracker
+SORT-style tracking: constant-velocity Kalman prediction and box IoU matching
+"""
+import numpy as np
+from collections import OrderedDict
+
+from .tracker import candidate_pairs, greedy_assignment, optimal_assignment
+
+# State: centre x, centre y, area, aspect ratio, and the velocities of the first three
+_F = np.eye(7)
+_F[0, 4] = _F[1, 5] = _F[2, 6] = 1.0
+_H = np.eye(4, 7)
+_Q = np.diag([1.0, 1.0, 1.0, 1.0, 0.01, 0.01, 1e-4])
+_R = np.diag([1.0, 1.0, 10.0, 10.0])
+_P0 = np.diag([10.0, 10.0, 10.0, 10.0, 1e4, 1e4, 1e4])
+
+
+def boxes_to_measurements(boxes: np.ndarray) -> np.ndarray:
+    """(N, 4) x1, y1, x2, y2 boxes to (N, 4) centre x, centre y, area, aspect ratio."""
+    boxes = boxes.astype(np.float64)
+    w = boxes[:, 2] - boxes[:, 0]
+    h = boxes[:, 3] - boxes[:, 1]
+    return np.stack([
+        boxes[:, 0] + w / 2, boxes[:, 1] + h / 2, w * h, w / np.maximum(h, 1e-6)
+    ], axis=1)
+
+
+def states_to_boxes(states: np.ndarray) -> np.ndarray:
+    """(N, 7) Kalman states to (N, 4) x1, y1, x2, y2 boxes."""
+    area = np.maximum(states[:, 2], 0.0)
+    w = np.sqrt(area * np.maximum(states[:, 3], 0.0))
+    h = np.divide(area, w, out=np.zeros_like(w), where=w > 0)
+    return np.stack([
+        states[:, 0] - w / 2, states[:, 1] - h / 2, states[:, 0] + w / 2, states[:, 1] + h / 2
+    ], axis=1)
+
+
+def iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """IoU between every box in a and every box in b."""
+    a = a.astype(np.float64)
+    b = b.astype(np.float64)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.divide(inter, union, out=np.zeros(inter.shape), where=union > 0)
+
+
+def pair_iou(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """IoU of a[i] and b[i] for every row i."""
+    w = np.clip(np.minimum(a[:, 2], b[:, 2]) - np.maximum(a[:, 0], b[:, 0]), 0, None)
+    h = np.clip(np.minimum(a[:, 3], b[:, 3]) - np.maximum(a[:, 1], b[:, 1]), 0, None)
+    inter = w * h
+    union = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1]) + (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1]) - inter
+    return np.divide(inter, union, out=np.zeros(inter.shape), where=union > 0)
+
+
+def overlapping_pairs(a: np.ndarray, b: np.ndarray, iou_threshold: float):
+    """
+    Pairs of boxes from a and b with IoU of at least iou_threshold.
+
+    Boxes can only overlap if their centres are closer than half their
+    diagonals combined, so candidates come from a centre-distance search
+    and IoU is computed for those pairs only.
+
+    Returns:
+        (rows, cols, iou) arrays, one entry per pair
+    """
+    centres_a = (a[:, :2] + a[:, 2:]) / 2
+    centres_b = (b[:, :2] + b[:, 2:]) / 2
+    reach = (np.hypot(*(a[:, 2:] - a[:, :2]).T).max() + np.hypot(*(b[:, 2:] - b[:, :2]).T).max()) / 2
+    rows, cols, _ = candidate_pairs(centres_a, centres_b, reach)
+    iou = pair_iou(a[rows], b[cols])
+    keep = iou >= iou_threshold
+    return rows[keep], cols[keep], iou[keep]
+
+
+class SortTracker:
+    """
+    Multi-object tracker in the style of SORT.
+
+    Every track carries a constant-velocity Kalman filter over its box
+    (centre, area, aspect ratio). On each update all tracks are predicted
+    one step ahead, and detections are matched to the predicted boxes by
+    IoU, so matching does not depend on resolution or speed the way a pixel
+    distance does. Matched tracks are corrected, unmatched detections start
+    new tracks, and tracks unmatched for more than max_age updates are
+    dropped. The filters of all tracks are advanced together as stacked
+    arrays.
+
+    Exposes the same ``update(rects)`` / ``assignments`` / ``is_tracked``
+    interface as the centroid Tracker.
+    """
+
+    def __init__(self, max_age=3, iou_threshold=0.3, min_hits=2, assignment="greedy"):
+        if assignment not in ("greedy", "optimal"):
+            raise ValueError(f"Unknown assignment: {assignment}. Valid options: ['greedy', 'optimal']")
+        self.max_age = max_age
+        self.iou_threshold = iou_threshold
+        self.min_hits = min_hits
+        self.assignment = assignment
+        self.next_object_id = 0
+
+        self._x = np.zeros((0, 7))
+        self._P = np.zeros((0, 7, 7))
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._hits = np.zeros(0, dtype=np.int64)
+        self._misses = np.zeros(0, dtype=np.int64)
+        self._id_set = set()
+
+        # Object id assigned to each rect of the latest update, in input order
+        self.assignments = np.empty(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _predict(self):
+        # Keep the predicted area from going negative
+        shrinking = self._x[:, 2] + self._x[:, 6] <= 0
+        self._x[shrinking, 6] = 0.0
+        self._x = self._x @ _F.T
+        self._P = _F @ self._P @ _F.T + _Q
+
+    def _correct(self, index: np.ndarray, measurements: np.ndarray):
+        x = self._x[index]
+        P = self._P[index]
+        innovation = measurements - x @ _H.T
+        S = _H @ P @ _H.T + _R
+        K = P @ _H.T @ np.linalg.inv(S)
+        self._x[index] = x + np.einsum("nij,nj->ni", K, innovation)
+        self._P[index] = (np.eye(7) - K @ _H) @ P
+
+    def update(self, rects):
+        """
+        Predict every track one step, match rects to them by IoU and correct.
+        Returns: ``assignments`` (the {track_id: centroid} view is ``objects``)
+
+        After the call, ``assignments[i]`` is the track id rect i was
+        matched to or started.
+        """
+        rects = np.asarray(rects, dtype=np.float64).reshape(-1, 4)
+        self._predict()
+
+        rows = cols = np.empty(0, dtype=np.int64)
+        if len(self._ids) and len(rects):
+            predicted = states_to_boxes(self._x)
+            if self.assignment == "optimal":
+                iou = iou_matrix(predicted, rects)
+                rows, cols = optimal_assignment(1.0 - iou, 1.0 - self.iou_threshold)
+            else:
+                rows, cols, iou = overlapping_pairs(predicted, rects, self.iou_threshold)
+                rows, cols = greedy_assignment(rows, cols, 1.0 - iou)
+
+        measurements = boxes_to_measurements(rects)
+        if len(rows):
+            self._correct(rows, measurements[cols])
+        self._hits[rows] += 1
+        self._misses += 1
+        self._misses[rows] = 0
+
+        assignments = np.full(len(rects), -1, dtype=np.int64)
+        assignments[cols] = self._ids[rows]
+
+        # Drop tracks unmatched for too long
+        alive = self._misses <= self.max_age
+        if not alive.all():
+            for object_id in self._ids[~alive].tolist():
+                self._id_set.discard(object_id)
+            self._x, self._P = self._x[alive], self._P[alive]
+            self._ids, self._hits, self._misses = self._ids[alive], self._hits[alive], self._misses[alive]
+
+        # Start tracks for unmatched detections
+        new = np.flatnonzero(assignments < 0)
+        if len(new):
+            ids = np.arange(self.next_object_id, self.next_object_id + len(new))
+            self.next_object_id += len(new)
+            state = np.zeros((len(new), 7))
+            state[:, :4] = measurements[new]
+            self._x = np.concatenate([self._x, state])
+            self._P = np.concatenate([self._P, np.repeat(_P0[None], len(new), axis=0)])
+            self._ids = np.concatenate([self._ids, ids])
+            self._hits = np.concatenate([self._hits, np.ones(len(new), dtype=np.int64)])
+            self._misses = np.concatenate([self._misses, np.zeros(len(new), dtype=np.int64)])
+            self._id_set.update(ids.tolist())
+            assignments[new] = ids
+        self.assignments = assignments
+
+        return self.assignments
+
+    @property
+    def objects(self):
+        """{object_id: centroid} of live tracks."""
+        centres = np.rint(self._x[:, :2]).astype(np.int64)
+        return OrderedDict(zip(self._ids.tolist(), centres))
+
+    @property
+    def boxes(self):
+        """{object_id: current box estimate (x1, y1, x2, y2)}."""
+        boxes = np.rint(states_to_boxes(self._x)).astype(np.int64)
+        return OrderedDict((object_id, tuple(box)) for object_id, box in zip(self._ids.tolist(), boxes.tolist()))
+
+    def confirmed_ids(self):
+        """Ids of tracks matched at least min_hits times."""
+        return self._ids[self._hits >= self.min_hits].tolist()
+
+    def is_tracked(self, object_id):
+        return object_id in self._id_set
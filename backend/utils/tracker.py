@@ -4,108 +4,296 @@ Based on Euclidean distance centroid tracking
 """
 import numpy as np
 from collections import OrderedDict
-from scipy.spatial import distance as dist
+
+try:
+    from scipy.spatial.distance import cdist
+except ImportError:  # scipy is optional
+    cdist = None
+
+try:
+    from scipy.optimize import linear_sum_assignment
+    from scipy.spatial import cKDTree
+except ImportError:  # scipy is optional
+    linear_sum_assignment = None
+    cKDTree = None
+
+
+def pairwise_distances(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Euclidean distance matrix between two point sets (scipy if available, else NumPy)."""
+    if cdist is not None:
+        return cdist(a, b)
+    diff = a[:, None, :].astype(np.float64) - b[None, :, :]
+    return np.sqrt((diff * diff).sum(axis=2))
+
+
+def candidate_pairs(a: np.ndarray, b: np.ndarray, max_distance: float):
+    """
+    Pairs of points from a and b at most max_distance apart.
+
+    Uses a k-d tree when scipy is available, so only nearby pairs are
+    ever computed; otherwise filters the full distance matrix.
+
+    Returns:
+        (rows, cols, distances) arrays, one entry per pair
+    """
+    if cKDTree is not None and len(a) * len(b) > 4096:
+        pairs = cKDTree(a).sparse_distance_matrix(cKDTree(b), max_distance, output_type="ndarray")
+        return pairs["i"].astype(np.int64), pairs["j"].astype(np.int64), pairs["v"]
+    distances = pairwise_distances(a, b)
+    rows, cols = np.nonzero(distances <= max_distance)
+    return rows, cols, distances[rows, cols]
+
+
+def greedy_assignment(rows: np.ndarray, cols: np.ndarray, distances: np.ndarray):
+    """
+    Nearest-first matching over candidate pairs.
+
+    Equivalent to repeatedly taking the closest remaining pair, but done
+    in vectorized rounds: every pair that is the nearest for both its row
+    and its column is accepted at once, pairs touching those rows or
+    columns are removed, and the next round starts. The closest remaining
+    pair is always accepted, so each round makes progress.
+
+    Returns:
+        (rows, cols) index arrays of the matched pairs
+    """
+    order = np.argsort(distances, kind="stable")
+    rows, cols = rows[order], cols[order]
+    rows_out, cols_out = [], []
+    if len(rows) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    # Scratch tables indexed by row / column id
+    first_for_row = np.empty(rows.max() + 1, dtype=np.int64)
+    first_for_col = np.empty(cols.max() + 1, dtype=np.int64)
+    row_taken = np.zeros(len(first_for_row), dtype=bool)
+    col_taken = np.zeros(len(first_for_col), dtype=bool)
+
+    while len(rows):
+        # Position of the nearest pair of every row and column (pairs are sorted,
+        # and with reversed writes the earliest position is written last)
+        positions = np.arange(len(rows))
+        first_for_row[rows[::-1]] = positions[::-1]
+        first_for_col[cols[::-1]] = positions[::-1]
+        mutual = (first_for_row[rows] == positions) & (first_for_col[cols] == positions)
+        rows_out.append(rows[mutual])
+        cols_out.append(cols[mutual])
+
+        row_taken[rows[mutual]] = True
+        col_taken[cols[mutual]] = True
+        keep = ~(row_taken[rows] | col_taken[cols])
+        rows, cols = rows[keep], cols[keep]
+
+    return np.concatenate(rows_out), np.concatenate(cols_out)
+
+
+def optimal_assignment(distances: np.ndarray, max_distance: float):
+    """
+    Minimum total distance matching (Hungarian algorithm, needs scipy).
+
+    Pairs farther apart than max_distance are never matched. Falls back to
+    greedy_assignment when scipy is not installed.
+
+    Returns:
+        (rows, cols) index arrays of the matched pairs
+    """
+    if linear_sum_assignment is None:
+        rows, cols = np.nonzero(distances <= max_distance)
+        return greedy_assignment(rows, cols, distances[rows, cols])
+    gated = distances <= max_distance
+    cost = np.where(gated, distances, max_distance * 2 + 1e6)
+    rows, cols = linear_sum_assignment(cost)
+    matched = gated[rows, cols]
+    return rows[matched], cols[matched]
 
 
 class Tracker:
-    def __init__(self, max_disappeared=50, max_distance=50):
+    """
+    Centroid tracker with array-backed state.
+
+    Each tracked object occupies a slot in preallocated arrays (centroid,
+    box, frames since last seen, history ring buffer). Slots freed by
+    deregistered objects go on a free list and are reused. The arrays
+    double in size when they run out. Object ids keep increasing, so an id
+    is never reused while a consumer might still remember it.
+
+    Detections are matched to objects by centroid distance with greedy
+    (nearest pair first) or optimal assignment, within max_distance.
+    Objects unmatched for more than max_disappeared updates are dropped.
+    """
+
+    def __init__(self, max_disappeared=50, max_distance=50, history_size=10, assignment="greedy", capacity=64):
+        if assignment not in ("greedy", "optimal"):
+            raise ValueError(f"Unknown assignment: {assignment}. Valid options: ['greedy', 'optimal']")
         self.next_object_id = 0
-        self.objects = OrderedDict()
-        self.disappeared = OrderedDict()
-        
-        # Store centroids: {object_id: (x, y)}
-        # Store history: {object_id: [_timestamp, (x, y)]}
-        self.history = OrderedDict()
-        
         self.max_disappeared = max_disappeared
         self.max_distance = max_distance
+        self.history_size = max(1, history_size)
+        self.assignment = assignment
+
+        capacity = max(1, capacity)
+        self._ids = np.full(capacity, -1, dtype=np.int64)
+        self._active = np.zeros(capacity, dtype=bool)
+        self._centroids = np.zeros((capacity, 2), dtype=np.int64)
+        self._boxes = np.zeros((capacity, 4), dtype=np.int64)
+        self._disappeared = np.zeros(capacity, dtype=np.int64)
+        # History: the last history_size centroids of each slot, written at _history_pos
+        self._history = np.zeros((capacity, self.history_size, 2), dtype=np.int64)
+        self._history_len = np.zeros(capacity, dtype=np.int64)
+        self._history_pos = np.zeros(capacity, dtype=np.int64)
+        self._free = list(range(capacity - 1, -1, -1))
+        self._slot_of = {}
 
-    def register(self, centroid):
-        self.objects[self.next_object_id] = centroid
-        self.disappeared[self.next_object_id] = 0
-        self.history[self.next_object_id] = []
+        # Object id assigned to each rect of the latest update, in input order
+        self.assignments = np.empty(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self._slot_of)
+
+    def _grow(self):
+        old = len(self._ids)
+        new = old * 2
+
+        def extend(array, fill=0):
+            grown = np.full((new,) + array.shape[1:], fill, dtype=array.dtype)
+            grown[:old] = array
+            return grown
+
+        self._ids = extend(self._ids, -1)
+        self._active = extend(self._active, False)
+        self._centroids = extend(self._centroids)
+        self._boxes = extend(self._boxes)
+        self._disappeared = extend(self._disappeared)
+        self._history = extend(self._history)
+        self._history_len = extend(self._history_len)
+        self._history_pos = extend(self._history_pos)
+        self._free.extend(range(new - 1, old - 1, -1))
+
+    def register(self, centroid, rect=None):
+        """Start tracking a new object; returns its id."""
+        if not self._free:
+            self._grow()
+        slot = self._free.pop()
+        object_id = self.next_object_id
         self.next_object_id += 1
-        
-        # Reset ID to prevent overflow if running for long time
-        if self.next_object_id > 1000000:
-            self.next_object_id = 0
+
+        self._ids[slot] = object_id
+        self._active[slot] = True
+        self._centroids[slot] = centroid
+        self._boxes[slot] = rect if rect is not None else (0, 0, 0, 0)
+        self._disappeared[slot] = 0
+        self._history_len[slot] = 0
+        self._history_pos[slot] = 0
+        self._slot_of[object_id] = slot
+        return object_id
 
     def deregister(self, object_id):
-        del self.objects[object_id]
-        del self.disappeared[object_id]
-        del self.history[object_id]
+        """Stop tracking an object and free its slot."""
+        slot = self._slot_of.pop(object_id)
+        self._active[slot] = False
+        self._ids[slot] = -1
+        self._free.append(slot)
+
+    def _register_many(self, centroids, rects):
+        return np.array([self.register(c, r) for c, r in zip(centroids, rects)], dtype=np.int64)
+
+    def _age_and_drop(self, slots):
+        """Count a missed update for the given slots and drop objects gone too long."""
+        self._disappeared[slots] += 1
+        gone = slots[self._disappeared[slots] > self.max_disappeared]
+        for object_id in self._ids[gone].tolist():
+            self.deregister(object_id)
 
     def update(self, rects):
         """
         Update tracker with new bounding box rectangles.
-        Returns: Dictionary of (object_id, centroid)
+        Returns: ``assignments`` (the {object_id: centroid} view is ``objects``)
+
+        After the call, ``assignments[i]`` is the object id rect i was
+        matched to or registered as.
         """
+        rects = np.asarray(rects, dtype=np.int64).reshape(-1, 4)
+        active = np.flatnonzero(self._active)
+
         if len(rects) == 0:
-            for object_id in list(self.disappeared.keys()):
-                self.disappeared[object_id] += 1
-                if self.disappeared[object_id] > self.max_disappeared:
-                    self.deregister(object_id)
-            return self.objects
+            self.assignments = np.empty(0, dtype=np.int64)
+            self._age_and_drop(active)
+            return self.assignments
 
         # Calculate input centroids
-        input_centroids = np.zeros((len(rects), 2), dtype="int")
-        for (i, (start_x, start_y, end_x, end_y)) in enumerate(rects):
-            c_x = int((start_x + end_x) / 2.0)
-            c_y = int((start_y + end_y) / 2.0)
-            input_centroids[i] = (c_x, c_y)
+        input_centroids = (rects[:, :2] + rects[:, 2:]) // 2
 
         # If no objects are currently tracked, register all inputs
-        if len(self.objects) == 0:
-            for i in range(0, len(input_centroids)):
-                self.register(input_centroids[i])
+        if len(active) == 0:
+            self.assignments = self._register_many(input_centroids, rects)
+            return self.assignments
+
+        # Match input centroids to existing object centroids
+        if self.assignment == "optimal":
+            distances = pairwise_distances(self._centroids[active], input_centroids)
+            rows, cols = optimal_assignment(distances, self.max_distance)
         else:
-            # Match input centroids to existing object centroids
-            object_ids = list(self.objects.keys())
-            object_centroids = list(self.objects.values())
-
-            # Calculate distances between all pairs
-            D = dist.cdist(np.array(object_centroids), input_centroids)
-
-            # Find smallest value in each row (closest input to each object)
-            rows = D.min(axis=1).argsort()
-            
-            # Find smallest value in each column
-            cols = D.argmin(axis=1)[rows]
-
-            used_rows = set()
-            used_cols = set()
-
-            for (row, col) in zip(rows, cols):
-                if row in used_rows or col in used_cols:
-                    continue
-
-                # If distance is too large, don't associate
-                if D[row, col] > self.max_distance:
-                    continue
-
-                object_id = object_ids[row]
-                self.objects[object_id] = input_centroids[col]
-                self.disappeared[object_id] = 0
-                
-                # Update history
-                self.history[object_id].append(input_centroids[col])
-                if len(self.history[object_id]) > 10:  # Keep last 10 points
-                    self.history[object_id].pop(0)
-
-                used_rows.add(row)
-                used_cols.add(col)
-
-            # Find unused rows (lost objects)
-            unused_rows = set(range(0, D.shape[0])).difference(used_rows)
-            for row in unused_rows:
-                object_id = object_ids[row]
-                self.disappeared[object_id] += 1
-                if self.disappeared[object_id] > self.max_disappeared:
-                    self.deregister(object_id)
-
-            # Find unused cols (new objects)
-            unused_cols = set(range(0, D.shape[1])).difference(used_cols)
-            for col in unused_cols:
-                self.register(input_centroids[col])
-
-        return self.objects
+            rows, cols = greedy_assignment(
+                *candidate_pairs(self._centroids[active], input_centroids, self.max_distance)
+            )
+
+        matched = active[rows]
+        self._centroids[matched] = input_centroids[cols]
+        self._boxes[matched] = rects[cols]
+        self._disappeared[matched] = 0
+
+        # Append to the history ring buffers
+        pos = self._history_pos[matched]
+        self._history[matched, pos] = input_centroids[cols]
+        self._history_pos[matched] = (pos + 1) % self.history_size
+        self._history_len[matched] = np.minimum(self._history_len[matched] + 1, self.history_size)
+
+        assignments = np.full(len(rects), -1, dtype=np.int64)
+        assignments[cols] = self._ids[matched]
+
+        # Unmatched objects age (and may be dropped); unmatched inputs are new objects
+        lost = np.ones(len(active), dtype=bool)
+        lost[rows] = False
+        self._age_and_drop(active[lost])
+
+        new = np.flatnonzero(assignments < 0)
+        assignments[new] = self._register_many(input_centroids[new], rects[new])
+        self.assignments = assignments
+
+        return self.assignments
+
+    # Dictionary views, built on access
+
+    @property
+    def objects(self):
+        """{object_id: centroid} of tracked objects, in registration order."""
+        return OrderedDict(
+            (object_id, self._centroids[slot]) for object_id, slot in self._slot_of.items()
+        )
+
+    @property
+    def disappeared(self):
+        """{object_id: updates since last matched}."""
+        return OrderedDict(
+            (object_id, int(self._disappeared[slot])) for object_id, slot in self._slot_of.items()
+        )
+
+    @property
+    def boxes(self):
+        """{object_id: last box (x1, y1, x2, y2)}."""
+        return OrderedDict(
+            (object_id, tuple(self._boxes[slot].tolist())) for object_id, slot in self._slot_of.items()
+        )
+
+    @property
+    def history(self):
+        """{object_id: last matched centroids, oldest first}."""
+        result = OrderedDict()
+        for object_id, slot in self._slot_of.items():
+            length = self._history_len[slot]
+            order = (self._history_pos[slot] - length + np.arange(length)) % self.history_size
+            result[object_id] = list(self._history[slot, order])
+        return result
+
+    def is_tracked(self, object_id):
+        return object_id in self._slot_of